@@ -0,0 +1,196 @@
+"""
+Sweep chunk size/overlap across embedding models and compare retrieval quality
+with index size and search latency, so chunking is chosen on data.
+
+For every (model, chunk size, overlap) the handbook is split exactly as
+build_index.py does, embedded (vectors are cached on disk by chunk text, so
+chunks that coincide across settings are embedded once), and searched with the
+testset questions. Recall@k and MRR are measured against the testsets'
+``reference_contexts``; rows not dominated on recall, MRR, size and p95 search
+latency are marked as the Pareto front.
+
+Usage:
+  python -m src.benchmarking.chunking_sweep --models bge-m3 --preset local \
+    --chunk-sizes 600,1000,1400,1800 --overlaps 100,200 --k 5
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+from langchain_ollama import OllamaEmbeddings
+
+from src.benchmarking.retrieval_metrics import load_reference_pairs, reciprocal_rank, recall_at_k, relevance_batch, summarise
+from src.build_index import (
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    _iter_documents,
+    _parse_models_csv,
+    _slug_from_embedding,
+    _split_documents_header_aware,
+    resolve_ollama_base_url,
+)
+from src.common.platform import get_platform_config
+
+
+load_dotenv()
+
+DEFAULT_TESTSETS = "data/testset/*.json"
+DEFAULT_CACHE_DIR = ".rag_cache/sweep"
+
+
+class EmbeddingCache:
+    """Chunk-text → vector cache for one model, persisted as ``<slug>.npz``."""
+
+    def __init__(self, model: str, client: OllamaEmbeddings, cache_dir: str, batch_size: int = 64):
+        self.client = client
+        self.batch_size = batch_size
+        self.path = os.path.join(cache_dir, f"{_slug_from_embedding(model)}.npz")
+        self._vectors: Dict[str, np.ndarray] = {}
+        self.misses = 0
+        if os.path.exists(self.path):
+            data = np.load(self.path)
+            self._vectors = dict(zip(data["keys"].tolist(), data["vectors"]))
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        keys = [self._key(t) for t in texts]
+        missing = list(dict.fromkeys(k for k in keys if k not in self._vectors))
+        by_key = dict(zip(keys, texts))
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            vectors = self.client.embed_documents([by_key[k] for k in batch])
+            for key, vector in zip(batch, vectors):
+                self._vectors[key] = np.asarray(vector, dtype=np.float32)
+        self.misses += len(missing)
+        return np.stack([self._vectors[k] for k in keys]).astype(np.float32)
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        keys = list(self._vectors)
+        np.savez(self.path, keys=np.asarray(keys), vectors=np.stack([self._vectors[k] for k in keys]))
+
+
+def _pareto(rows: List[Dict]) -> None:
+    """Flag rows no other row beats on every objective (higher recall/MRR, smaller index, faster p95)."""
+    def objectives(r):
+        return (r["recall"], r["mrr"], -r["index_mb"], -r["search_p95_ms"])
+
+    for row in rows:
+        mine = objectives(row)
+        row["pareto"] = not any(
+            all(o >= m for o, m in zip(objectives(other), mine)) and objectives(other) != mine
+            for other in rows
+            if other is not row
+        )
+
+
+def _markdown_table(rows: List[Dict], k: int) -> str:
+    header = f"| pareto | model | chunk_size | overlap | chunks | index_mb | recall@{k} | mrr | search_p50_ms | search_p95_ms | new_embeddings |"
+    lines = [header, "|" + "---|" * (header.count("|") - 1)]
+    for r in rows:
+        marker = "★" if r["pareto"] else ""
+        if r["current"]:
+            marker += " (current)"
+        lines.append(
+            f"| {marker} | {r['model']} | {r['chunk_size']} | {r['chunk_overlap']} | {r['chunks']} | {r['index_mb']:.2f} | "
+            f"{r['recall']:.3f} | {r['mrr']:.3f} | {r['search_p50_ms']:.3f} | {r['search_p95_ms']:.3f} | {r['new_embeddings']} |"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    platform_size = get_platform_config().chunk_target_size
+    parser = argparse.ArgumentParser(description="Sweep chunking parameters and report retrieval quality vs cost.")
+    parser.add_argument("--models", default=os.getenv("EMBEDDING_MODEL", "bge-m3"), help="Comma-separated embedding models")
+    parser.add_argument("--preset", choices=["local", "vm"], help="Environment preset to resolve endpoints")
+    parser.add_argument(
+        "--chunk-sizes",
+        default=",".join(str(s) for s in sorted({600, 1000, 1400, 1800, platform_size})),
+        help="Comma-separated chunk sizes (default includes the platform CHUNK_TARGET_SIZE)",
+    )
+    parser.add_argument("--overlaps", default="100,200", help="Comma-separated chunk overlaps")
+    parser.add_argument("--k", type=int, default=5, help="Top-k chunks retrieved per question")
+    parser.add_argument("--testsets", default=DEFAULT_TESTSETS, help="Glob of testset JSON files with reference_contexts")
+    parser.add_argument("--min-overlap", type=float, default=0.5, help="Word overlap for a chunk to match a reference context")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Where chunk embeddings are cached between runs")
+    parser.add_argument("--out-dir", default=os.getenv("RESULTS_DIR", "results/chunking"), help="Results root directory")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.chunk_sizes.split(",") if s.strip()]
+    overlaps = [int(o) for o in args.overlaps.split(",") if o.strip()]
+    pairs = load_reference_pairs(args.testsets)
+    if not pairs:
+        print(f"No testset items with reference_contexts match '{args.testsets}'.")
+        return
+    docs = list(_iter_documents())
+    base_url = resolve_ollama_base_url(args.preset)
+    print(f"--- Chunking sweep: {len(pairs)} questions, {len(docs)} documents, Ollama {base_url} ---")
+
+    rows: List[Dict] = []
+    for model in _parse_models_csv(args.models):
+        cache = EmbeddingCache(model, OllamaEmbeddings(model=model, base_url=base_url), args.cache_dir)
+        questions = cache.embed([q for q, _ in pairs])
+        for size in sizes:
+            for overlap in overlaps:
+                if overlap >= size:
+                    continue
+                misses_before = cache.misses
+                chunks = [c.page_content for c in _split_documents_header_aware(docs, size, overlap)]
+                vectors = cache.embed(chunks)
+                index = faiss.IndexFlatL2(vectors.shape[1])
+                index.add(vectors)
+
+                retrieved = []
+                latencies = []
+                for vector in questions:
+                    t0 = time.perf_counter()
+                    _, ids = index.search(vector[None, :], args.k)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    retrieved.append([chunks[i] for i in ids[0] if i >= 0])
+                rels = relevance_batch(retrieved, [refs for _, refs in pairs], args.min_overlap)
+                scores = summarise([{"recall": recall_at_k(rel, args.k), "mrr": reciprocal_rank(rel)} for rel in rels])
+                text_bytes = sum(len(c.encode("utf-8")) for c in chunks)
+                row = {
+                    "model": model,
+                    "chunk_size": size,
+                    "chunk_overlap": overlap,
+                    "chunks": len(chunks),
+                    "index_mb": (vectors.nbytes + text_bytes) / 1e6,
+                    "recall": scores["recall"],
+                    "mrr": scores["mrr"],
+                    "search_p50_ms": float(np.percentile(latencies, 50)),
+                    "search_p95_ms": float(np.percentile(latencies, 95)),
+                    "new_embeddings": cache.misses - misses_before,
+                    "current": size == CHUNK_SIZE and overlap == CHUNK_OVERLAP,
+                }
+                rows.append(row)
+                print(
+                    f"{model} size={size} overlap={overlap}: {len(chunks)} chunks, "
+                    f"recall@{args.k}={row['recall']:.3f} mrr={row['mrr']:.3f} ({row['new_embeddings']} new embeddings)"
+                )
+        cache.save()
+
+    _pareto(rows)
+    table = _markdown_table(rows, args.k)
+    out_dir = os.path.join(args.out_dir, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "sweep.json"), "w", encoding="utf-8") as f:
+        json.dump({"k": args.k, "questions": len(pairs), "rows": rows}, f, indent=2)
+    with open(os.path.join(out_dir, "sweep.md"), "w", encoding="utf-8") as f:
+        f.write(table + "\n")
+    print("\n" + table)
+    print(f"\n★ = Pareto-optimal. Set CHUNK_SIZE/CHUNK_OVERLAP for build_index.py from the front. Results in '{out_dir}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Recall vs embedding dimension for Matryoshka truncation and PCA, from an
+existing full-dimension index.
+
+The chunk vectors are read back from each model's FAISS index, so nothing is
+re-embedded except the testset questions. For every method and dimension the
+vectors are projected and renormalized as build_index.py --reduce would store
+them, searched with a flat index, and scored for recall@k and MRR against the
+testsets' ``reference_contexts``, next to index size and p50/p95 search
+latency. Rows are scored on the indexed chunks themselves (children, for
+parent/child indexes). Rows not dominated on recall, MRR, size and p95 latency
+form the Pareto front.
+
+Usage:
+  python -m src.benchmarking.dimension_sweep --models hf.co/Qwen/Qwen3-Embedding-0.6B-GGUF:Q8_0 \
+    --preset local --dims 64,128,256,512 --methods truncate,pca --k 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+from src.benchmarking.chunking_sweep import _pareto
+from src.benchmarking.retrieval_metrics import load_reference_pairs, reciprocal_rank, recall_at_k, relevance_batch, summarise
+from src.build_index import _parse_models_csv, _slug_from_embedding, resolve_ollama_base_url
+from src.rag.index_loader import load_faiss_index
+from src.rag.reduction import Projection, index_projection
+
+
+load_dotenv()
+
+DEFAULT_TESTSETS = "data/testset/*.json"
+
+
+def _score(chunk_vectors: np.ndarray, questions: np.ndarray, texts: List[str], pairs, k: int, min_overlap: float) -> Dict:
+    index = faiss.IndexFlatL2(chunk_vectors.shape[1])
+    index.add(chunk_vectors)
+    retrieved = []
+    latencies = []
+    for vector in questions:
+        t0 = time.perf_counter()
+        _, ids = index.search(vector[None, :], k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        retrieved.append([texts[i] for i in ids[0] if i >= 0])
+    rels = relevance_batch(retrieved, [refs for _, refs in pairs], min_overlap)
+    scores = summarise([{"recall": recall_at_k(rel, k), "mrr": reciprocal_rank(rel)} for rel in rels])
+    return {
+        "recall": scores["recall"],
+        "mrr": scores["mrr"],
+        "index_mb": chunk_vectors.nbytes / 1e6,
+        "search_p50_ms": float(np.percentile(latencies, 50)),
+        "search_p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def _markdown_table(rows: List[Dict], k: int) -> str:
+    header = f"| pareto | model | method | dim | variance_kept | index_mb | recall@{k} | mrr | search_p50_ms | search_p95_ms |"
+    lines = [header, "|" + "---|" * (header.count("|") - 1)]
+    for r in rows:
+        variance = f"{r['explained_variance']:.3f}" if r["explained_variance"] is not None else ""
+        lines.append(
+            f"| {'★' if r['pareto'] else ''} | {r['model']} | {r['method']} | {r['dim']} | {variance} | {r['index_mb']:.2f} | "
+            f"{r['recall']:.3f} | {r['mrr']:.3f} | {r['search_p50_ms']:.3f} | {r['search_p95_ms']:.3f} |"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report retrieval quality vs embedding dimension (truncation / PCA).")
+    parser.add_argument("--models", default=os.getenv("EMBEDDING_MODEL", "bge-m3"), help="Comma-separated embedding models")
+    parser.add_argument("--index-dir", help="Full-dimension index to read vectors from (single model only)")
+    parser.add_argument("--preset", choices=["local", "vm"], help="Environment preset to resolve endpoints")
+    parser.add_argument("--dims", default="64,128,256,512", help="Comma-separated target dimensions")
+    parser.add_argument("--methods", default="truncate,pca", help="Comma-separated reductions: truncate, pca")
+    parser.add_argument("--k", type=int, default=5, help="Top-k chunks retrieved per question")
+    parser.add_argument("--testsets", default=DEFAULT_TESTSETS, help="Glob of testset JSON files with reference_contexts")
+    parser.add_argument("--min-overlap", type=float, default=0.5, help="Word overlap for a chunk to match a reference context")
+    parser.add_argument("--out-dir", default=os.getenv("RESULTS_DIR", "results/dimensions"), help="Results root directory")
+    args = parser.parse_args()
+
+    models = _parse_models_csv(args.models)
+    if args.index_dir and len(models) != 1:
+        parser.error("--index-dir needs exactly one model in --models")
+    dims = sorted({int(d) for d in args.dims.split(",") if d.strip()})
+    methods = [m.strip() for m in args.methods.split(",") if m.strip()]
+    pairs = load_reference_pairs(args.testsets)
+    if not pairs:
+        print(f"No testset items with reference_contexts match '{args.testsets}'.")
+        sys.exit(2)
+    base_url = resolve_ollama_base_url(args.preset)
+    print(f"--- Dimension sweep: {len(pairs)} questions, dims={dims}, methods={methods}, Ollama {base_url} ---")
+
+    rows: List[Dict] = []
+    for model in models:
+        index_dir = args.index_dir or f".rag_cache/{_slug_from_embedding(model)}/faiss_index"
+        if not os.path.exists(index_dir):
+            print(f"Skipping '{model}': no index at '{index_dir}'.")
+            continue
+        vectorstore = load_faiss_index(index_dir, model, base_url, {})
+        if index_projection(vectorstore) is not None:
+            print(f"Skipping '{model}': '{index_dir}' is already reduced; rebuild it without --reduce to sweep.")
+            continue
+        full = vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+        texts = [vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]).page_content for i in range(len(full))]
+        questions = np.asarray(vectorstore.embedding_function.embed_documents([q for q, _ in pairs]), dtype=np.float32)
+
+        settings = [("full", full.shape[1])] + [(m, d) for m in methods for d in dims if d < full.shape[1]]
+        for method, dim in settings:
+            if method == "full":
+                chunk_vectors, query_vectors, variance = full, questions, None
+            else:
+                projection = Projection.fit(method, full, dim)
+                chunk_vectors, query_vectors = projection.apply(full), projection.apply(questions)
+                variance = projection.explained_variance
+            row = {"model": model, "method": method, "dim": dim, "explained_variance": variance}
+            row.update(_score(chunk_vectors, query_vectors, texts, pairs, args.k, args.min_overlap))
+            rows.append(row)
+            print(f"{model} {method} d={dim}: recall@{args.k}={row['recall']:.3f} mrr={row['mrr']:.3f} index={row['index_mb']:.2f}MB")
+    if not rows:
+        print("No indexes swept.")
+        sys.exit(2)
+
+    _pareto(rows)
+    table = _markdown_table(rows, args.k)
+    out_dir = os.path.join(args.out_dir, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "dimension_sweep.json"), "w", encoding="utf-8") as f:
+        json.dump({"k": args.k, "questions": len(pairs), "rows": rows}, f, indent=2)
+    with open(os.path.join(out_dir, "dimension_sweep.md"), "w", encoding="utf-8") as f:
+        f.write(table + "\n")
+    print("\n" + table)
+    print(f"\n★ = Pareto-optimal. Build with python -m src.build_index --reduce <method> --dim <d>. Results in '{out_dir}'.")
+
+
+if __name__ == "__main__":
+    main()
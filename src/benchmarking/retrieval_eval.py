@@ -0,0 +1,173 @@
+"""
+Retrieval-only evaluation of built indexes against testset reference contexts.
+
+Each model's FAISS index is loaded the way the API loads it, all testset
+questions are embedded in batches, and the top-k results (expanded to parents
+for parent/child indexes, as the API does) are scored for recall@k,
+precision@k, MRR and nDCG@k. No LLM or judge is involved, so a run takes
+seconds; with --min-recall the exit code gates index changes in CI.
+
+Usage:
+  python -m src.benchmarking.retrieval_eval --models bge-m3 --preset local --k 1,3,5,10
+  python -m src.benchmarking.retrieval_eval --models bge-m3 --index-dir /tmp/faiss_index --min-recall 0.6
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.benchmarking.retrieval_metrics import (
+    load_reference_pairs,
+    ndcg_at_k,
+    precision_at_k,
+    recall_at_k,
+    reciprocal_rank,
+    relevance_batch,
+    summarise,
+)
+from src.build_index import DEFAULT_EMBEDDING_MODELS, _parse_models_csv, _slug_from_embedding, resolve_ollama_base_url
+from src.rag.context_packing import ScoredChunk
+from src.rag.index_loader import load_faiss_index
+from src.rag.parent_child import expand_children, is_parent_child_index
+
+
+load_dotenv()
+
+DEFAULT_TESTSETS = "data/testset/*.json"
+
+
+def _embed_questions(vectorstore, questions: List[str], batch_size: int) -> np.ndarray:
+    vectors = []
+    for i in range(0, len(questions), batch_size):
+        vectors.extend(vectorstore.embedding_function.embed_documents(questions[i:i + batch_size]))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def _search(vectorstore, vector: np.ndarray, k: int, parent_child: bool, fanout: int, expansion: str) -> List[str]:
+    """Top-k texts for one query vector, mirroring RagPipeline.retrieve."""
+    fetch = k * fanout if parent_child else k
+    distances, ids = vectorstore.index.search(vector[None, :], fetch)
+    chunks = []
+    for distance, i in zip(distances[0], ids[0]):
+        if i < 0:
+            continue
+        doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(i)])
+        chunks.append(ScoredChunk(text=doc.page_content, metadata=doc.metadata, distance=float(distance)))
+    if parent_child:
+        chunks = expand_children(vectorstore, chunks, k, expansion)
+    return [c.text for c in chunks[:k]]
+
+
+def evaluate_model(model: str, index_dir: str, base_url: str, pairs, ks: List[int], args) -> Dict:
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    vectorstore = load_faiss_index(index_dir, model, base_url, timings)
+    timings["load_s"] = time.perf_counter() - t0
+    parent_child = is_parent_child_index(vectorstore)
+
+    t1 = time.perf_counter()
+    vectors = _embed_questions(vectorstore, [q for q, _ in pairs], args.batch_size)
+    timings["embed_s"] = time.perf_counter() - t1
+
+    k_max = max(ks)
+    retrieved = []
+    latencies = []
+    for vector in vectors:
+        t2 = time.perf_counter()
+        retrieved.append(_search(vectorstore, vector, k_max, parent_child, args.child_fanout, args.parent_expansion))
+        latencies.append((time.perf_counter() - t2) * 1000)
+
+    rels = relevance_batch(retrieved, [refs for _, refs in pairs], args.min_overlap)
+    per_query = []
+    for rel in rels:
+        scores = {"mrr": reciprocal_rank(rel)}
+        for k in ks:
+            scores[f"recall@{k}"] = recall_at_k(rel, k)
+            scores[f"precision@{k}"] = precision_at_k(rel, k)
+            scores[f"ndcg@{k}"] = ndcg_at_k(rel, k)
+        per_query.append(scores)
+
+    return {
+        "model": model,
+        "index_dir": index_dir,
+        "vectors": int(vectorstore.index.ntotal),
+        "parent_child": parent_child,
+        "questions": len(pairs),
+        "metrics": summarise(per_query),
+        "search_ms": {
+            "mean": float(np.mean(latencies)),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+        },
+        "timings": {name: round(value, 4) for name, value in timings.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score retrieval against testset reference contexts, without an LLM.")
+    parser.add_argument("--models", help="Comma-separated embedding models (default EMBEDDING_MODELS or the build defaults)")
+    parser.add_argument("--index-dir", help="Index directory to evaluate (single model only)")
+    parser.add_argument("--preset", choices=["local", "vm"], help="Environment preset to resolve endpoints")
+    parser.add_argument("--k", default="1,3,5,10", help="Comma-separated cut-offs")
+    parser.add_argument("--testsets", default=DEFAULT_TESTSETS, help="Glob of testset JSON files with reference_contexts")
+    parser.add_argument("--min-overlap", type=float, default=0.5, help="Word overlap for a chunk to match a reference context")
+    parser.add_argument("--batch-size", type=int, default=32, help="Questions per embedding request")
+    parser.add_argument("--child-fanout", type=int, default=int(os.getenv("CHILD_FANOUT", "3")), help="Parent/child indexes: children per result")
+    parser.add_argument("--parent-expansion", default=os.getenv("PARENT_EXPANSION", "parent"), choices=["parent", "window"])
+    parser.add_argument("--min-recall", type=float, help="Exit non-zero if any model's recall at the largest k is below this")
+    parser.add_argument("--out-dir", default=os.getenv("RESULTS_DIR", "results/retrieval"), help="Results root directory")
+    args = parser.parse_args()
+
+    models = _parse_models_csv(args.models or os.getenv("EMBEDDING_MODELS", "")) or DEFAULT_EMBEDDING_MODELS
+    if args.index_dir and len(models) != 1:
+        parser.error("--index-dir needs exactly one model in --models")
+    ks = sorted({int(k) for k in args.k.split(",") if k.strip()})
+    pairs = load_reference_pairs(args.testsets)
+    if not pairs:
+        print(f"No testset items with reference_contexts match '{args.testsets}'.")
+        sys.exit(2)
+    base_url = resolve_ollama_base_url(args.preset)
+    print(f"--- Retrieval eval: {len(pairs)} questions, k={ks}, Ollama {base_url} ---")
+
+    results = []
+    for model in models:
+        index_dir = args.index_dir or f".rag_cache/{_slug_from_embedding(model)}/faiss_index"
+        if not os.path.exists(index_dir):
+            print(f"Skipping '{model}': no index at '{index_dir}'.")
+            continue
+        result = evaluate_model(model, index_dir, base_url, pairs, ks, args)
+        results.append(result)
+        m = result["metrics"]
+        cells = "  ".join(f"R@{k}={m[f'recall@{k}']:.3f} P@{k}={m[f'precision@{k}']:.3f} nDCG@{k}={m[f'ndcg@{k}']:.3f}" for k in ks)
+        print(
+            f"{model}: MRR={m['mrr']:.3f}  {cells}\n"
+            f"  search p50={result['search_ms']['p50']:.2f}ms p95={result['search_ms']['p95']:.2f}ms, "
+            f"embed {result['timings']['embed_s']:.2f}s for {len(pairs)} questions, load {result['timings']['load_s']:.2f}s"
+        )
+    if not results:
+        print("No indexes evaluated.")
+        sys.exit(2)
+
+    out_dir = os.path.join(args.out_dir, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "retrieval_eval.json"), "w", encoding="utf-8") as f:
+        json.dump({"k": ks, "min_overlap": args.min_overlap, "results": results}, f, indent=2)
+    print(f"Results in '{out_dir}'.")
+
+    if args.min_recall is not None:
+        key = f"recall@{ks[-1]}"
+        failed = [r["model"] for r in results if r["metrics"][key] < args.min_recall]
+        if failed:
+            print(f"FAIL: {key} below {args.min_recall} for {', '.join(failed)}")
+            sys.exit(1)
+        print(f"PASS: {key} >= {args.min_recall} for all models")
+
+
+if __name__ == "__main__":
+    main()
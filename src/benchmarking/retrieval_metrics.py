@@ -0,0 +1,113 @@
+"""
+Retrieval-quality metrics against testset reference contexts (no LLM involved).
+
+A retrieved chunk counts as relevant to a reference context when their word
+sets overlap by at least ``min_overlap`` of the smaller one, so both chunks
+larger than the reference (a whole section) and smaller ones (a fragment of
+it) match. Overlaps for a whole run are computed with one matrix product over
+a shared vocabulary.
+"""
+import glob
+import json
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def load_reference_pairs(pattern: str) -> List[Tuple[str, List[str]]]:
+    """``(question, reference_contexts)`` for every testset item that has both."""
+    pairs = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        for item in items:
+            question = (item.get("user_input") or "").strip()
+            contexts = [c for c in (item.get("reference_contexts") or []) if c and c.strip()]
+            if question and contexts:
+                pairs.append((question, contexts))
+    return pairs
+
+
+def _word_ids(texts: Sequence[str], vocab: Dict[str, int]) -> List[List[int]]:
+    # Markdown markers and punctuation drop out, so "## Modules" matches "Modules"
+    return [[vocab.setdefault(w, len(vocab)) for w in set(_WORD.findall(t.lower()))] for t in texts]
+
+
+def _one_hot(word_ids: List[List[int]], vocab_size: int) -> np.ndarray:
+    matrix = np.zeros((len(word_ids), max(vocab_size, 1)), dtype=np.float32)
+    rows = np.repeat(np.arange(len(word_ids)), [len(ids) for ids in word_ids])
+    cols = np.fromiter((i for ids in word_ids for i in ids), dtype=np.int64, count=len(rows))
+    matrix[rows, cols] = 1.0
+    return matrix
+
+
+def relevance_batch(
+    retrieved: Sequence[Sequence[str]],
+    references: Sequence[Sequence[str]],
+    min_overlap: float = 0.5,
+) -> List[np.ndarray]:
+    """For each query, a boolean ``(len(retrieved[q]), len(references[q]))`` matrix of chunk/reference matches."""
+    chunk_texts = list(dict.fromkeys(t for ts in retrieved for t in ts))
+    ref_texts = list(dict.fromkeys(t for ts in references for t in ts))
+    vocab: Dict[str, int] = {}
+    chunk_words = _word_ids(chunk_texts, vocab)
+    ref_words = _word_ids(ref_texts, vocab)
+    C = _one_hot(chunk_words, len(vocab))
+    R = _one_hot(ref_words, len(vocab))
+    shared = C @ R.T
+    smaller = np.minimum(C.sum(axis=1)[:, None], R.sum(axis=1)[None, :])
+    matches = (smaller > 0) & (shared >= min_overlap * smaller)
+
+    chunk_pos = {t: i for i, t in enumerate(chunk_texts)}
+    ref_pos = {t: i for i, t in enumerate(ref_texts)}
+    out = []
+    for chunks, refs in zip(retrieved, references):
+        rows = [chunk_pos[t] for t in chunks]
+        cols = [ref_pos[t] for t in refs]
+        out.append(matches[np.ix_(rows, cols)] if rows and cols else np.zeros((len(rows), len(cols)), dtype=bool))
+    return out
+
+
+def relevance(chunks: Sequence[str], references: Sequence[str], min_overlap: float = 0.5) -> np.ndarray:
+    """``rel[i, j]`` is True when retrieved chunk ``i`` covers reference context ``j``."""
+    return relevance_batch([chunks], [references], min_overlap)[0]
+
+
+def recall_at_k(rel: np.ndarray, k: int) -> float:
+    """Fraction of reference contexts matched by any of the top-k chunks."""
+    if rel.size == 0 or rel.shape[1] == 0:
+        return 0.0
+    return float(rel[:k].any(axis=0).mean())
+
+
+def precision_at_k(rel: np.ndarray, k: int) -> float:
+    """Fraction of the top-k slots holding a chunk that matches some reference context."""
+    return float(rel[:k].any(axis=1).sum() / k) if k > 0 else 0.0
+
+
+def reciprocal_rank(rel: np.ndarray) -> float:
+    hits = np.flatnonzero(rel.any(axis=1)) if rel.size else []
+    return 1.0 / (hits[0] + 1) if len(hits) else 0.0
+
+
+def ndcg_at_k(rel: np.ndarray, k: int) -> float:
+    """Binary-gain nDCG; the ideal ranking puts all relevant chunks first (at least one per reference context)."""
+    if rel.size == 0 or rel.shape[1] == 0:
+        return 0.0
+    gains = rel[:k].any(axis=1).astype(np.float64)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = float((gains * discounts[:len(gains)]).sum())
+    ideal_hits = min(k, max(int(gains.sum()), rel.shape[1]))
+    idcg = float(discounts[:ideal_hits].sum())
+    return dcg / idcg if idcg > 0 else 0.0
+
+
+def summarise(per_query: List[Dict[str, float]]) -> Dict[str, float]:
+    """Mean of each metric over queries."""
+    if not per_query:
+        return {}
+    return {name: sum(q[name] for q in per_query) / len(per_query) for name in per_query[0]}
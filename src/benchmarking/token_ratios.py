@@ -0,0 +1,92 @@
+"""
+Measure characters per token on handbook chunks with each local family's real
+tokenizer, to check the estimates in src/rag/tokens.py.
+
+The handbook is split exactly as build_index.py does and every chunk is
+tokenized with the family's Hugging Face tokenizer (downloaded on first use;
+gated repos such as Llama 3 need ``HF_TOKEN``). For each family the script
+prints the corpus-wide ratio, the 10th-percentile per-chunk ratio and the
+ratio ``count_tokens`` currently assumes. An assumed ratio at or below the
+10th percentile means the estimate over-counts for at least 90% of chunks.
+
+Usage:
+  python -m src.benchmarking.token_ratios --families phi-3,qwen --output results/token_ratios.json
+"""
+import argparse
+import json
+import os
+from typing import Dict, List
+
+import numpy as np
+
+from src.build_index import _iter_documents, _split_documents_header_aware
+from src.rag.tokens import CHARS_PER_TOKEN_BY_FAMILY
+
+
+# Tokenizer of a representative model for every family in CHARS_PER_TOKEN_BY_FAMILY
+REFERENCE_TOKENIZERS = {
+    "phi-3": "microsoft/Phi-3-mini-4k-instruct",
+    "phi-4": "microsoft/phi-4",
+    "llama-3": "meta-llama/Meta-Llama-3-8B-Instruct",
+    "qwen": "Qwen/Qwen2.5-7B-Instruct",
+    "falcon": "tiiuae/falcon-7b-instruct",
+}
+
+
+def load_reference_tokenizer(family: str):
+    from tokenizers import Tokenizer
+
+    return Tokenizer.from_pretrained(REFERENCE_TOKENIZERS[family], token=os.getenv("HF_TOKEN"))
+
+
+def handbook_chunks() -> List[str]:
+    return [c.page_content for c in _split_documents_header_aware(list(_iter_documents()))]
+
+
+def token_counts(tokenizer, texts: List[str]) -> np.ndarray:
+    encodings = tokenizer.encode_batch(texts, add_special_tokens=False)
+    return np.asarray([len(e.ids) for e in encodings], dtype=np.int64)
+
+
+def measure(family: str, texts: List[str]) -> Dict:
+    tokens = token_counts(load_reference_tokenizer(family), texts)
+    chars = np.asarray([len(t) for t in texts], dtype=np.int64)
+    per_chunk = chars / np.maximum(tokens, 1)
+    return {
+        "family": family,
+        "tokenizer": REFERENCE_TOKENIZERS[family],
+        "chunks": len(texts),
+        "chars_per_token": round(float(chars.sum() / tokens.sum()), 3),
+        "p10_chars_per_token": round(float(np.percentile(per_chunk, 10)), 3),
+        "assumed_chars_per_token": CHARS_PER_TOKEN_BY_FAMILY[family],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure chars/token on handbook chunks with real tokenizers.")
+    parser.add_argument("--families", default=",".join(REFERENCE_TOKENIZERS), help="Comma-separated model families")
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    texts = handbook_chunks()
+    rows = []
+    for family in [f.strip() for f in args.families.split(",") if f.strip()]:
+        try:
+            row = measure(family, texts)
+        except Exception as e:
+            print(f"{family}: tokenizer {REFERENCE_TOKENIZERS.get(family)} unavailable ({e})")
+            continue
+        rows.append(row)
+        verdict = "over-counts" if row["assumed_chars_per_token"] <= row["p10_chars_per_token"] else "may under-count"
+        print(
+            f"{family:8s} {row['chars_per_token']:.2f} chars/token (p10 {row['p10_chars_per_token']:.2f}), "
+            f"assumed {row['assumed_chars_per_token']:.2f}: {verdict}"
+        )
+    if args.output and rows:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Build the curated FAQ used by the RAG API's extractive fast path.
+
+Questions come from the testsets (with their reference answers) and from the
+OpenWebUI prompt suggestions (answered once through a running RAG API with
+--rag-base). Each question is embedded with the same model as the FAISS index,
+and the sections of its top retrieved chunks are stored so the API only serves
+an answer when a live query retrieves the same grounding.
+
+Usage:
+  python -m src.build_faq --model bge-m3 --preset local \
+    --rag-base http://localhost:8001 --answer-model azure-gpt5
+"""
+import argparse
+import glob
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+from langchain_ollama import OllamaEmbeddings
+
+from src.build_index import _slug_from_embedding, resolve_ollama_base_url
+from src.rag.context_packing import ScoredChunk
+from src.rag.faq import FaqEntry, is_usable_answer, save_faq
+from src.rag.index_loader import load_faiss_index
+from src.rag.reduction import index_projection
+
+
+load_dotenv()
+
+DEFAULT_TESTSETS = "data/testset/*.json"
+DEFAULT_SUGGESTIONS = "data/prompt-suggestions/*.json"
+
+
+def _load_testset_pairs(pattern: str) -> List[Tuple[str, Optional[str], str]]:
+    pairs = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        for item in items:
+            question = (item.get("user_input") or "").strip()
+            if question:
+                pairs.append((question, item.get("reference"), os.path.basename(path)))
+    return pairs
+
+
+def _load_suggestions(pattern: str) -> List[Tuple[str, Optional[str], str]]:
+    pairs = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        for item in items:
+            question = (item.get("content") or "").strip()
+            if question:
+                pairs.append((question, None, os.path.basename(path)))
+    return pairs
+
+
+def _answer_via_rag(rag_base: str, question: str, model_name: str) -> Optional[str]:
+    try:
+        resp = requests.post(
+            f"{rag_base.rstrip('/')}/query",
+            json={"question": question, "model_name": model_name, "allow_fast_path": False},
+            timeout=600,
+        )
+        resp.raise_for_status()
+        return resp.json().get("answer")
+    except Exception as e:
+        print(f"Warning: could not answer '{question[:60]}' via {rag_base}: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the FAQ fast-path file for one embedding model.")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "bge-m3"), help="Embedding model of the target index")
+    parser.add_argument("--preset", choices=["local", "vm"], help="Environment preset to resolve endpoints")
+    parser.add_argument("--index-dir", help="FAISS index directory (default .rag_cache/<slug>/faiss_index)")
+    parser.add_argument("--out", help="Output path (default faq.json next to the index)")
+    parser.add_argument("--testsets", default=DEFAULT_TESTSETS, help="Glob of testset JSON files with reference answers")
+    parser.add_argument("--suggestions", default=DEFAULT_SUGGESTIONS, help="Glob of prompt-suggestion JSON files")
+    parser.add_argument("--rag-base", help="RAG API used to precompute answers for suggestions without references")
+    parser.add_argument("--answer-model", default="ollama/phi3:mini", help="Model used with --rag-base")
+    parser.add_argument("--sources-k", type=int, default=2, help="Top-k chunk sections stored as grounding per entry")
+    args = parser.parse_args()
+
+    index_dir = args.index_dir or f".rag_cache/{_slug_from_embedding(args.model)}/faiss_index"
+    out_path = args.out or os.path.join(os.path.dirname(index_dir.rstrip("/")), "faq.json")
+    base_url = resolve_ollama_base_url(args.preset)
+    print(f"--- Building FAQ for '{args.model}' (index '{index_dir}', Ollama {base_url}) ---")
+
+    embeddings = OllamaEmbeddings(model=args.model, base_url=base_url)
+    vectorstore = load_faiss_index(index_dir, args.model, base_url, {})
+
+    candidates = _load_testset_pairs(args.testsets) + _load_suggestions(args.suggestions)
+    seen: Dict[str, bool] = {}
+    entries: List[FaqEntry] = []
+    for question, answer, origin in candidates:
+        key = " ".join(question.lower().split())
+        if key in seen:
+            continue
+        seen[key] = True
+        if not is_usable_answer(answer) and args.rag_base:
+            answer = _answer_via_rag(args.rag_base, question, args.answer_model)
+        if not is_usable_answer(answer):
+            continue
+        entries.append(FaqEntry(question=question, answer=answer.strip(), origin=origin))
+    print(f"Kept {len(entries)} answerable question(s) out of {len(candidates)}.")
+    if not entries:
+        return
+
+    # FAQ vectors stay full-dimension (the API matches them before any projection)
+    vectors = embeddings.embed_documents([e.question for e in entries])
+    projection = index_projection(vectorstore)
+    for entry, vector in zip(entries, vectors):
+        search_vector = projection.apply_one(vector) if projection is not None else vector
+        hits = vectorstore.similarity_search_with_score_by_vector(search_vector, k=args.sources_k)
+        chunks = [ScoredChunk(text=doc.page_content, metadata=doc.metadata, distance=float(score)) for doc, score in hits]
+        entry.sources = list(dict.fromkeys(chunk.label for chunk in chunks))
+
+    save_faq(out_path, entries, vectors, args.model)
+    print(f"✓ Saved {len(entries)} FAQ entries to '{out_path}'")
+
+
+if __name__ == "__main__":
+    main()
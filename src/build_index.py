@@ -1,15 +1,30 @@
 import os
 import re
+import json
+import time
+import queue
+import shutil
+import hashlib
 import argparse
-from typing import List, Optional
+import threading
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
 import requests
 from dotenv import load_dotenv
 
-from langchain_community.document_loaders import DirectoryLoader, UnstructuredMarkdownLoader
 from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter
 from langchain_ollama import OllamaEmbeddings
 
+from src.rag.chunk_store import ChunkStore, ChunkStoreDocstore
+from src.rag.embedding_backends import create_embeddings
+from src.rag.filters import save_filter_lists
+from src.rag.reduction import Projection
+
 
 # Load environment variables from a .env file
 load_dotenv()
@@ -20,8 +35,43 @@ DATA_DIR = "data/cs-handbook"
 INDEX_DIR = os.getenv("INDEX_DIR")  # If building multiple, this is ignored
 EMBEDDING_MODELS_ENV = os.getenv("EMBEDDING_MODELS")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL")
+# Optional comma-separated Ollama replicas; chunk embedding is sharded across them
+OLLAMA_BASE_URLS_ENV = os.getenv("OLLAMA_BASE_URLS")
+# Threads reading markdown files; results are consumed in path order
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", str(min(8, os.cpu_count() or 1))))
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1800"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+# "parent_child" embeds small child chunks and stores the CHUNK_SIZE sections as their parents
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "standard")
+CHILD_CHUNK_SIZE = int(os.getenv("CHILD_CHUNK_SIZE", "400"))
+CHILD_CHUNK_OVERLAP = int(os.getenv("CHILD_CHUNK_OVERLAP", "50"))
+# Must match src/rag/parent_child.py
+PARENT_ID_PREFIX = "parent:"
+PARENT_CHILD_MARKER_ID = "parent:__index__"
+# Streaming ingestion: chunks per embedding batch, batches buffered between split and embed,
+# and chunks between resumable checkpoints (0 disables checkpoints)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+INGEST_QUEUE_BATCHES = int(os.getenv("INGEST_QUEUE_BATCHES", "4"))
+INGEST_CHECKPOINT_EVERY = int(os.getenv("INGEST_CHECKPOINT_EVERY", "20000"))
+# Near-duplicate removal: estimated Jaccard similarity of word shingles above which a chunk
+# is folded into an earlier one (0 disables), and MinHash permutations per chunk
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "128"))
+# Chunk texts are written once per corpus version here and shared by every model's index
+# (empty = pickle a full docstore into each index directory, the legacy layout)
+CHUNK_STORE_DIR = os.getenv("CHUNK_STORE_DIR", ".rag_cache/chunk_store")
+# Published index versions kept next to each index for rollback
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+# Chunk embedding: "ollama" over HTTP (sharded across replicas) or "onnx" in-process on CPU,
+# from the verified embedder in ONNX_EMBEDDER_ROOT/<slug> (see src/build_onnx_embedder.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "ollama")
+ONNX_EMBEDDER_ROOT = os.getenv("ONNX_EMBEDDER_ROOT", ".rag_cache/onnx")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+# Optional dimensionality reduction applied to the finished index: "truncate" (Matryoshka prefix)
+# or "pca", keeping EMBEDDING_DIM dimensions; PCA is fitted on up to REDUCE_PCA_SAMPLE chunk vectors
+EMBEDDING_REDUCTION = os.getenv("EMBEDDING_REDUCTION", "")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0"))
+REDUCE_PCA_SAMPLE = int(os.getenv("REDUCE_PCA_SAMPLE", "50000"))
 
 # Default list used when building multiple without explicit env/args
 DEFAULT_EMBEDDING_MODELS: List[str] = [
@@ -40,32 +90,80 @@ def _parse_models_csv(csv_value: str) -> List[str]:
     return [m.strip() for m in csv_value.split(",") if m.strip()]
 
 
-def _load_documents():
-    """Load documents based on HANDBOOK_MD_PATH or markdown under data/."""
-    from pathlib import Path
-    from langchain_community.document_loaders import DirectoryLoader, UnstructuredMarkdownLoader
+def _parse_front_matter(text: str) -> Tuple[Dict, str]:
+    """Split an optional leading ``---`` YAML block off a markdown file."""
+    if not text.startswith("---"):
+        return {}, text
+    end = re.search(r"^(?:---|\.\.\.)[ \t]*$", text[3:], flags=re.MULTILINE)
+    first_line_end = text.find("\n")
+    if end is None or first_line_end == -1 or text[3:first_line_end].strip():
+        return {}, text
+    block = text[first_line_end + 1:3 + end.start()]
+    body = text[3 + end.end():].lstrip("\n")
+    try:
+        import yaml
+        parsed = yaml.safe_load(block) or {}
+    except Exception:
+        # Not YAML after all (or no PyYAML); fall back to plain "key: value" lines
+        parsed = {}
+        for line in block.splitlines():
+            key, sep, value = line.partition(":")
+            if sep and key.strip():
+                parsed[key.strip()] = value.strip().strip("'\"")
+    if not isinstance(parsed, dict):
+        return {}, text
+    # Keep only values that survive pickling into the docstore and read well as metadata
+    metadata = {
+        str(k): v for k, v in parsed.items()
+        if isinstance(v, (str, int, float, bool)) or (isinstance(v, list) and all(isinstance(i, (str, int, float, bool)) for i in v))
+    }
+    return metadata, body
+
+
+def _read_markdown(path: str) -> Document:
+    """Read one markdown file verbatim (headings kept for the header-aware splitter)."""
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        text = f.read()
+    metadata, body = _parse_front_matter(text)
+    metadata["source"] = path
+    return Document(page_content=body, metadata=metadata)
+
 
-    loader = DirectoryLoader(
-        DATA_DIR,
-        glob="**/*.md",
-        loader_cls=UnstructuredMarkdownLoader,
-        show_progress=True,
-        use_multithreading=True,
+def _iter_documents(data_dir: str = DATA_DIR, workers: int = LOADER_WORKERS) -> Iterator[Document]:
+    """Yield markdown documents under ``data_dir`` in path order, read by a thread pool.
+
+    Files are submitted in windows of a few per worker, so memory stays bounded
+    however large the corpus is and the splitter can start on the first files.
+    """
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, files in os.walk(data_dir)
+        for name in files
+        if name.lower().endswith(".md")
     )
+    window = max(1, workers) * 4
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for i in range(0, len(paths), window):
+            for doc in pool.map(_read_markdown, paths[i:i + window]):
+                if doc.page_content.strip():
+                    yield doc
 
-    docs = loader.load()
-    if not docs:
-        print("No documents found. Exiting.")
-    else:
-        print(f"Loaded {len(docs)} document(s).")
-    return docs
 
-def _split_documents_header_aware(docs):
+def _iter_splits_header_aware(
+    docs: Iterable[Document],
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+) -> Iterator[Document]:
+    """Split documents by markdown headers, then by size (CHUNK_SIZE/CHUNK_OVERLAP unless given), one document at a time."""
     headers_to_split_on = [("#", "h1"), ("##", "h2"), ("###", "h3")]
     md_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on, strip_headers=False)
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE if chunk_size is None else chunk_size,
+        chunk_overlap=CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+    )
 
-    header_docs = []
     for d in docs:
+        header_docs = []
         try:
             parts = md_splitter.split_text(d.page_content)
         except Exception:
@@ -81,12 +179,784 @@ def _split_documents_header_aware(docs):
                 md["source"] = d.metadata["source"]
             s.metadata = md
             header_docs.append(s)
+        yield from text_splitter.split_documents(header_docs)
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
+
+def _split_documents_header_aware(docs, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None):
+    return list(_iter_splits_header_aware(docs, chunk_size, chunk_overlap))
+
+
+def _split_parent_child(parents):
+    """Split each parent chunk into small children that point back to it.
+
+    Children carry ``parent_id`` and their ``start_index`` within the parent so
+    the API can return the whole parent or a window around the matched span.
+    """
+    child_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHILD_CHUNK_SIZE,
+        chunk_overlap=CHILD_CHUNK_OVERLAP,
+        add_start_index=True,
     )
-    return text_splitter.split_documents(header_docs)
+    parents_by_id = {}
+    children = []
+    for parent in parents:
+        key = f"{parent.metadata.get('source', '')}\n{parent.page_content}"
+        parent_id = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        parents_by_id[parent_id] = parent
+        for child in child_splitter.split_documents([parent]):
+            child.metadata["parent_id"] = parent_id
+            children.append(child)
+    return children, parents_by_id
+
+
+def _iter_chunks(chunking: str) -> Iterator[Tuple[Document, Optional[Document]]]:
+    """Stream ``(chunk, parent)`` pairs for the whole corpus, one file at a time.
+
+    ``parent`` is None for standard chunking. The order is deterministic (sorted
+    paths), which is what lets an interrupted build skip chunks it already embedded.
+    """
+    for doc in _iter_documents():
+        sections = _split_documents_header_aware([doc])
+        if chunking == "parent_child":
+            children, parents_by_id = _split_parent_child(sections)
+            for child in children:
+                yield child, parents_by_id[child.metadata["parent_id"]]
+        else:
+            for chunk in sections:
+                yield chunk, None
+
+
+class _NearDuplicateFilter:
+    """MinHash/LSH filter that drops chunks nearly identical to one already kept.
+
+    Each chunk is reduced to word 5-gram shingles and a MinHash signature; the
+    signature is split into bands, and any earlier chunk sharing a band is a
+    candidate that is confirmed when the estimated Jaccard similarity reaches
+    ``threshold``. Hashing uses crc32 so decisions are identical across runs,
+    which checkpoint resume relies on. Dropped chunks are recorded as aliases
+    of the kept (canonical) one.
+
+    Unlike the rest of the streaming build, memory grows with the corpus:
+    every kept chunk holds its signature (``4 * num_perm`` bytes) and one
+    bucket entry per band, about 2.5 KB per kept chunk with the defaults (so
+    ~2.5 GB per million chunks). ``report()`` prints the measured figure; use
+    ``--no-dedup`` for corpora where that does not fit.
+    """
+
+    _PRIME = np.uint64((1 << 61) - 1)
+    _MASK = np.uint64((1 << 32) - 1)
+
+    def __init__(self, threshold: float, num_perm: int = DEDUP_NUM_PERM, shingle_words: int = 5):
+        self.threshold = threshold
+        self.shingle_words = shingle_words
+        rng = np.random.RandomState(1)
+        self._a = rng.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self.bands, self.rows = self._band_layout(threshold, num_perm)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        # Kept signatures, one row each; grown by doubling so rows carry no per-array overhead
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self.kept = 0
+        self.aliases: Dict[int, List[Dict]] = {}
+        self.seen = 0
+
+    @staticmethod
+    def _band_layout(threshold: float, num_perm: int) -> Tuple[int, int]:
+        # Pick bands × rows whose S-curve midpoint (1/b)^(1/r) is closest to the threshold
+        layouts = [(num_perm // r, r) for r in range(1, num_perm + 1) if num_perm % r == 0]
+        return min(layouts, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+    def _signature(self, text: str) -> np.ndarray:
+        words = text.lower().split()
+        k = self.shingle_words
+        shingles = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+        hashes = np.fromiter((zlib.crc32(sh.encode("utf-8")) for sh in shingles), dtype=np.uint64, count=len(shingles))
+        # Universal hashing (a*x + b) mod p, truncated to 32 bits
+        permuted = self._permute(hashes[:, None], self._a, self._b) & self._MASK
+        return permuted.min(axis=0).astype(np.uint32)
+
+    @classmethod
+    def _mod_prime(cls, y: np.ndarray) -> np.ndarray:
+        # 2^61 ≡ 1 (mod p), so the bits above 61 fold back onto the low ones
+        y = (y & cls._PRIME) + (y >> np.uint64(61))
+        return np.where(y >= cls._PRIME, y - cls._PRIME, y)
+
+    @classmethod
+    def _permute(cls, x: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Exact ``(a*x + b) mod (2^61 - 1)`` for 32-bit ``x`` and ``a, b < 2^61`` without leaving uint64.
+
+        ``a`` is split into 32-bit limbs so every partial product fits:
+        ``a*x = a_hi*x*2^32 + a_lo*x`` with ``a_hi*x < 2^61`` and ``a_lo*x < 2^64``.
+        """
+        a_hi, a_lo = a >> np.uint64(32), a & cls._MASK
+        high = a_hi * x
+        # high*2^32 = (high >> 29)*2^61 + (high mod 2^29)*2^32 ≡ (high >> 29) + (high mod 2^29)*2^32
+        high = ((high & np.uint64((1 << 29) - 1)) << np.uint64(32)) + (high >> np.uint64(29))
+        return cls._mod_prime(cls._mod_prime(high) + cls._mod_prime(a_lo * x) + b)
+
+    @property
+    def dropped(self) -> int:
+        return sum(len(v) for v in self.aliases.values())
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held for kept signatures and LSH buckets."""
+        total = self._signatures.nbytes
+        for buckets in self._buckets:
+            total += sys.getsizeof(buckets)
+            total += sum(sys.getsizeof(key) + sys.getsizeof(positions) for key, positions in buckets.items())
+        return total
+
+    def filter(self, chunks: Iterator[Tuple[Document, Optional[Document]]]) -> Iterator[Tuple[Document, Optional[Document]]]:
+        for chunk, parent in chunks:
+            self.seen += 1
+            signature = self._signature(chunk.page_content)
+            keys = [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+            candidates = sorted({c for band, key in enumerate(keys) for c in self._buckets[band].get(key, ())})
+            canonical = next(
+                (c for c in candidates if np.mean(self._signatures[c] == signature) >= self.threshold),
+                None,
+            )
+            if canonical is not None:
+                self.aliases.setdefault(canonical, []).append(
+                    {k: chunk.metadata[k] for k in ("source", "section") if k in chunk.metadata}
+                )
+                continue
+            position = self.kept
+            if position == len(self._signatures):
+                self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+            self._signatures[position] = signature
+            self.kept += 1
+            for band, key in enumerate(keys):
+                self._buckets[band].setdefault(key, []).append(position)
+            yield chunk, parent
+
+    def report(self) -> str:
+        saved = self.dropped
+        pct = 100.0 * saved / self.seen if self.seen else 0.0
+        return (
+            f"Near-duplicate removal (threshold {self.threshold}, {self.bands}x{self.rows} LSH bands): "
+            f"{self.seen} chunks seen, {saved} folded into {len(self.aliases)} canonical chunks; "
+            f"{saved} fewer vectors to embed and search ({pct:.1f}%); "
+            f"filter state {self.memory_bytes() / 1e6:.0f} MB for {self.kept} kept chunks (--no-dedup to skip)."
+        )
+
+
+def _corpus_fingerprint(data_dir: str) -> str:
+    """Paths, sizes and mtimes of the markdown corpus, so a checkpoint is only resumed on the same input."""
+    h = hashlib.sha1()
+    for root, _, files in sorted(os.walk(data_dir)):
+        for name in sorted(files):
+            if name.lower().endswith(".md"):
+                st = os.stat(os.path.join(root, name))
+                h.update(f"{os.path.join(root, name)}:{st.st_size}:{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _build_params(embedding_model: str, chunking: str, dedup_threshold: float, embedding_backend: str = "ollama") -> Dict:
+    """Everything that determines an index's content; checkpoints and manifests record it."""
+    return {
+        "embedding_model": embedding_model,
+        "embedding_backend": embedding_backend,
+        "chunking": chunking,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "child_chunk_size": CHILD_CHUNK_SIZE,
+        "child_chunk_overlap": CHILD_CHUNK_OVERLAP,
+        "dedup_threshold": dedup_threshold,
+        "corpus": _corpus_fingerprint(DATA_DIR),
+    }
+
+
+def _checkpoint_dir(target_index_dir: str) -> str:
+    # Kept outside the index directory so the API's hot reload never sees a partial index
+    return target_index_dir.rstrip("/") + ".checkpoint"
+
+
+class _IngestSpool:
+    """Append-only, on-disk state of a streaming build, kept in ``<index_dir>.checkpoint``.
+
+    Each embedded batch goes straight to disk: ``vectors.f32`` (raw float32
+    rows), ``chunks.jsonl`` (one record per vector) and ``parents.jsonl``
+    (parent sections, once each), so the build only holds the batch in flight.
+    A checkpoint fsyncs the files and records their lengths in
+    ``checkpoint.json``; that cursor is all it writes, so checkpoint cost
+    follows the new batches rather than the corpus. On resume anything
+    appended after the last cursor is truncated away.
+    """
+
+    FORMAT = "spool-1"
+    VECTORS = "vectors.f32"
+    CHUNKS = "chunks.jsonl"
+    PARENTS = "parents.jsonl"
+    STATE = "checkpoint.json"
+
+    def __init__(self, target_index_dir: str, build_params: Dict, resume: bool):
+        self.path = _checkpoint_dir(target_index_dir)
+        self.count = 0
+        self.dimension: Optional[int] = None
+        self.parent_ids = set()
+        self._build_params = build_params
+        state = self._read_state() if resume else None
+        if state is not None and (state.get("format") != self.FORMAT or state.get("params") != build_params):
+            print(f"Ignoring checkpoint in '{self.path}': corpus, chunking parameters or checkpoint format changed.")
+            state = None
+        if state is None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.makedirs(self.path)
+            lengths = {name: 0 for name in (self.VECTORS, self.CHUNKS, self.PARENTS)}
+        else:
+            lengths = state["bytes"]
+            self.count = int(state["vectors"])
+            self.dimension = state.get("dimension")
+        self._files = {}
+        for name, length in lengths.items():
+            f = open(os.path.join(self.path, name), "a+b")
+            f.truncate(length)
+            self._files[name] = f
+        for record in self._records(self.PARENTS):
+            self.parent_ids.add(record["id"])
+
+    def _read_state(self) -> Optional[Dict]:
+        state_path = os.path.join(self.path, self.STATE)
+        if not os.path.exists(state_path):
+            return None
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _line(record: Dict) -> bytes:
+        return (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+    def append(self, batch, vectors) -> None:
+        rows = np.asarray(vectors, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = int(rows.shape[1])
+        elif rows.shape[1] != self.dimension:
+            raise RuntimeError(f"Embedding dimension changed mid-build: {rows.shape[1]} != {self.dimension}")
+        self._files[self.VECTORS].write(rows.tobytes())
+        self._files[self.CHUNKS].write(b"".join(
+            self._line({"text": chunk.page_content, "metadata": chunk.metadata}) for chunk, _ in batch
+        ))
+        for chunk, parent in batch:
+            if parent is None:
+                continue
+            doc_id = PARENT_ID_PREFIX + chunk.metadata["parent_id"]
+            if doc_id not in self.parent_ids:
+                self.parent_ids.add(doc_id)
+                self._files[self.PARENTS].write(
+                    self._line({"id": doc_id, "text": parent.page_content, "metadata": parent.metadata})
+                )
+        for f in self._files.values():
+            # Hand the batch to the OS so it is not retained in Python buffers
+            f.flush()
+        self.count += len(batch)
+
+    def checkpoint(self) -> None:
+        lengths = {}
+        for name, f in self._files.items():
+            f.flush()
+            os.fsync(f.fileno())
+            lengths[name] = f.tell()
+        state = {
+            "format": self.FORMAT,
+            "params": self._build_params,
+            "vectors": self.count,
+            "dimension": self.dimension,
+            "bytes": lengths,
+            "saved_at": time.time(),
+        }
+        tmp_path = os.path.join(self.path, self.STATE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, os.path.join(self.path, self.STATE))
+
+    def _records(self, name: str) -> Iterator[Dict]:
+        self._files[name].flush()
+        with open(os.path.join(self.path, name), "rb") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def chunks(self) -> Iterator[Document]:
+        for record in self._records(self.CHUNKS):
+            yield Document(page_content=record["text"], metadata=record["metadata"])
+
+    def parents(self) -> Iterator[Tuple[str, Document]]:
+        for record in self._records(self.PARENTS):
+            yield record["id"], Document(page_content=record["text"], metadata=record["metadata"])
+
+    def vectors(self) -> np.ndarray:
+        self._files[self.VECTORS].flush()
+        if not self.count:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+        return np.memmap(os.path.join(self.path, self.VECTORS), dtype=np.float32, mode="r", shape=(self.count, self.dimension))
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+
+
+def _produce_batches(chunks: Iterator, skip: int, batch_size: int, out: "queue.Queue", stop: threading.Event) -> None:
+    """Split-stage thread: group chunks into batches on a bounded queue (blocks when embedding lags)."""
+    try:
+        batch = []
+        for i, item in enumerate(chunks):
+            if stop.is_set():
+                return
+            if i < skip:
+                continue
+            batch.append(item)
+            if len(batch) >= batch_size:
+                out.put(batch)
+                batch = []
+        if batch:
+            out.put(batch)
+        out.put(None)
+    except BaseException as e:  # surfaced in the consumer
+        out.put(e)
+
+
+def _embed_texts(texts: List[str], clients, executor: Optional[ThreadPoolExecutor]) -> List[List[float]]:
+    """Embed one batch, sharded contiguously across replicas so vectors stay in order."""
+    if executor is None or len(clients) == 1:
+        return clients[0].embed_documents(texts)
+    shard_size = (len(texts) + len(clients) - 1) // len(clients)
+    shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+    results = list(executor.map(lambda job: job[0].embed_documents(job[1]), zip(clients, shards)))
+    return [v for shard in results for v in shard]
+
+
+def _embedding_clients(embedding_model: str, base_urls: List[str], backend: str) -> List:
+    """One embeddings client per Ollama replica, or a single in-process ONNX embedder."""
+    if backend == "ollama":
+        return [OllamaEmbeddings(model=embedding_model, base_url=url) for url in base_urls]
+    if backend != "onnx":
+        raise ValueError(f"Unknown embedding backend '{backend}' (expected 'ollama' or 'onnx')")
+    onnx_dir = os.path.join(ONNX_EMBEDDER_ROOT, _slug_from_embedding(embedding_model))
+    print(f"Embedding in-process with ONNX Runtime ('{onnx_dir}').")
+    return [create_embeddings("onnx", embedding_model, base_urls[0], onnx_dir, ONNX_THREADS)]
+
+
+def _reduce_vectorstore(vectorstore, method: str, dim: int):
+    """Replace the index's vectors by their ``method`` projection to ``dim`` dimensions; returns the projection.
+
+    Runs on the finished full-dimension index, so checkpoints and resume are
+    unaffected and PCA is fitted on the corpus actually indexed.
+    """
+    import faiss
+
+    full = vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+    projection = Projection.fit(method, full, dim, REDUCE_PCA_SAMPLE)
+    reduced = faiss.IndexFlatL2(dim)
+    reduced.add(projection.apply(full))
+    vectorstore.index = reduced
+    return projection
+
+
+def _build_vectorstore_streaming(
+    target_index_dir: str,
+    embedding_model: str,
+    base_urls: List[str],
+    chunking: str,
+    batch_size: int = INGEST_BATCH_SIZE,
+    checkpoint_every: int = INGEST_CHECKPOINT_EVERY,
+    resume: bool = True,
+    dedup_threshold: float = DEDUP_THRESHOLD,
+    embedding_backend: str = EMBEDDING_BACKEND,
+    store_root: Optional[str] = CHUNK_STORE_DIR,
+):
+    """Load → split → dedup → embed → spool in bounded batches, checkpointing so an interrupted build resumes.
+
+    The split stage runs in its own thread and hands batches over a queue of
+    ``INGEST_QUEUE_BATCHES``, so at most a few batches of text are in flight
+    whatever the corpus size; each batch is embedded across all replicas and
+    appended to the on-disk spool (see ``_IngestSpool``) before the next is
+    taken. The index and its chunk store are assembled from the spool at the end.
+    The near-duplicate filter is the exception: its state grows with the number
+    of kept chunks (see ``_NearDuplicateFilter``).
+    """
+    clients = _embedding_clients(embedding_model, base_urls, embedding_backend)
+    build_params = _build_params(embedding_model, chunking, dedup_threshold, embedding_backend)
+    spool = _IngestSpool(target_index_dir, build_params, resume=resume and checkpoint_every > 0)
+    chunks_done = spool.count
+    if chunks_done:
+        print(f"Resuming from checkpoint at chunk {chunks_done}.")
+
+    chunks = _iter_chunks(chunking)
+    # The filter replays from the start on resume, so the kept sequence (and skip count) is unchanged
+    dedup = _NearDuplicateFilter(dedup_threshold) if dedup_threshold > 0 else None
+    if dedup is not None:
+        chunks = dedup.filter(chunks)
+
+    batches: "queue.Queue" = queue.Queue(maxsize=max(1, INGEST_QUEUE_BATCHES))
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=_produce_batches,
+        args=(chunks, chunks_done, batch_size, batches, stop),
+        daemon=True,
+    )
+    producer.start()
+    executor = ThreadPoolExecutor(max_workers=len(clients)) if len(clients) > 1 else None
+    t0 = time.perf_counter()
+    last_checkpoint = chunks_done
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if isinstance(batch, BaseException):
+                raise batch
+            vectors = _embed_texts([chunk.page_content for chunk, _ in batch], clients, executor)
+            spool.append(batch, vectors)
+            chunks_done += len(batch)
+            if chunks_done // 2000 != (chunks_done - len(batch)) // 2000:
+                rate = (chunks_done - last_checkpoint) / max(time.perf_counter() - t0, 1e-9)
+                print(f"  embedded {chunks_done} chunks ({rate:.0f}/s)", flush=True)
+            if checkpoint_every > 0 and chunks_done - last_checkpoint >= checkpoint_every:
+                spool.checkpoint()
+                print(f"  checkpoint saved at chunk {chunks_done}")
+                last_checkpoint = chunks_done
+                t0 = time.perf_counter()
+    finally:
+        stop.set()
+        # Unblock the producer if it is waiting on a full queue
+        while producer.is_alive():
+            try:
+                batches.get_nowait()
+            except queue.Empty:
+                producer.join(timeout=0.1)
+        if executor is not None:
+            executor.shutdown()
+    if dedup is not None:
+        print(dedup.report())
+    try:
+        if not spool.count:
+            return None, 0
+        vectorstore = _assemble_vectorstore(
+            spool, clients[0], chunking, dedup.aliases if dedup is not None else {}, store_root or os.path.join(spool.path, "store")
+        )
+    finally:
+        spool.close()
+    return vectorstore, chunks_done
+
+
+def _assemble_vectorstore(spool: "_IngestSpool", embedding, chunking: str, aliases: Dict[int, List[Dict]], store_root: str):
+    """FAISS index over the spooled vectors, backed by a memory-mapped chunk store written from the spool.
+
+    Near-duplicate aliases are attached to their canonical chunk's metadata as
+    the records stream past, so the chunk texts are never all in memory at once.
+    """
+    import faiss
+
+    def spooled_chunks() -> Iterator[Document]:
+        for position, doc in enumerate(spool.chunks()):
+            if position in aliases:
+                doc.metadata["aliases"] = aliases[position]
+            yield doc
+
+    # Ids first (a read-only pass), so a store another model already wrote is found without rewriting it
+    vector_ids = [_chunk_id(doc) for doc in spooled_chunks()]
+    store_ids = vector_ids + [doc_id for doc_id, _ in spool.parents()]
+    if chunking == "parent_child":
+        store_ids.append(PARENT_CHILD_MARKER_ID)
+
+    def records() -> Iterator[Tuple[str, Document]]:
+        yield from zip(vector_ids, spooled_chunks())
+        # Parents and the parent/child marker keep their docstore ids so the API can look them up
+        yield from spool.parents()
+        if chunking == "parent_child":
+            yield PARENT_CHILD_MARKER_ID, Document(page_content="", metadata={"chunking": "parent_child"})
+
+    store_path, created = _write_chunk_store(records(), store_root, store_ids)
+    print(f"{'Wrote' if created else 'Reusing'} chunk store '{store_path}' ({spool.count} vectors).")
+
+    index = faiss.IndexFlatL2(spool.dimension)
+    vectors = spool.vectors()
+    for start in range(0, len(vectors), 65536):
+        index.add(np.ascontiguousarray(vectors[start:start + 65536]))
+    del vectors
+    vectorstore = FAISS(embedding, index, ChunkStoreDocstore(ChunkStore(store_path)), dict(enumerate(vector_ids)))
+    vectorstore.chunk_store_path = store_path
+    return vectorstore
+
+
+def _chunk_id(doc: Document) -> str:
+    """Content address of a chunk: identical text and metadata give the same id in every build."""
+    payload = json.dumps({"text": doc.page_content, "metadata": doc.metadata}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+
+
+def _chunk_store_key(ids: Iterable[str]) -> str:
+    return hashlib.sha1("\n".join(sorted(set(ids))).encode("utf-8")).hexdigest()[:16]
+
+
+def _write_chunk_store(
+    records: Iterable[Tuple[str, Document]], store_root: str, ids: Optional[List[str]] = None
+) -> Tuple[str, bool]:
+    """Write ``(chunk id, document)`` records as a memory-mappable store; reuse it if it already exists.
+
+    The directory is named after the set of chunk ids, so every model built from
+    the same corpus and chunking settings lands on the same store. When the ids
+    are passed up front an existing store is found before anything is written
+    and ``records`` is never read. Records are streamed to disk (repeated ids are
+    written once). Returns ``(path, created)``. Layout must match
+    src/rag/chunk_store.py.
+    """
+    if ids is not None:
+        path = os.path.join(store_root, _chunk_store_key(ids))
+        if os.path.exists(os.path.join(path, "store.json")):
+            return path, False
+    os.makedirs(store_root, exist_ok=True)
+    tmp_dir = os.path.join(store_root, f".tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    written: List[str] = []
+    seen = set()
+    offsets = [0]
+    with open(os.path.join(tmp_dir, "chunks.bin"), "wb") as f:
+        for chunk_id, doc in records:
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            written.append(chunk_id)
+            record = json.dumps({"text": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False, default=str)
+            offsets.append(offsets[-1] + f.write(record.encode("utf-8")))
+    path = os.path.join(store_root, _chunk_store_key(written))
+    if os.path.exists(os.path.join(path, "store.json")):
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return path, False
+
+    np.save(os.path.join(tmp_dir, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(tmp_dir, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(written, f)
+    with open(os.path.join(tmp_dir, "store.json"), "w", encoding="utf-8") as f:
+        json.dump({"chunks": len(written), "bytes": offsets[-1], "created_at": time.time()}, f)
+    try:
+        os.rename(tmp_dir, path)
+    except OSError:
+        # Another build published the same store first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return path, False
+    return path, True
+
+
+def _save_with_chunk_store(vectorstore, target_index_dir: str) -> None:
+    """Save only the vectors plus chunk ids for this model; texts stay in the shared chunk store."""
+    import faiss
+
+    os.makedirs(target_index_dir, exist_ok=True)
+    faiss.write_index(vectorstore.index, os.path.join(target_index_dir, "index.faiss"))
+    vector_ids = [vectorstore.index_to_docstore_id[i] for i in range(vectorstore.index.ntotal)]
+    refs = {"store": os.path.relpath(vectorstore.chunk_store_path, target_index_dir), "ids": vector_ids}
+    tmp_refs = os.path.join(target_index_dir, "chunk_refs.json.tmp")
+    with open(tmp_refs, "w", encoding="utf-8") as f:
+        json.dump(refs, f)
+    os.replace(tmp_refs, os.path.join(target_index_dir, "chunk_refs.json"))
+    # Registered before publishing so a concurrent prune does not collect the store in between
+    _register_chunk_store_ref(target_index_dir)
+    # The pickled docstore of an earlier legacy build is no longer read
+    legacy_pickle = os.path.join(target_index_dir, "index.pkl")
+    if os.path.exists(legacy_pickle):
+        os.remove(legacy_pickle)
+
+
+def _save_legacy(vectorstore, target_index_dir: str) -> None:
+    """Self-contained ``save_local`` layout (CHUNK_STORE_DIR empty): the pickle needs an in-memory docstore."""
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+
+    store = vectorstore.docstore.store
+    vectorstore.docstore = InMemoryDocstore({chunk_id: store.get(chunk_id) for chunk_id in store.ids()})
+    os.makedirs(target_index_dir, exist_ok=True)
+    vectorstore.save_local(target_index_dir)
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _versions_dir(target_index_dir: str) -> str:
+    return target_index_dir.rstrip("/") + ".versions"
+
+
+def _write_manifest(index_dir: str, manifest: Dict) -> Dict:
+    """Checksum every file in ``index_dir`` and write manifest.json (must match src/rag/index_reload.py)."""
+    files = {}
+    for name in sorted(os.listdir(index_dir)):
+        path = os.path.join(index_dir, name)
+        if os.path.isfile(path) and name != "manifest.json":
+            files[name] = {"sha256": _file_sha256(path), "bytes": os.path.getsize(path)}
+    manifest = {**manifest, "files": files}
+    with open(os.path.join(index_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _verify_index_dir(index_dir: str) -> Dict:
+    """Re-read a staged index and check it against its manifest before it is published."""
+    import faiss
+
+    with open(os.path.join(index_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    for name, expected in manifest["files"].items():
+        actual = _file_sha256(os.path.join(index_dir, name))
+        if actual != expected["sha256"]:
+            raise RuntimeError(f"Checksum mismatch for '{name}' in '{index_dir}'")
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+    if index.ntotal != manifest["vectors"] or index.d != manifest["dimension"]:
+        raise RuntimeError(
+            f"index.faiss has {index.ntotal}x{index.d} vectors, manifest says {manifest['vectors']}x{manifest['dimension']}"
+        )
+    refs_path = os.path.join(index_dir, "chunk_refs.json")
+    if os.path.exists(refs_path):
+        with open(refs_path, "r", encoding="utf-8") as f:
+            refs = json.load(f)
+        if len(refs["ids"]) != index.ntotal:
+            raise RuntimeError(f"chunk_refs.json lists {len(refs['ids'])} chunks for {index.ntotal} vectors")
+        if not os.path.exists(os.path.join(index_dir, refs["store"], "store.json")):
+            raise RuntimeError(f"Chunk store '{refs['store']}' referenced by '{index_dir}' is missing")
+    return manifest
+
+
+def _list_versions(target_index_dir: str) -> List[str]:
+    """Published version directories, oldest first."""
+    versions_dir = _versions_dir(target_index_dir)
+    if not os.path.isdir(versions_dir):
+        return []
+
+    def created_at(path: str) -> float:
+        try:
+            with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+                return float(json.load(f)["created_at"])
+        except Exception:
+            return os.path.getmtime(path)
+
+    paths = [
+        os.path.join(versions_dir, name)
+        for name in os.listdir(versions_dir)
+        if not name.endswith(".tmp") and os.path.isdir(os.path.join(versions_dir, name))
+    ]
+    return sorted(paths, key=created_at)
+
+
+def _point_index_at(target_index_dir: str, version_dir: str) -> None:
+    """Atomically repoint the ``target_index_dir`` symlink at ``version_dir`` (a relative link, so mounts work)."""
+    target = target_index_dir.rstrip("/")
+    if os.path.isdir(target) and not os.path.islink(target):
+        # Index written in place by an older build: keep it as a version so it can be rolled back to
+        legacy_dir = os.path.join(_versions_dir(target), time.strftime("legacy-%Y%m%dT%H%M%S", time.localtime(os.path.getmtime(target))))
+        os.rename(target, legacy_dir)
+    link_tmp = target + ".link-tmp"
+    if os.path.lexists(link_tmp):
+        os.remove(link_tmp)
+    os.symlink(os.path.relpath(version_dir, os.path.dirname(target) or "."), link_tmp)
+    os.replace(link_tmp, target)
+
+
+def _chunk_store_of(index_dir: str) -> Optional[str]:
+    """Chunk store an index (or staged index) references, or None for the legacy pickle layout."""
+    refs_path = os.path.join(index_dir, "chunk_refs.json")
+    if not os.path.exists(refs_path):
+        return None
+    with open(refs_path, "r", encoding="utf-8") as f:
+        return os.path.normpath(os.path.join(index_dir, json.load(f)["store"]))
+
+
+def _register_chunk_store_ref(index_dir: str) -> None:
+    """Record under ``<store>/refs/`` that ``index_dir`` uses the store, so pruning can tell when nobody does.
+
+    Several models' indexes share one store, so a store is only collected once
+    every index version that registered it is gone. The marker is keyed by the
+    published path, so registering the staged directory and then the published
+    one rewrites the same marker.
+    """
+    store = _chunk_store_of(index_dir)
+    if store is None:
+        return
+    index_dir = os.path.realpath(index_dir)
+    published = index_dir[:-len(".tmp")] if index_dir.endswith(".tmp") else index_dir
+    refs_dir = os.path.join(store, "refs")
+    os.makedirs(refs_dir, exist_ok=True)
+    marker = os.path.join(refs_dir, hashlib.sha1(published.encode("utf-8")).hexdigest()[:16])
+    with open(marker + ".tmp", "w", encoding="utf-8") as f:
+        f.write(index_dir)
+    os.replace(marker + ".tmp", marker)
+
+
+def _collect_chunk_stores(store_root: str) -> None:
+    """Delete stores in ``store_root`` whose registered index versions have all been removed.
+
+    Stores without a ``refs/`` directory predate reference tracking and are left alone.
+    """
+    if not os.path.isdir(store_root):
+        return
+    for name in sorted(os.listdir(store_root)):
+        refs_dir = os.path.join(store_root, name, "refs")
+        if not os.path.isdir(refs_dir):
+            continue
+        live = False
+        for marker in os.listdir(refs_dir):
+            marker_path = os.path.join(refs_dir, marker)
+            try:
+                with open(marker_path, "r", encoding="utf-8") as f:
+                    user = f.read().strip()
+            except OSError:
+                continue
+            if os.path.isdir(user):
+                live = True
+            else:
+                os.remove(marker_path)
+        if not live:
+            shutil.rmtree(os.path.join(store_root, name), ignore_errors=True)
+            print(f"Removed unreferenced chunk store '{name}'.")
+
+
+def _prune_versions(target_index_dir: str, keep: int) -> None:
+    current = os.path.realpath(target_index_dir)
+    versions_dir = _versions_dir(target_index_dir)
+    removed_stores = set()
+    # Staging directories left behind by interrupted builds
+    for name in os.listdir(versions_dir):
+        if name.endswith(".tmp"):
+            removed_stores.add(_chunk_store_of(os.path.join(versions_dir, name)))
+            shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+    old = [v for v in _list_versions(target_index_dir) if os.path.realpath(v) != current]
+    for path in old[:max(0, len(old) - max(0, keep - 1))]:
+        removed_stores.add(_chunk_store_of(path))
+        shutil.rmtree(path, ignore_errors=True)
+        print(f"Removed old index version '{os.path.basename(path)}'.")
+    # Chunk stores only the removed versions used would otherwise accumulate across rebuilds
+    for store_root in sorted({os.path.dirname(store) for store in removed_stores if store}):
+        _collect_chunk_stores(store_root)
+
+
+def _publish_index(staging_dir: str, target_index_dir: str, manifest: Dict, keep: int = INDEX_KEEP_VERSIONS) -> str:
+    """Checksum and verify a staged build, move it into the versions directory and swap the symlink."""
+    manifest = _write_manifest(staging_dir, manifest)
+    _verify_index_dir(staging_dir)
+    version_dir = os.path.join(_versions_dir(target_index_dir), manifest["version"])
+    os.rename(staging_dir, version_dir)
+    _register_chunk_store_ref(version_dir)
+    _point_index_at(target_index_dir, version_dir)
+    _prune_versions(target_index_dir, keep)
+    return version_dir
+
+
+def _rollback_index(target_index_dir: str) -> Optional[str]:
+    """Point ``target_index_dir`` at the version published before the current one."""
+    current = os.path.realpath(target_index_dir)
+    versions = _list_versions(target_index_dir)
+    resolved = [os.path.realpath(v) for v in versions]
+    older = versions[:resolved.index(current)] if current in resolved else []
+    if not older:
+        return None
+    previous = older[-1]
+    if os.path.exists(os.path.join(previous, "manifest.json")):
+        _verify_index_dir(previous)
+    _point_index_at(target_index_dir, previous)
+    return previous
 
 
 def _is_running_in_docker() -> bool:
@@ -120,6 +990,19 @@ def resolve_ollama_base_url(preset: Optional[str]) -> str:
     # 3) Auto-detect: host => localhost, container => host.docker.internal
     return "http://host.docker.internal:11434" if _is_running_in_docker() else "http://localhost:11434"
 
+def resolve_ollama_base_urls(preset: Optional[str]) -> List[str]:
+    """All Ollama replicas to embed with: OLLAMA_BASE_URLS if set, else the single resolved URL."""
+    if OLLAMA_BASE_URLS_ENV:
+        return [u.rstrip("/") for u in _parse_models_csv(OLLAMA_BASE_URLS_ENV)]
+    return [resolve_ollama_base_url(preset)]
+
+
+def _target_index_dir(embedding_model: str, is_multi: bool) -> str:
+    if INDEX_DIR and not is_multi:
+        return INDEX_DIR
+    return f".rag_cache/{_slug_from_embedding(embedding_model)}/faiss_index"
+
+
 def main():
     """
     Build FAISS indexes for a list of embedding models only.
@@ -131,14 +1014,62 @@ def main():
     parser = argparse.ArgumentParser(description="Build FAISS index(es) for a list of embedding models.")
     parser.add_argument("--models", help="Comma-separated embedding models to build (overrides env/default)")
     parser.add_argument("--preset", choices=["local", "vm"], help="Environment preset to resolve endpoints")
+    parser.add_argument(
+        "--chunking",
+        choices=["standard", "parent_child"],
+        default=CHUNKING_MODE,
+        help="Embed the chunks directly, or embed small children and expand to parents at query time",
+    )
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Chunks embedded per batch")
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=INGEST_CHECKPOINT_EVERY,
+        help="Save a resumable checkpoint every N chunks (0 disables)",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=DEDUP_THRESHOLD,
+        help="Fold chunks whose estimated Jaccard similarity to an earlier chunk reaches this (0 disables)",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Skip near-duplicate removal; its memory grows with the corpus (about 2.5 KB per kept chunk)",
+    )
+    parser.add_argument("--no-resume", action="store_true", help="Ignore existing checkpoints and start from scratch")
+    parser.add_argument(
+        "--rollback",
+        action="store_true",
+        help="Instead of building, point each model's index back at its previous published version",
+    )
+    parser.add_argument(
+        "--embedding-backend",
+        choices=["ollama", "onnx"],
+        default=EMBEDDING_BACKEND,
+        help="Embed chunks via Ollama over HTTP or with the verified in-process ONNX embedder",
+    )
+    parser.add_argument(
+        "--reduce",
+        choices=["truncate", "pca"],
+        default=EMBEDDING_REDUCTION or None,
+        help="Store reduced vectors: keep the first --dim dimensions (Matryoshka) or a fitted PCA projection",
+    )
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="Dimensions kept with --reduce")
     args = parser.parse_args()
+    if args.reduce and args.dim <= 0:
+        parser.error("--reduce needs --dim (or EMBEDDING_DIM) > 0")
+    if args.no_dedup:
+        args.dedup_threshold = 0.0
 
     print("--- Starting FAISS Index Build ---")
 
     # Resolve endpoints
     global OLLAMA_BASE_URL
-    OLLAMA_BASE_URL = resolve_ollama_base_url(args.preset)
-    print(f"Using OLLAMA_BASE_URL: {OLLAMA_BASE_URL}")
+    base_urls = resolve_ollama_base_urls(args.preset)
+    OLLAMA_BASE_URL = base_urls[0]
+    print(f"Using Ollama backend(s): {', '.join(base_urls)}")
 
     # Decide which embeddings to build
     embeddings_to_build: List[str]
@@ -158,14 +1089,21 @@ def main():
     if is_multi and INDEX_DIR:
         print(f"NOTE: Ignoring INDEX_DIR='{INDEX_DIR}' because multiple embeddings will be built.")
 
-    # --- 1. Load Documents once ---
-    docs = _load_documents()
-    if not docs:
+    if args.rollback:
+        for embedding_model in embeddings_to_build:
+            target_index_dir = _target_index_dir(embedding_model, is_multi)
+            previous = _rollback_index(target_index_dir)
+            if previous is None:
+                print(f"No earlier version of '{target_index_dir}' to roll back to.")
+            else:
+                print(f"✓ '{target_index_dir}' now points at '{os.path.basename(previous)}'")
         return
-    # --- 2. Split Documents into Chunks once ---
-    print("Splitting documents into chunks (header-aware)...")
-    splits = _split_documents_header_aware(docs)
-    print(f"Created {len(splits)} document chunks.")
+
+    # Documents are streamed from disk per model (load → split → embed → add); nothing is held corpus-wide
+    if not any(name.lower().endswith(".md") for _, _, files in os.walk(DATA_DIR) for name in files):
+        print("No documents found. Exiting.")
+        return
+    print(f"Streaming markdown under '{DATA_DIR}' ({args.chunking} chunking, batches of {args.batch_size}).")
 
     # --- 3. Build per embedding ---
 
@@ -173,32 +1111,79 @@ def main():
     for embedding_model in embeddings_to_build:
         print(f"\n=== Building index for embedding: {embedding_model} ===")
 
-        # Ensure the embedding model is pulled locally in the ollama container
-        try:
-            print(f"Pulling embedding model '{embedding_model}' from Ollama...")
-            requests.post(f"{OLLAMA_BASE_URL}/api/pull", json={"name": embedding_model}, timeout=600)
-            print("Successfully pulled embedding model.")
-        except Exception as e:
-            print(f"Warning: Could not pull embedding model '{embedding_model}'. It may need to be pulled manually. Error: {e}")
+        # Ensure the embedding model is pulled on every Ollama replica
+        for base_url in base_urls if args.embedding_backend == "ollama" else []:
+            try:
+                print(f"Pulling embedding model '{embedding_model}' from Ollama at {base_url}...")
+                requests.post(f"{base_url}/api/pull", json={"name": embedding_model}, timeout=600)
+                print("Successfully pulled embedding model.")
+            except Exception as e:
+                print(f"Warning: Could not pull embedding model '{embedding_model}'. It may need to be pulled manually. Error: {e}")
 
         # Determine per-embedding index directory
-        target_index_dir = INDEX_DIR
-        if not target_index_dir or is_multi:
-            slug = _slug_from_embedding(embedding_model)
-            target_index_dir = f".rag_cache/{slug}/faiss_index"
+        target_index_dir = _target_index_dir(embedding_model, is_multi)
         print(f"Using index directory: '{target_index_dir}'")
 
         # Create embeddings and vector store
-        embeddings = OllamaEmbeddings(
-            model=embedding_model,
-            base_url=OLLAMA_BASE_URL,
-        )
         print("Creating FAISS vector store from document chunks...")
-        vectorstore = FAISS.from_documents(documents=splits, embedding=embeddings)
+        t0 = time.perf_counter()
+        vectorstore, chunk_count = _build_vectorstore_streaming(
+            target_index_dir,
+            embedding_model,
+            base_urls,
+            args.chunking,
+            batch_size=args.batch_size,
+            checkpoint_every=args.checkpoint_every,
+            resume=not args.no_resume,
+            dedup_threshold=args.dedup_threshold,
+            embedding_backend=args.embedding_backend,
+        )
+        if vectorstore is None:
+            print("No chunks produced. Skipping.")
+            continue
+        embed_s = time.perf_counter() - t0
+        print(f"Embedded {chunk_count} chunks in {embed_s:.1f}s.")
+
+        projection = None
+        if args.reduce and args.dim < vectorstore.index.d:
+            t_reduce = time.perf_counter()
+            source_dim = vectorstore.index.d
+            projection = _reduce_vectorstore(vectorstore, args.reduce, args.dim)
+            variance = f", {projection.explained_variance:.1%} of variance kept" if projection.explained_variance else ""
+            print(f"Reduced vectors {source_dim} -> {args.dim} dimensions ({args.reduce}{variance}) in {time.perf_counter() - t_reduce:.1f}s.")
+        elif args.reduce:
+            print(f"Model vectors are already {vectorstore.index.d}-d; not reducing to {args.dim}.")
 
-        print(f"Saving FAISS index to '{target_index_dir}'...")
-        os.makedirs(target_index_dir, exist_ok=True)
-        vectorstore.save_local(target_index_dir)
+        # Stage the new version next to the live one; readers only ever see a complete, verified index
+        version = time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+        staging_dir = os.path.join(_versions_dir(target_index_dir), version + ".tmp")
+        print(f"Saving FAISS index version '{version}'...")
+        t1 = time.perf_counter()
+        if CHUNK_STORE_DIR:
+            _save_with_chunk_store(vectorstore, staging_dir)
+        else:
+            _save_legacy(vectorstore, staging_dir)
+        manifest = {
+            "version": version,
+            "created_at": time.time(),
+            "vectors": vectorstore.index.ntotal,
+            "dimension": vectorstore.index.d,
+            "params": _build_params(embedding_model, args.chunking, args.dedup_threshold, args.embedding_backend),
+            "timings": {"embed_s": round(embed_s, 3), "save_s": round(time.perf_counter() - t1, 3)},
+        }
+        if projection is not None:
+            # Queries are projected with this at search time (src/rag/reduction.py)
+            manifest["reduction"] = projection.save(staging_dir)
+        # Per-field allow-lists of vector ids, resolved to FAISS ID selectors for filtered queries
+        metadatas = (
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]).metadata
+            for i in range(vectorstore.index.ntotal)
+        )
+        manifest["filters"] = save_filter_lists(staging_dir, metadatas)
+        version_dir = _publish_index(staging_dir, target_index_dir, manifest)
+        print(f"Published '{target_index_dir}' -> '{version_dir}'")
+        for leftover in (_checkpoint_dir(target_index_dir), _checkpoint_dir(target_index_dir) + ".new"):
+            shutil.rmtree(leftover, ignore_errors=True)
         print(f"✓ Completed: {embedding_model}")
         success_count += 1
 
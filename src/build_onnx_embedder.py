@@ -0,0 +1,187 @@
+"""
+Prepare the in-process ONNX embedder for an Ollama embedding model and verify
+it reproduces Ollama's vectors.
+
+The model's Hugging Face checkpoint is exported to ONNX (the export needs
+``pip install optimum[onnxruntime]`` on the machine running it; the API only
+needs onnxruntime and tokenizers), and its weights are quantized to int8 with
+ONNX Runtime's dynamic quantization. Handbook chunks and testset questions are
+then embedded through both the ONNX model and Ollama: the embedder passes when
+every vector is within --min-cosine of Ollama's. The outcome is written to
+verification.json, and EMBEDDING_BACKEND=onnx refuses to load a model that has
+not passed.
+
+Usage:
+  python -m src.build_onnx_embedder --model bge-m3 --preset local
+  python -m src.build_onnx_embedder --model bge-m3 --verify-only --min-cosine 0.99
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_ollama import OllamaEmbeddings
+
+from src.benchmarking.retrieval_metrics import load_reference_pairs
+from src.build_index import _iter_documents, _slug_from_embedding, _split_documents_header_aware, resolve_ollama_base_url
+from src.rag.embedding_backends import (
+    ONNX_INT8_MODEL_FILE,
+    ONNX_MODEL_FILE,
+    ONNX_SPEC_FILE,
+    ONNX_VERIFICATION_FILE,
+    OnnxEmbedder,
+    cosine_agreement,
+    default_onnx_dir,
+)
+
+
+load_dotenv()
+
+DEFAULT_TESTSETS = "data/testset/*.json"
+
+# Ollama model -> Hugging Face checkpoint, pooling and max input tokens (from each model card)
+SUPPORTED_MODELS: Dict[str, Dict] = {
+    "bge-m3": {"hf_model": "BAAI/bge-m3", "pooling": "cls", "max_length": 8192},
+    "hf.co/Qwen/Qwen3-Embedding-0.6B-GGUF:Q8_0": {"hf_model": "Qwen/Qwen3-Embedding-0.6B", "pooling": "last", "max_length": 8192},
+    "yxchia/multilingual-e5-large-instruct": {"hf_model": "intfloat/multilingual-e5-large-instruct", "pooling": "mean", "max_length": 512},
+}
+
+
+def _export(hf_model: str, out_dir: str) -> Dict:
+    """Export ``hf_model`` to ``out_dir/model.onnx`` and save its fast tokenizer; returns the pad token."""
+    try:
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+    except ImportError:
+        raise SystemExit("Exporting needs 'optimum[onnxruntime]' (pip install 'optimum[onnxruntime]').")
+    print(f"Exporting '{hf_model}' to ONNX in '{out_dir}'...")
+    ORTModelForFeatureExtraction.from_pretrained(hf_model, export=True).save_pretrained(out_dir)
+    tokenizer = AutoTokenizer.from_pretrained(hf_model)
+    tokenizer.save_pretrained(out_dir)
+    pad_token = tokenizer.pad_token or tokenizer.eos_token
+    return {"pad_token": pad_token, "pad_id": tokenizer.convert_tokens_to_ids(pad_token)}
+
+
+def _quantize(out_dir: str) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print("Quantizing weights to int8...")
+    quantize_dynamic(
+        os.path.join(out_dir, ONNX_MODEL_FILE),
+        os.path.join(out_dir, ONNX_INT8_MODEL_FILE),
+        weight_type=QuantType.QInt8,
+    )
+
+
+def _verification_texts(samples: int, testsets: str) -> Dict[str, List[str]]:
+    chunks = [c.page_content for c in _split_documents_header_aware(_iter_documents())]
+    if len(chunks) > samples:
+        # Evenly spaced, so every part of the handbook (and every chunk length) is represented
+        chunks = [chunks[int(i)] for i in np.linspace(0, len(chunks) - 1, samples)]
+    questions = [q for q, _ in load_reference_pairs(testsets)][:samples]
+    return {"chunks": chunks, "questions": questions}
+
+
+def _topk_agreement(ref_q: np.ndarray, ref_c: np.ndarray, cand_q: np.ndarray, cand_c: np.ndarray, k: int) -> float:
+    """Mean overlap of each question's top-k chunks when both sides use Ollama vs both use ONNX."""
+    if not len(ref_q) or len(ref_c) < k:
+        return float("nan")
+    ref_top = np.argsort(-(ref_q @ ref_c.T), axis=1)[:, :k]
+    cand_top = np.argsort(-(cand_q @ cand_c.T), axis=1)[:, :k]
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]))
+
+
+def verify(model: str, model_dir: str, base_url: str, args) -> Dict:
+    texts = _verification_texts(args.samples, args.testsets)
+    all_texts = texts["chunks"] + texts["questions"]
+    print(f"Verifying against Ollama {base_url} on {len(texts['chunks'])} chunks and {len(texts['questions'])} questions...")
+
+    ollama = OllamaEmbeddings(model=model, base_url=base_url)
+    reference = np.asarray(
+        [v for i in range(0, len(all_texts), 32) for v in ollama.embed_documents(all_texts[i:i + 32])], dtype=np.float32
+    )
+    embedder = OnnxEmbedder(model_dir, threads=args.threads, require_verified=False)
+    t0 = time.perf_counter()
+    candidate = embedder.embed_array(all_texts)
+    onnx_s = time.perf_counter() - t0
+
+    n = len(texts["chunks"])
+    result = {
+        "model": model,
+        "model_file": embedder.spec.get("model_file"),
+        "ollama_base_url": base_url,
+        "samples": len(all_texts),
+        "dimension": int(candidate.shape[1]),
+        "tolerance": args.min_cosine,
+        "onnx_texts_per_s": round(len(all_texts) / onnx_s, 1) if onnx_s > 0 else None,
+        "verified_at": time.time(),
+    }
+    if reference.shape != candidate.shape:
+        result.update({"passed": False, "error": f"dimension {candidate.shape[1]} != Ollama's {reference.shape[1]}"})
+        return result
+    result.update(cosine_agreement(reference, candidate))
+    result["top5_agreement"] = _topk_agreement(reference[n:], reference[:n], candidate[n:], candidate[:n], 5)
+    result["passed"] = result["min_cosine"] >= args.min_cosine
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, quantize and verify an in-process ONNX embedder.")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "bge-m3"), help="Ollama embedding model to reproduce")
+    parser.add_argument("--hf-model", help="Hugging Face checkpoint to export (default from SUPPORTED_MODELS)")
+    parser.add_argument("--out-dir", help="Embedder directory (default .rag_cache/onnx/<slug>)")
+    parser.add_argument("--preset", choices=["local", "vm"], help="Environment preset to resolve endpoints")
+    parser.add_argument("--no-int8", action="store_true", help="Use the fp32 export instead of int8 weights")
+    parser.add_argument("--verify-only", action="store_true", help="Skip export/quantization and re-run verification")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Lowest acceptable cosine similarity to Ollama's vector")
+    parser.add_argument("--samples", type=int, default=200, help="Handbook chunks (and at most as many questions) to compare")
+    parser.add_argument("--testsets", default=DEFAULT_TESTSETS, help="Glob of testset JSON files supplying questions")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = default)")
+    args = parser.parse_args()
+
+    settings = dict(SUPPORTED_MODELS.get(args.model, {}))
+    if args.hf_model:
+        settings["hf_model"] = args.hf_model
+    if not args.verify_only and "hf_model" not in settings:
+        parser.error(f"'{args.model}' is not in SUPPORTED_MODELS; pass --hf-model (and check pooling in {ONNX_SPEC_FILE})")
+    out_dir = args.out_dir or default_onnx_dir(_slug_from_embedding(args.model))
+    base_url = resolve_ollama_base_url(args.preset)
+
+    if not args.verify_only:
+        os.makedirs(out_dir, exist_ok=True)
+        tokens = _export(settings["hf_model"], out_dir)
+        if not args.no_int8:
+            _quantize(out_dir)
+        spec = {
+            "model": args.model,
+            "hf_model": settings["hf_model"],
+            "model_file": ONNX_MODEL_FILE if args.no_int8 else ONNX_INT8_MODEL_FILE,
+            "pooling": settings.get("pooling", "mean"),
+            "max_length": settings.get("max_length", 512),
+            **tokens,
+        }
+        with open(os.path.join(out_dir, ONNX_SPEC_FILE), "w", encoding="utf-8") as f:
+            json.dump(spec, f, indent=2)
+
+    result = verify(args.model, out_dir, base_url, args)
+    with open(os.path.join(out_dir, ONNX_VERIFICATION_FILE), "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    if "error" in result:
+        print(f"FAIL: {result['error']}")
+        sys.exit(1)
+    print(
+        f"cosine to Ollama: min={result['min_cosine']:.4f} p05={result['p05_cosine']:.4f} mean={result['mean_cosine']:.4f}, "
+        f"top-5 agreement {result['top5_agreement']:.3f}, {result['onnx_texts_per_s']} texts/s in-process"
+    )
+    if not result["passed"]:
+        print(f"FAIL: min cosine below {args.min_cosine}; '{out_dir}' stays disabled for EMBEDDING_BACKEND=onnx")
+        sys.exit(1)
+    print(f"PASS: '{out_dir}' can be used with EMBEDDING_BACKEND=onnx")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,46 @@
-import os
 import time
+
+# Startup report: measured from here, before any other imports
+_PROCESS_STARTED = time.perf_counter()
+
+import os
 import uuid
 import json
+import asyncio
 import httpx
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
-# LangChain components
-from langchain_community.vectorstores import FAISS
-from langchain_ollama import OllamaEmbeddings, ChatOllama # Use modern Ollama classes
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI # Use the standard OpenAI client
+# LangChain is imported lazily (index load, first model call) so the API starts fast
+from src.rag.backends import OllamaPool, parse_backend_urls
+from src.rag.cache import TTLCache
+from src.rag.cancellation import (
+    DEADLINE_HEADER,
+    ClientDisconnected,
+    Deadline,
+    DeadlineExceeded,
+    guarded_stream,
+    run_guarded,
+)
+from src.rag.context_packing import parse_budget_overrides
+from src.rag.embedding_backends import EMBEDDING_BACKENDS, AsyncLocalEmbedder, create_embeddings, default_onnx_dir
+from src.rag.faq import FaqIndex
+from src.rag.filters import FILTER_FIELDS, FiltersUnavailable, RetrievalFilters, index_filters
+from src.rag.hedging import HedgeConfig, HedgePolicy, parse_model_map
+from src.rag.index_loader import load_faiss_index
+from src.rag.index_reload import IndexReloader, IndexSlot, LoadedIndex, index_fingerprint
+from src.rag.llm import LLMFactory
+from src.rag.metrics import metrics, monitor_event_loop_lag
+from src.rag.num_ctx import parse_num_ctx_buckets
+from src.rag.pipeline import Generation, RagPipeline, source_labels
+from src.rag.retrieval import AsyncOllamaEmbedder, create_search_executor
+from src.rag.routing import AUTO_MODEL_ALIAS, CloudBudgetExceeded, HybridRouter, RouteDecision, RoutingConfig
+from src.rag.warmup import WarmupState, load_warmup_questions, preload_models, warm_up
 
 # Load environment variables
 load_dotenv()
@@ -27,6 +51,88 @@ INDEX_DIR = os.getenv("INDEX_DIR")
 EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
 LITELLM_API_BASE = os.getenv("LITELLM_API_BASE", "http://litellm:4000")
+# Several Ollama replicas (comma-separated) are load-balanced client-side; defaults to OLLAMA_BASE_URL
+OLLAMA_BASE_URLS = parse_backend_urls(os.getenv("OLLAMA_BASE_URLS") or OLLAMA_BASE_URL)
+OLLAMA_HEALTHCHECK_INTERVAL_S = float(os.getenv("OLLAMA_HEALTHCHECK_INTERVAL_S", "5"))
+OLLAMA_EJECT_FAILURES = int(os.getenv("OLLAMA_EJECT_FAILURES", "3"))
+OLLAMA_EJECT_S = float(os.getenv("OLLAMA_EJECT_S", "30"))
+OLLAMA_SLOW_FACTOR = float(os.getenv("OLLAMA_SLOW_FACTOR", "3"))
+# Query embedding: "ollama" over HTTP, or "onnx" in-process on CPU (prepare with src/build_onnx_embedder.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "ollama")
+ONNX_EMBEDDER_DIR = os.getenv("ONNX_EMBEDDER_DIR")  # Defaults to .rag_cache/onnx/<slug>
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # Intra-op threads per inference; 0 = ONNX Runtime default
+ONNX_EMBED_WORKERS = int(os.getenv("ONNX_EMBED_WORKERS", "2"))
+# Retrieval depth and per-model context token budgets for prompt packing
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+# Parent/child indexes: children fetched per parent slot, and how parents are expanded ("parent" or "window")
+CHILD_FANOUT = int(os.getenv("CHILD_FANOUT", "3"))
+PARENT_EXPANSION = os.getenv("PARENT_EXPANSION", "parent")
+EXPANSION_WINDOW_CHARS = int(os.getenv("EXPANSION_WINDOW_CHARS", "600"))
+CONTEXT_TOKEN_BUDGET_LOCAL = int(os.getenv("CONTEXT_TOKEN_BUDGET_LOCAL", "2500"))
+CONTEXT_TOKEN_BUDGET_CLOUD = int(os.getenv("CONTEXT_TOKEN_BUDGET_CLOUD", "6000"))
+CONTEXT_TOKEN_BUDGETS = parse_budget_overrides(os.getenv("CONTEXT_TOKEN_BUDGETS"))
+# Ollama num_ctx is snapped to the smallest bucket fitting prompt + expected output
+NUM_CTX_BUCKETS = parse_num_ctx_buckets(os.getenv("NUM_CTX_BUCKETS", "2048,4096,8192"))
+NUM_CTX_OUTPUT_RESERVE = int(os.getenv("NUM_CTX_OUTPUT_RESERVE", "768"))
+# FAISS search runs on its own pool; 0 sizes it from the CPU count
+SEARCH_THREADS = int(os.getenv("SEARCH_THREADS", "0"))
+MODELS_CACHE_TTL_S = float(os.getenv("MODELS_CACHE_TTL_S", "30"))
+# End-to-end request deadline (retrieval + generation); clients may lower it via X-Request-Timeout
+REQUEST_TIMEOUT_S = float(os.getenv("REQUEST_TIMEOUT_S", "600"))
+# Hybrid routing for the "auto" model alias: local SLM first, cloud spillover when the SLO is at risk
+ROUTING_CONFIG = RoutingConfig(
+    local_model=os.getenv("ROUTING_LOCAL_MODEL", "ollama/phi3:mini"),
+    cloud_model=os.getenv("ROUTING_CLOUD_MODEL", "gpt-4o-mini"),
+    slo_p95_s=float(os.getenv("ROUTING_SLO_P95_S", "10")),
+    local_parallel_slots=int(os.getenv("ROUTING_LOCAL_PARALLEL_SLOTS", "1")),
+    local_max_queue=int(os.getenv("ROUTING_LOCAL_MAX_QUEUE", "8")),
+    cloud_max_inflight=int(os.getenv("ROUTING_CLOUD_MAX_INFLIGHT", "4")),
+    cloud_daily_cost_cap_usd=float(os.getenv("ROUTING_CLOUD_DAILY_COST_CAP_USD", "5")),
+    cloud_price_per_1k_input=float(os.getenv("ROUTING_CLOUD_PRICE_PER_1K_INPUT", "0.00015")),
+    cloud_price_per_1k_output=float(os.getenv("ROUTING_CLOUD_PRICE_PER_1K_OUTPUT", "0.0006")),
+)
+# Hedged requests: a second attempt when the first token is later than the observed TTFT quantile
+HEDGE_CONFIG = HedgeConfig(
+    enabled=os.getenv("HEDGE_ENABLED", "false").lower() in ("1", "true", "yes"),
+    ttft_quantile=float(os.getenv("HEDGE_TTFT_QUANTILE", "90")),
+    min_delay_s=float(os.getenv("HEDGE_MIN_DELAY_S", "0.25")),
+    default_delay_s=float(os.getenv("HEDGE_DEFAULT_DELAY_S", "2")),
+    max_rate=float(os.getenv("HEDGE_MAX_RATE", "0.1")),
+    fallback_models=parse_model_map(os.getenv("HEDGE_FALLBACK_MODELS")),
+)
+# Extractive fast path: serve curated FAQ answers (built by src/build_faq.py) without calling a model
+FAQ_FAST_PATH_ENABLED = os.getenv("FAQ_FAST_PATH_ENABLED", "false").lower() in ("1", "true", "yes")
+FAQ_PATH = os.getenv("FAQ_PATH")  # Defaults to faq.json next to the FAISS index
+FAQ_MIN_SIMILARITY = float(os.getenv("FAQ_MIN_SIMILARITY", "0.92"))
+FAQ_MAX_DISTANCE = float(os.environ["FAQ_MAX_DISTANCE"]) if os.getenv("FAQ_MAX_DISTANCE") else None
+# In-process caches for repeated questions (size 0 disables); answers are keyed by model + full prompt
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "4096"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+# Startup warm-up: replay known questions to fill the caches; /readyz waits for WARMUP_MIN_COVERAGE
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+WARMUP_SUGGESTIONS_PATH = os.getenv("WARMUP_SUGGESTIONS_PATH", "data/prompt-suggestions/prompt-suggestions-ucl-cs-handbook.json")
+WARMUP_TESTSET_PATH = os.getenv("WARMUP_TESTSET_PATH")
+WARMUP_MAX_QUESTIONS = int(os.getenv("WARMUP_MAX_QUESTIONS", "50"))
+# Empty: the routing local model if Ollama has it pulled, else the first pulled chat model
+WARMUP_MODELS = [m.strip() for m in os.getenv("WARMUP_MODELS", "").split(",") if m.strip()]
+# Also generate answers (fills the answer cache, needs the chat models); off warms embeddings + retrieval only
+WARMUP_ANSWERS = os.getenv("WARMUP_ANSWERS", "false").lower() in ("1", "true", "yes")
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "2"))
+WARMUP_MIN_COVERAGE = float(os.getenv("WARMUP_MIN_COVERAGE", "0.8"))
+# Opt-in: /readyz stops waiting for warm-up after this long (or once it has finished) and reports ready with a warning
+WARMUP_DEADLINE_S = float(os.getenv("WARMUP_DEADLINE_S")) if os.getenv("WARMUP_DEADLINE_S") else None
+# Preload models with this Ollama keep_alive (e.g. "30m") before warm-up; empty skips preloading
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "")
+# Serve /livez immediately and load the index in the background; /readyz gates traffic
+FAST_START = os.getenv("FAST_START", "false").lower() in ("1", "true", "yes")
+# Poll the index directory for a rebuilt index and hot-swap it (0 disables; POST /admin/reload-index still works)
+INDEX_WATCH_INTERVAL_S = float(os.getenv("INDEX_WATCH_INTERVAL_S", "10"))
+# Retrieval-only query that must succeed before /readyz passes
+READINESS_PROBE_QUESTION = os.getenv("READINESS_PROBE_QUESTION", "What are the assessment deadlines?")
+# Shared secret for /admin/* endpoints (sent as X-Admin-Token); unset leaves them open
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 
 def _slug_from_embedding(model_name: str) -> str:
@@ -34,25 +140,199 @@ def _slug_from_embedding(model_name: str) -> str:
     return _re.sub(r"[^A-Za-z0-9]+", "_", model_name.lower())
 
 # --- Data Models ---
+class QueryFilters(BaseModel):
+    """Restricts retrieval to matching chunks; fields combine with AND, listed sources with OR."""
+    section_prefix: Optional[str] = None
+    source: Optional[List[str]] = None
+    version: Optional[str] = None
+
+    def resolve(self) -> RetrievalFilters:
+        return RetrievalFilters(
+            section_prefix=(self.section_prefix or "").strip() or None,
+            sources=tuple(s for s in (self.source or []) if s.strip()),
+            version=(self.version or "").strip() or None,
+        )
+
 class QueryRequest(BaseModel):
     question: str
     model_name: str = Field(default="ollama/phi3:mini")
+    stream: bool = False
+    stream_format: Literal["ndjson", "sse"] = "ndjson"
+    allow_fast_path: bool = True
+    filters: Optional[QueryFilters] = None
 
 class Document(BaseModel):
     page_content: str
     metadata: dict
 
+class ContextStats(BaseModel):
+    chunks_retrieved: int
+    chunks_packed: int
+    context_tokens: int
+    context_tokens_saved: int
+    token_budget: int
+    overlap_chars_removed: int
+
 class QueryResponse(BaseModel):
     answer: str
     source_documents: List[Document]
+    context_stats: Optional[ContextStats] = None
+    routing: Optional[Dict[str, Any]] = None
+    hedge: Optional[Dict[str, Any]] = None
+    fast_path: Optional[Dict[str, Any]] = None
+
+_MODULE_IMPORT_S = time.perf_counter() - _PROCESS_STARTED
+
+class WarmupRequest(BaseModel):
+    max_questions: int = Field(default=WARMUP_MAX_QUESTIONS)
+    testset_path: Optional[str] = None
+    models: Optional[List[str]] = None
+    answer: bool = WARMUP_ANSWERS
 
 # --- Global Resources ---
 rag_resources = {}
+warmup_state = WarmupState()
+models_cache = TTLCache(max_entries=1, ttl_s=MODELS_CACHE_TTL_S)
+router = HybridRouter(ROUTING_CONFIG, metrics)
 
 # --- Lifespan Management ---
+def _load_faq(index_dir: str) -> Optional[FaqIndex]:
+    if not FAQ_FAST_PATH_ENABLED:
+        return None
+    faq_path = FAQ_PATH or os.path.join(os.path.dirname(index_dir.rstrip("/")), "faq.json")
+    if not os.path.exists(faq_path):
+        print(f"WARNING: FAQ fast path enabled but '{faq_path}' not found. Run src/build_faq.py first.")
+        return None
+    faq = FaqIndex.load(faq_path, min_similarity=FAQ_MIN_SIMILARITY, max_distance=FAQ_MAX_DISTANCE)
+    if faq.embedding_model != EMBEDDING_MODEL_NAME:
+        print(f"WARNING: FAQ at '{faq_path}' was built with '{faq.embedding_model}'; fast path disabled.")
+        return None
+    print(f"Loaded {len(faq)} FAQ entries from '{faq_path}'.")
+    return faq
+
+def _record_startup(phase: str, seconds: float) -> None:
+    rag_resources["startup"][phase] = round(seconds, 4)
+    metrics.set_gauge("startup_seconds", seconds, phase=phase)
+
+async def _initialise(index_dir: str) -> None:
+    """Load the index, build the pipeline and prove it works with a synthetic query."""
+    print(f"Loading FAISS index from '{index_dir}'...")
+    if not os.path.exists(index_dir):
+        raise RuntimeError(f"FAISS index not found. Run the index builder first.")
+    if EMBEDDING_BACKEND not in EMBEDDING_BACKENDS:
+        raise RuntimeError(f"EMBEDDING_BACKEND must be one of {', '.join(EMBEDDING_BACKENDS)}, got '{EMBEDDING_BACKEND}'")
+
+    local_embeddings = None
+    if EMBEDDING_BACKEND == "onnx":
+        t0 = time.perf_counter()
+        onnx_dir = ONNX_EMBEDDER_DIR or default_onnx_dir(_slug_from_embedding(EMBEDDING_MODEL_NAME))
+        local_embeddings = await asyncio.to_thread(
+            create_embeddings, "onnx", EMBEDDING_MODEL_NAME, OLLAMA_BASE_URLS[0], onnx_dir, ONNX_THREADS
+        )
+        _record_startup("embedder_load_s", time.perf_counter() - t0)
+        print(f"Embedding queries in-process with ONNX Runtime ('{onnx_dir}').")
+
+    def load():
+        timings: Dict[str, float] = {}
+        return load_faiss_index(index_dir, EMBEDDING_MODEL_NAME, OLLAMA_BASE_URLS[0], timings, local_embeddings), timings
+
+    version = index_fingerprint(index_dir)
+    # Blocking file I/O and unpickling run off the loop so /livez keeps answering
+    vectorstore, timings = await asyncio.to_thread(load)
+    for phase, seconds in timings.items():
+        _record_startup(phase, seconds)
+    rag_resources["vectorstore"] = vectorstore
+    print("FAISS index loaded successfully.")
+    if local_embeddings is not None:
+        # Also warms the ONNX session before the first real query; goes through any index projection
+        try:
+            dimension = len(await asyncio.to_thread(vectorstore.embedding_function.embed_query, READINESS_PROBE_QUESTION))
+        except ValueError as e:
+            raise RuntimeError(f"ONNX embedder does not match the index: {e}")
+        if dimension != vectorstore.index.d:
+            raise RuntimeError(f"ONNX embedder produces {dimension}-d vectors but the index holds {vectorstore.index.d}-d")
+
+    faq = _load_faq(index_dir)
+
+    pool = rag_resources["ollama_pool"]
+    await pool.refresh()
+    print(f"Ollama backends: {pool.status()}")
+    if local_embeddings is not None:
+        embedder = AsyncLocalEmbedder(local_embeddings, ONNX_EMBED_WORKERS)
+        rag_resources["local_embedder"] = embedder
+    else:
+        embedder = AsyncOllamaEmbedder(pool, EMBEDDING_MODEL_NAME, rag_resources["http_client"])
+    index = IndexSlot(vectorstore, version)
+    pipeline = RagPipeline(
+        index=index,
+        embedder=embedder,
+        search_executor=rag_resources["search_executor"],
+        llm_factory=LLMFactory(OLLAMA_BASE_URLS[0], LITELLM_API_BASE, NUM_CTX_BUCKETS, NUM_CTX_OUTPUT_RESERVE),
+        retrieval_k=RETRIEVAL_K,
+        budget_overrides=CONTEXT_TOKEN_BUDGETS,
+        local_budget=CONTEXT_TOKEN_BUDGET_LOCAL,
+        cloud_budget=CONTEXT_TOKEN_BUDGET_CLOUD,
+        pool=pool,
+        hedger=HedgePolicy(HEDGE_CONFIG, metrics, pool) if HEDGE_CONFIG.enabled else None,
+        faq=faq,
+        embedding_cache=TTLCache(EMBEDDING_CACHE_SIZE) if EMBEDDING_CACHE_SIZE > 0 else None,
+        retrieval_cache=TTLCache(RETRIEVAL_CACHE_SIZE) if RETRIEVAL_CACHE_SIZE > 0 else None,
+        answer_cache=TTLCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_S) if ANSWER_CACHE_SIZE > 0 else None,
+        child_fanout=CHILD_FANOUT,
+        parent_expansion=PARENT_EXPANSION,
+        expansion_window_chars=EXPANSION_WINDOW_CHARS,
+        router=router,
+    )
+    rag_resources["pipeline"] = pipeline
+
+    def on_swap(loaded: LoadedIndex) -> None:
+        rag_resources["vectorstore"] = loaded.vectorstore
+        # Retrieval keys are versioned; clearing just frees the stale entries
+        if pipeline.retrieval_cache is not None:
+            pipeline.retrieval_cache.clear()
+        pipeline.faq = _load_faq(index_dir)
+
+    reloader = IndexReloader(index_dir, index, load, on_swap=on_swap, interval_s=INDEX_WATCH_INTERVAL_S)
+    rag_resources["index_reloader"] = reloader
+    if INDEX_WATCH_INTERVAL_S > 0:
+        rag_resources["index_watch"] = asyncio.create_task(reloader.watch())
+    rag_resources["health_checks"] = asyncio.create_task(pool.run_health_checks())
+    rag_resources["synthetic_query"] = asyncio.create_task(_synthetic_query(pipeline))
+    if WARMUP_ENABLED:
+        # Runs in the background; /readyz reports not-ready until coverage is reached
+        rag_resources["warmup_requested_at"] = time.time()
+        rag_resources["warmup_task"] = asyncio.create_task(_warm_up(WarmupRequest(testset_path=WARMUP_TESTSET_PATH), preload=True))
+
+async def _synthetic_query(pipeline: RagPipeline, retry_s: float = 5.0) -> None:
+    """Embed + search one question (no generation); retried until it succeeds."""
+    while True:
+        t0 = time.perf_counter()
+        try:
+            await pipeline.prepare(READINESS_PROBE_QUESTION, ROUTING_CONFIG.local_model)
+        except Exception as e:
+            rag_resources["synthetic_query_error"] = str(e)
+            print(f"WARNING: synthetic readiness query failed ({e}); retrying in {retry_s:.0f}s")
+            await asyncio.sleep(retry_s)
+            continue
+        rag_resources.pop("synthetic_query_error", None)
+        rag_resources["synthetic_query_ok"] = True
+        _record_startup("first_query_s", time.perf_counter() - t0)
+        _record_startup("total_s", time.perf_counter() - _PROCESS_STARTED)
+        print(f"Startup report: {rag_resources['startup']}")
+        return
+
+async def _initialise_in_background(index_dir: str) -> None:
+    try:
+        await _initialise(index_dir)
+    except Exception as e:
+        rag_resources["init_error"] = str(e)
+        print(f"ERROR: RAG API initialisation failed: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("--- RAG API is starting up ---")
+    rag_resources["startup"] = {}
+    _record_startup("import_s", _MODULE_IMPORT_S)
 
     # Derive INDEX_DIR from EMBEDDING_MODEL when not explicitly set
     index_dir = INDEX_DIR
@@ -60,23 +340,36 @@ async def lifespan(app: FastAPI):
         slug = _slug_from_embedding(EMBEDDING_MODEL_NAME)
         index_dir = f".rag_cache/{slug}/faiss_index"
 
-    print(f"Loading FAISS index from '{index_dir}'...")
-    if not os.path.exists(index_dir):
-        raise RuntimeError(f"FAISS index not found. Run the index builder first.")
-
-    embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL_NAME, base_url=OLLAMA_BASE_URL)
-
-    vectorstore = FAISS.load_local(
-        index_dir,
-        embeddings,
-        allow_dangerous_deserialization=True
+    http_client = httpx.AsyncClient(timeout=30.0)
+    search_executor = create_search_executor(SEARCH_THREADS or None)
+    rag_resources["http_client"] = http_client
+    rag_resources["search_executor"] = search_executor
+    rag_resources["ollama_pool"] = OllamaPool(
+        OLLAMA_BASE_URLS,
+        http_client,
+        metrics,
+        probe_interval_s=OLLAMA_HEALTHCHECK_INTERVAL_S,
+        eject_failures=OLLAMA_EJECT_FAILURES,
+        eject_s=OLLAMA_EJECT_S,
+        slow_factor=OLLAMA_SLOW_FACTOR,
     )
-    rag_resources["vectorstore"] = vectorstore
-    print("FAISS index loaded successfully.")
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag(metrics))
+    if FAST_START:
+        rag_resources["init_task"] = asyncio.create_task(_initialise_in_background(index_dir))
+    else:
+        await _initialise(index_dir)
 
     yield
 
     print("--- RAG API is shutting down ---")
+    lag_monitor.cancel()
+    for task_name in ("init_task", "index_watch", "health_checks", "synthetic_query", "warmup_task"):
+        if task_name in rag_resources:
+            rag_resources[task_name].cancel()
+    await http_client.aclose()
+    search_executor.shutdown(wait=False, cancel_futures=True)
+    if "local_embedder" in rag_resources:
+        rag_resources["local_embedder"].close()
     rag_resources.clear()
 
 # --- FastAPI Application ---
@@ -86,87 +379,286 @@ app = FastAPI(title="RAG API", lifespan=lifespan)
 def health_check():
     return {"status": "ok"}
 
+@app.get("/livez")
+def liveness():
+    # The process and event loop are up; says nothing about the index
+    return {"status": "alive", "uptime_s": round(time.perf_counter() - _PROCESS_STARTED, 1)}
+
+@app.get("/readyz")
+def readiness():
+    covered = warmup_state.started_at is not None and warmup_state.coverage >= WARMUP_MIN_COVERAGE
+    # With WARMUP_DEADLINE_S set, stop waiting once warm-up has finished or the deadline has passed
+    requested_at = rag_resources.get("warmup_requested_at")
+    gave_up = WARMUP_DEADLINE_S is not None and (
+        (warmup_state.finished_at is not None and not warmup_state.running)
+        or (requested_at is not None and time.time() - requested_at >= WARMUP_DEADLINE_S)
+    )
+    warmed = not WARMUP_ENABLED or covered or gave_up
+    loaded = "pipeline" in rag_resources and rag_resources.get("synthetic_query_ok", False)
+    # Latch once ready so an admin-triggered re-warm does not take the instance out of rotation
+    ready = loaded and (rag_resources.get("ready", False) or warmed)
+    rag_resources["ready"] = ready
+    if ready:
+        status = "ready"
+    elif "init_error" in rag_resources:
+        status = "failed"
+    elif not loaded:
+        status = "loading"
+    else:
+        status = "warming_up"
+    body = {
+        "status": status,
+        "index_loaded": "vectorstore" in rag_resources,
+        "synthetic_query_ok": rag_resources.get("synthetic_query_ok", False),
+        "error": rag_resources.get("init_error") or rag_resources.get("synthetic_query_error"),
+        "warmup": warmup_state.as_dict(),
+        "startup": rag_resources.get("startup", {}),
+    }
+    if ready and WARMUP_ENABLED and not covered:
+        body["warning"] = f"warm-up coverage {warmup_state.coverage:.2f} is below {WARMUP_MIN_COVERAGE}; serving anyway"
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+@app.get("/metrics")
+def get_metrics():
+    return metrics.snapshot()
+
 @app.get("/info")
 def info():
     return {
         "index_dir": INDEX_DIR,
         "embedding_model": EMBEDDING_MODEL_NAME,
+        "embedding_backend": EMBEDDING_BACKEND,
         "ollama_base_url": OLLAMA_BASE_URL,
+        "ollama_backends": rag_resources["ollama_pool"].status() if "ollama_pool" in rag_resources else OLLAMA_BASE_URLS,
         "litellm_api_base": LITELLM_API_BASE,
+        "startup": rag_resources.get("startup", {}),
     }
 
-@app.post("/query", response_model=QueryResponse)
-async def query_rag_pipeline(request: QueryRequest) -> QueryResponse:
-    vectorstore = rag_resources.get("vectorstore")
-    if not vectorstore:
-        raise HTTPException(status_code=503, detail="Vector store not available.")
+@app.get("/filters")
+def list_filters():
+    """Values (normalized) the live index can be filtered on."""
+    filter_index = getattr(_get_pipeline().index.current.vectorstore, "filter_index", None)
+    if filter_index is None:
+        return {"available": False}
+    return {"available": True, **{name: filter_index.values(name) for name in FILTER_FIELDS}}
 
-    # Choose local vs cloud path
-    if request.model_name.startswith("ollama/"):
-        local_model = request.model_name.split("/", 1)[-1]
-        llm = ChatOllama(
-            model=local_model,
-            base_url=OLLAMA_BASE_URL,
-            temperature=0,
-            timeout=600,
-            model_kwargs={"num_ctx": 8192},
-        )
-    else:
-        # Cloud via LiteLLM (OpenAI-compatible)
-        llm = ChatOpenAI(
-            model=request.model_name,
-            openai_api_base=LITELLM_API_BASE,
-            openai_api_key="anything", # LiteLLM doesn't require a key for local models
-            request_timeout=600 # 10 minute timeout for large models
+async def _pulled_chat_models() -> List[str]:
+    """``ollama/<name>`` for every chat model the Ollama backends have pulled ([] if unreachable)."""
+    try:
+        # Replicas serve the same model set; ask the least busy healthy one
+        backend_url = rag_resources["ollama_pool"].preferred_url()
+        resp = await rag_resources["http_client"].get(f"{backend_url}/api/tags", timeout=5.0)
+        resp.raise_for_status()
+    except Exception:
+        return []
+    models = []
+    for m in resp.json().get("models", []):
+        name = m.get("name") or ""
+        lowered = name.lower()
+        # Heuristic: exclude embedding models to avoid offering non-chat models
+        if any(x in lowered for x in ["embedding", "embed", "bge", "e5"]):
+            continue
+        models.append(f"ollama/{name}")
+    return models
+
+async def _warmup_models(requested: Optional[List[str]]) -> List[str]:
+    """Explicit models, else a chat model Ollama actually has (the routing local model if pulled)."""
+    if requested or WARMUP_MODELS:
+        return requested or WARMUP_MODELS
+    pulled = await _pulled_chat_models()
+    if not pulled:
+        # Retrieval warm-up still works; answers for this model fail and stop being attempted
+        print("WARNING: no chat models found on Ollama; warm-up can only fill embeddings and retrieval.")
+        return [ROUTING_CONFIG.local_model]
+    if ROUTING_CONFIG.local_model in pulled:
+        return [ROUTING_CONFIG.local_model]
+    print(f"'{ROUTING_CONFIG.local_model}' is not pulled; warming up with '{pulled[0]}'.")
+    return [pulled[0]]
+
+async def _warm_up(request: WarmupRequest, preload: bool = False) -> WarmupState:
+    models = await _warmup_models(request.models)
+    if preload and OLLAMA_KEEP_ALIVE:
+        await preload_models(
+            rag_resources["http_client"],
+            rag_resources["ollama_pool"],
+            models,
+            EMBEDDING_MODEL_NAME if EMBEDDING_BACKEND == "ollama" else None,
+            OLLAMA_KEEP_ALIVE,
         )
+    questions = load_warmup_questions(WARMUP_SUGGESTIONS_PATH, request.testset_path, request.max_questions)
+    print(f"Warming up caches with {len(questions)} question(s) for {models}...")
+    return await warm_up(
+        rag_resources["pipeline"], questions, models, warmup_state, answer=request.answer, concurrency=WARMUP_CONCURRENCY
+    )
 
-    retriever = vectorstore.as_retriever()
-
-    # ---- Problem-solver prompt tailored for handbook-style queries ----
-    rag_prompt_template = """You are a helpful UCL Computer Science handbook assistant.
-Answer using ONLY the context. If the answer is not in the context, say "I don't know based on the handbook excerpts provided."
-
-Write concise, actionable guidance:
-- Start with the direct answer in one short sentence.
-- Then list 2–5 clear steps (what to do / who to contact / forms to submit / deadlines).
-- If relevant, include warnings/caveats (e.g., evidence required, timing rules).
-- End with a one-line source label: "Source: <section or heading>".
-
-STRICT RULES:
-- Do not invent emails, links, or policies not shown in context.
-- Prefer official terms from the context (e.g., Extenuating Circumstances, SORA).
-- Keep total length under ~8 lines.
-
-Context:
-{context}
+def _require_admin(raw_request: Request) -> None:
+    if ADMIN_TOKEN and raw_request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.post("/admin/warmup", status_code=202)
+async def start_warmup(raw_request: Request, request: Optional[WarmupRequest] = None):
+    _require_admin(raw_request)
+    _get_pipeline()
+    if warmup_state.running:
+        raise HTTPException(status_code=409, detail="Warm-up already running")
+    rag_resources["warmup_task"] = asyncio.create_task(_warm_up(request or WarmupRequest(testset_path=WARMUP_TESTSET_PATH)))
+    return {"status": "started"}
+
+@app.get("/admin/warmup")
+def warmup_status(raw_request: Request):
+    _require_admin(raw_request)
+    return warmup_state.as_dict()
+
+@app.post("/admin/reload-index")
+async def reload_index(raw_request: Request, force: bool = False):
+    """Load the index from disk and swap it in; in-flight requests finish on the old one."""
+    _require_admin(raw_request)
+    _get_pipeline()
+    try:
+        return await rag_resources["index_reloader"].reload(force=force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Index reload failed: {e}")
+
+@app.get("/admin/index")
+def index_status(raw_request: Request):
+    _require_admin(raw_request)
+    pipeline = _get_pipeline()
+    reloader = rag_resources["index_reloader"]
+    return {**pipeline.index.status(), "on_disk_version": index_fingerprint(reloader.index_dir), "last_error": reloader.last_error}
+
+def _get_pipeline() -> RagPipeline:
+    pipeline = rag_resources.get("pipeline")
+    if not pipeline:
+        raise HTTPException(status_code=503, detail="Vector store not available.")
+    return pipeline
 
-Question: {question}
+def _filters(pipeline: RagPipeline, filters: Optional[QueryFilters]) -> Optional[RetrievalFilters]:
+    resolved = filters.resolve() if filters is not None else None
+    if resolved is None or resolved.empty:
+        return None
+    try:
+        index_filters(pipeline.index.current.vectorstore)
+    except FiltersUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return resolved
 
-Helpful, grounded answer:"""
+def _deadline(raw_request: Request) -> Deadline:
+    return Deadline.from_header(raw_request.headers.get(DEADLINE_HEADER), REQUEST_TIMEOUT_S, REQUEST_TIMEOUT_S)
 
-    RAG_PROMPT = PromptTemplate(
-        template=rag_prompt_template,
-        input_variables=["context", "question"]
-    )
+async def _run_guarded(raw_request: Request, work, deadline: Deadline, endpoint: str):
+    """Run ``work`` bounded by the deadline and cancelled if the client disconnects."""
+    try:
+        return await run_guarded(raw_request, work, deadline, endpoint)
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+    except ClientDisconnected:
+        # Nobody is listening; the status only shows up in access logs
+        raise HTTPException(status_code=499, detail="Client disconnected")
+
+def _route(model_name: str) -> RouteDecision:
+    try:
+        return router.resolve(model_name)
+    except CloudBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
 
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever,
-        return_source_documents=True,
-        chain_type_kwargs={"prompt": RAG_PROMPT}
-    )
+def _encode_event(event: Dict[str, Any], stream_format: str) -> str:
+    payload = json.dumps(event, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event['event']}\ndata: {payload}\n\n"
+    return payload + "\n"
 
-    result = await qa_chain.ainvoke({"query": request.question})
+@app.post("/query", response_model=QueryResponse)
+async def query_rag_pipeline(request: QueryRequest, raw_request: Request):
+    pipeline = _get_pipeline()
+    deadline = _deadline(raw_request)
+    decision = _route(request.model_name)
+    filters = _filters(pipeline, request.filters)
+
+    if request.stream:
+        return _stream_query(pipeline, request, deadline, decision, filters)
+
+    prepared = await _run_guarded(raw_request, pipeline.prepare(request.question, decision.model, filters), deadline, "query")
+    if not request.allow_fast_path:
+        prepared.fast_path = None
+    if prepared.fast_path:
+        generation = pipeline.fast_answer(prepared)
+        metrics.inc("fast_path_answers_total", endpoint="query")
+    else:
+        async with router.track(decision) as route:
+            generation = await _run_guarded(raw_request, pipeline.generate(prepared), deadline, "query")
+            route.record_usage(*generation.charged_usage())
 
     return QueryResponse(
-        answer=result["result"],
+        answer=generation.text,
         source_documents=[
-            Document(page_content=doc.page_content, metadata=doc.metadata)
-            for doc in result["source_documents"]
-        ]
+            Document(page_content=chunk.text, metadata=chunk.metadata)
+            for chunk in prepared.packed.chunks
+        ],
+        context_stats=ContextStats(**prepared.packed.stats()),
+        routing=decision.as_dict(),
+        hedge=prepared.hedge or None,
+        fast_path=prepared.fast_path.as_dict() if prepared.fast_path else None,
     )
 
+def _stream_query(
+    pipeline: RagPipeline,
+    request: QueryRequest,
+    deadline: Deadline,
+    decision: RouteDecision,
+    filters: Optional[RetrievalFilters] = None,
+) -> StreamingResponse:
+    """Stream /query as events: sources after retrieval, answer deltas, then a final summary."""
+    async def event_stream():
+        started = time.perf_counter()
+        try:
+            try:
+                prepared = await asyncio.wait_for(
+                    pipeline.prepare(request.question, decision.model, filters), timeout=deadline.remaining()
+                )
+            except TimeoutError:
+                metrics.inc("requests_cancelled_total", endpoint="query", reason="deadline")
+                raise DeadlineExceeded()
+            if not request.allow_fast_path:
+                prepared.fast_path = None
+            yield _encode_event({
+                "event": "sources",
+                "source_documents": [
+                    {"page_content": chunk.text, "metadata": chunk.metadata}
+                    for chunk in prepared.packed.chunks
+                ],
+                "context_stats": prepared.packed.stats(),
+                "routing": decision.as_dict(),
+            }, request.stream_format)
+
+            if prepared.fast_path:
+                generation = pipeline.fast_answer(prepared)
+                metrics.inc("fast_path_answers_total", endpoint="query")
+                yield _encode_event({"event": "delta", "content": generation.text}, request.stream_format)
+            else:
+                generation = Generation(text="")
+                async with router.track(decision) as route:
+                    async for delta in guarded_stream(pipeline.stream(prepared, generation), deadline, "query"):
+                        yield _encode_event({"event": "delta", "content": delta}, request.stream_format)
+                    route.record_usage(*generation.charged_usage())
+
+            prepared.timings["total_s"] = time.perf_counter() - started
+            yield _encode_event({
+                "event": "final",
+                "answer": generation.text,
+                "timings": prepared.timings,
+                "usage": generation.usage(),
+                "hedge": prepared.hedge or None,
+                "fast_path": prepared.fast_path.as_dict() if prepared.fast_path else None,
+            }, request.stream_format)
+        except DeadlineExceeded:
+            yield _encode_event({"event": "error", "detail": "Request deadline exceeded"}, request.stream_format)
+        except Exception as e:
+            # Headers are already sent, so errors are reported in-band
+            yield _encode_event({"event": "error", "detail": str(e)}, request.stream_format)
+
+    media_type = "text/event-stream" if request.stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type)
+
 # --- OpenAI-compatible API Surface ---
 
 class ChatMessage(BaseModel):
@@ -178,26 +670,20 @@ class ChatCompletionRequest(BaseModel):
     model: str
     messages: List[ChatMessage]
     stream: Optional[bool] = False
+    # Not part of the OpenAI schema; OpenAI SDK clients send it via extra_body
+    filters: Optional[QueryFilters] = None
 
 
 @app.get("/v1/models")
-def list_models():
-    data = []
-    # 1) Discover local Ollama chat models
-    try:
-        resp = httpx.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=5.0)
-        if resp.status_code == 200:
-            payload = resp.json()
-            for m in payload.get("models", []):
-                name = m.get("name") or ""
-                lowered = name.lower()
-                # Heuristic: exclude embedding models to avoid offering non-chat models
-                if any(x in lowered for x in ["embedding", "embed", "bge", "e5"]):
-                    continue
-                data.append({"id": f"ollama/{name}", "object": "model"})
-    except Exception:
-        # If Ollama is unreachable, ignore silently; cloud models still listed
-        pass
+async def list_models():
+    cached = models_cache.get("models")
+    if cached is not None:
+        return cached
+
+    # Latency-aware local/cloud routing alias
+    data = [{"id": AUTO_MODEL_ALIAS, "object": "model"}]
+    # 1) Discover local Ollama chat models (none if Ollama is unreachable; cloud models still listed)
+    data.extend({"id": name, "object": "model"} for name in await _pulled_chat_models())
 
     # 2) Add cloud aliases configured in LiteLLM (mirrors config.yaml)
     cloud_models = [
@@ -210,86 +696,38 @@ def list_models():
     ]
     data.extend({"id": mid, "object": "model"} for mid in cloud_models)
 
-    return {"object": "list", "data": data}
+    result = {"object": "list", "data": data}
+    models_cache.set("models", result)
+    return result
 
 
 @app.post("/v1/chat/completions")
-async def chat_completions(req: ChatCompletionRequest):
+async def chat_completions(req: ChatCompletionRequest, raw_request: Request):
     # Extract last user message as the question
     question = next((m.content for m in reversed(req.messages) if m.role == "user"), "").strip()
     if not question:
         raise HTTPException(status_code=400, detail="No user message provided")
 
-    vectorstore = rag_resources.get("vectorstore")
-    if not vectorstore:
-        raise HTTPException(status_code=503, detail="Vector store not available.")
-
-    retriever = vectorstore.as_retriever()
-    docs = await retriever.aget_relevant_documents(question)
-    context_text = "\n\n".join(doc.page_content for doc in docs)
-
-    rag_prompt_template = """You are a helpful UCL Computer Science handbook assistant.
-Answer using ONLY the context. If the answer is not in the context, say "I don't know based on the handbook excerpts provided."
-
-Write concise, actionable guidance:
-- Start with the direct answer in one short sentence.
-- Then list 2–5 clear steps (what to do / who to contact / forms to submit / deadlines).
-- If relevant, include warnings/caveats (e.g., evidence required, timing rules).
-- End with a one-line source label: "Source: <section or heading>".
-
-STRICT RULES:
-- Do not invent emails, links, or policies not shown in context.
-- Prefer official terms from the context (e.g., Extenuating Circumstances, SORA).
-- Keep total length under ~8 lines.
-
-Context:
-{context}
-
-Question: {question}
-
-Helpful, grounded answer:"""
-
-    prompt = PromptTemplate(template=rag_prompt_template, input_variables=["context", "question"]).format(
-        context=context_text,
-        question=question,
-    )
-
-    # Select LLM
-    if req.model.startswith("ollama/"):
-        local_model = req.model.split("/", 1)[-1]
-        llm = ChatOllama(
-            model=local_model,
-            base_url=OLLAMA_BASE_URL,
-            temperature=0,
-            timeout=600,
-            model_kwargs={"num_ctx": 8192},
-        )
-    else:
-        llm = ChatOpenAI(
-            model=req.model,
-            openai_api_base=LITELLM_API_BASE,
-            openai_api_key="anything",
-            request_timeout=600,
-        )
+    pipeline = _get_pipeline()
+    deadline = _deadline(raw_request)
+    decision = _route(req.model)
+    filters = _filters(pipeline, req.filters)
+    prepared = await _run_guarded(raw_request, pipeline.prepare(question, decision.model, filters), deadline, "chat_completions")
 
     # Prepare a sources block for non-streaming or finalization
-    source_labels: List[str] = []
-    for d in docs:
-        label = d.metadata.get("section") or d.metadata.get("source") or d.metadata.get("file_path") or "Document"
-        if label not in source_labels:
-            source_labels.append(label)
+    labels = source_labels(prepared.packed.chunks)
+    if prepared.fast_path:
+        labels = prepared.fast_path.entry.sources[:1]
 
     if req.stream:
         async def event_stream():
             created = int(time.time())
             cid = f"chatcmpl-{uuid.uuid4()}"
-            # Stream token/content chunks
-            async for part in llm.astream(prompt):
-                delta = getattr(part, "content", None)
-                if delta is None:
-                    delta = str(part)
-                if not delta:
-                    continue
+            # Stream token/content chunks; stops (and closes upstream) on disconnect or deadline
+            finish_reason = "stop"
+            generation = Generation(text="")
+
+            def content_chunk(delta: str) -> str:
                 chunk = {
                     "id": cid,
                     "object": "chat.completion.chunk",
@@ -299,11 +737,24 @@ Helpful, grounded answer:"""
                         {"index": 0, "delta": {"content": delta}, "finish_reason": None}
                     ],
                 }
-                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+            if prepared.fast_path:
+                metrics.inc("fast_path_answers_total", endpoint="chat_completions")
+                yield content_chunk(pipeline.fast_answer(prepared).text)
+            else:
+                async with router.track(decision) as route:
+                    try:
+                        async for delta in guarded_stream(pipeline.stream(prepared, generation), deadline, "chat_completions"):
+                            yield content_chunk(delta)
+                    except DeadlineExceeded:
+                        # The answer was cut short; report it like a length stop
+                        finish_reason = "length"
+                    route.record_usage(*generation.charged_usage())
 
             # Append sources before final stop (optional)
-            if source_labels:
-                sources_text = "\n\nSources:\n" + "\n".join(f"- {s}" for s in source_labels)
+            if labels:
+                sources_text = "\n\nSources:\n" + "\n".join(f"- {s}" for s in labels)
                 src_chunk = {
                     "id": cid,
                     "object": "chat.completion.chunk",
@@ -321,7 +772,9 @@ Helpful, grounded answer:"""
                 "object": "chat.completion.chunk",
                 "created": created,
                 "model": req.model,
-                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+                "routing": decision.as_dict(),
+                "fast_path": prepared.fast_path.as_dict() if prepared.fast_path else None,
             }
             yield f"data: {json.dumps(final, ensure_ascii=False)}\n\n"
 
@@ -330,10 +783,16 @@ Helpful, grounded answer:"""
         return StreamingResponse(event_stream(), media_type="text/event-stream")
 
     # Non-streaming
-    result = await llm.ainvoke(prompt)
-    content = getattr(result, "content", None) or str(result)
-    if source_labels:
-        content = f"{content}\n\nSources:\n" + "\n".join(f"- {s}" for s in source_labels)
+    if prepared.fast_path:
+        generation = pipeline.fast_answer(prepared)
+        metrics.inc("fast_path_answers_total", endpoint="chat_completions")
+    else:
+        async with router.track(decision) as route:
+            generation = await _run_guarded(raw_request, pipeline.generate(prepared), deadline, "chat_completions")
+            route.record_usage(*generation.charged_usage())
+    content = generation.text
+    if labels:
+        content = f"{content}\n\nSources:\n" + "\n".join(f"- {s}" for s in labels)
 
     return {
         "id": f"chatcmpl-{uuid.uuid4()}",
@@ -343,5 +802,8 @@ Helpful, grounded answer:"""
         "choices": [
             {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
         ],
-        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        "usage": generation.usage(),
+        "context_stats": prepared.packed.stats(),
+        "routing": decision.as_dict(),
+        "fast_path": prepared.fast_path.as_dict() if prepared.fast_path else None,
     }
@@ -0,0 +1 @@
+# RAG API core package
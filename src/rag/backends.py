@@ -0,0 +1,237 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+
+from .metrics import MetricsRegistry
+
+
+def parse_backend_urls(csv_value: Optional[str]) -> List[str]:
+    """Parse ``http://a:11434,http://b:11434`` into a de-duplicated list of base URLs."""
+    urls: List[str] = []
+    for item in (csv_value or "").split(","):
+        url = item.strip().rstrip("/")
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def _ollama_model(model_name: str) -> str:
+    """``ollama/phi3:mini`` -> ``phi3:mini``; bare names (embedding models) pass through."""
+    return model_name.split("/", 1)[-1] if model_name.startswith("ollama/") else model_name
+
+
+def _with_tag(model: str) -> str:
+    # Ollama reports ``bge-m3:latest`` for a model requested as ``bge-m3``
+    return model if ":" in model else f"{model}:latest"
+
+
+def _is_replica_failure(exc: BaseException) -> bool:
+    """True for errors that say the replica is down or broken, not that the request was bad.
+
+    Transport failures and 5xx responses count; 4xx (model not pulled, bad
+    prompt) do not. The ollama client raises ``ResponseError`` with a
+    ``status_code`` rather than ``httpx.HTTPStatusError``, so both are read.
+    """
+    if isinstance(exc, (httpx.TransportError, ConnectionError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    status = getattr(exc, "status_code", None)
+    return isinstance(status, int) and status >= 500
+
+
+@dataclass
+class OllamaReplica:
+    url: str
+    outstanding: int = 0
+    healthy: bool = True
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    probe_latency_s: Optional[float] = None
+    resident_models: Set[str] = field(default_factory=set)
+
+    def ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+    def has_resident(self, model: str) -> bool:
+        return _with_tag(model) in {_with_tag(resident) for resident in self.resident_models}
+
+    def status(self, now: float) -> Dict[str, object]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected_for_s": round(max(0.0, self.ejected_until - now), 1),
+            "outstanding": self.outstanding,
+            "probe_latency_s": self.probe_latency_s,
+            "resident_models": sorted(self.resident_models),
+        }
+
+
+class OllamaPool:
+    """Client-side load balancing over several Ollama replicas.
+
+    Each request goes to the eligible replica with the fewest outstanding
+    requests, preferring replicas that already have the model resident (from
+    periodic ``/api/ps`` polls) so we avoid cold model loads. A replica is
+    ejected for ``eject_s`` after ``eject_failures`` consecutive errors, or when
+    its health probe is ``slow_factor`` times slower than the pool median.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        client: httpx.AsyncClient,
+        registry: MetricsRegistry,
+        probe_interval_s: float = 5.0,
+        probe_timeout_s: float = 2.0,
+        eject_failures: int = 3,
+        eject_s: float = 30.0,
+        slow_factor: float = 3.0,
+        affinity_max_extra: int = 2,
+    ):
+        if not urls:
+            raise ValueError("OllamaPool needs at least one backend URL")
+        self.replicas = [OllamaReplica(url=url) for url in urls]
+        self.client = client
+        self.metrics = registry
+        self.probe_interval_s = probe_interval_s
+        self.probe_timeout_s = probe_timeout_s
+        self.eject_failures = eject_failures
+        self.eject_s = eject_s
+        self.slow_factor = slow_factor
+        self.affinity_max_extra = affinity_max_extra
+        self._lock = threading.Lock()
+        self._turn = 0
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    @property
+    def urls(self) -> List[str]:
+        return [replica.url for replica in self.replicas]
+
+    # --- selection ---
+    def _eligible(self) -> List[OllamaReplica]:
+        now = time.monotonic()
+        # Rotate the starting point so ties on outstanding requests spread round-robin
+        self._turn = (self._turn + 1) % len(self.replicas)
+        rotated = self.replicas[self._turn:] + self.replicas[:self._turn]
+        eligible = [r for r in rotated if r.healthy and not r.ejected(now)]
+        # With every replica down, keep trying them all rather than failing outright
+        return eligible or rotated
+
+    def preferred_url(self) -> str:
+        """Least busy eligible replica, for side requests that should not count as load."""
+        with self._lock:
+            return min(self._eligible(), key=lambda r: r.outstanding).url
+
+    def pick(self, model_name: Optional[str] = None, exclude: Optional[Set[str]] = None) -> OllamaReplica:
+        with self._lock:
+            eligible = self._eligible()
+            candidates = [r for r in eligible if r.url not in (exclude or set())] or eligible
+            least = min(candidates, key=lambda r: r.outstanding)
+            affinity = "none"
+            if model_name:
+                model = _ollama_model(model_name)
+                resident = [r for r in candidates if r.has_resident(model)]
+                if resident:
+                    best_resident = min(resident, key=lambda r: r.outstanding)
+                    # Affinity wins unless that replica is much busier than the least loaded one
+                    if best_resident.outstanding <= least.outstanding + self.affinity_max_extra:
+                        least, affinity = best_resident, "resident"
+                    else:
+                        affinity = "overflow"
+                else:
+                    affinity = "cold"
+            least.outstanding += 1
+            self._set_outstanding_gauge(least)
+        self.metrics.inc("ollama_backend_requests_total", backend=least.url, affinity=affinity)
+        return least
+
+    def _release(self, replica: OllamaReplica) -> None:
+        with self._lock:
+            replica.outstanding -= 1
+            self._set_outstanding_gauge(replica)
+
+    def _set_outstanding_gauge(self, replica: OllamaReplica) -> None:
+        self.metrics.set_gauge("ollama_backend_outstanding", replica.outstanding, backend=replica.url)
+
+    @asynccontextmanager
+    async def lease(self, model_name: Optional[str] = None, exclude: Optional[Set[str]] = None) -> AsyncIterator[OllamaReplica]:
+        """Hold a replica for one request; replica failures count towards ejection, caller errors do not."""
+        replica = self.pick(model_name, exclude)
+        try:
+            yield replica
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            if _is_replica_failure(exc):
+                self.record_failure(replica, "request_error")
+            raise
+        else:
+            self.record_success(replica)
+        finally:
+            self._release(replica)
+
+    # --- health ---
+    def record_success(self, replica: OllamaReplica) -> None:
+        with self._lock:
+            replica.consecutive_failures = 0
+
+    def record_failure(self, replica: OllamaReplica, reason: str) -> None:
+        with self._lock:
+            replica.consecutive_failures += 1
+            if replica.consecutive_failures < self.eject_failures:
+                return
+            replica.consecutive_failures = 0
+        self._eject(replica, reason)
+
+    def _eject(self, replica: OllamaReplica, reason: str) -> None:
+        replica.ejected_until = time.monotonic() + self.eject_s
+        self.metrics.inc("ollama_backend_ejections_total", backend=replica.url, reason=reason)
+        print(f"Ejecting Ollama backend {replica.url} for {self.eject_s:.0f}s ({reason})")
+
+    async def _probe(self, replica: OllamaReplica) -> None:
+        started = time.perf_counter()
+        try:
+            resp = await self.client.get(f"{replica.url}/api/ps", timeout=self.probe_timeout_s)
+            resp.raise_for_status()
+            models = resp.json().get("models") or []
+        except Exception:
+            replica.healthy = False
+            replica.probe_latency_s = None
+            self.record_failure(replica, "probe_error")
+        else:
+            replica.healthy = True
+            replica.probe_latency_s = time.perf_counter() - started
+            replica.resident_models = {m.get("name") or m.get("model") or "" for m in models} - {""}
+        self.metrics.set_gauge("ollama_backend_healthy", 1 if replica.healthy else 0, backend=replica.url)
+
+    def _eject_slow(self) -> None:
+        latencies = sorted(r.probe_latency_s for r in self.replicas if r.probe_latency_s is not None)
+        if len(latencies) < 2:
+            return
+        median = latencies[len(latencies) // 2]
+        now = time.monotonic()
+        for replica in self.replicas:
+            slow = replica.probe_latency_s is not None and replica.probe_latency_s > self.slow_factor * max(median, 0.05)
+            if slow and not replica.ejected(now):
+                self._eject(replica, "slow")
+
+    async def refresh(self) -> None:
+        await asyncio.gather(*(self._probe(replica) for replica in self.replicas))
+        self._eject_slow()
+
+    async def run_health_checks(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.probe_interval_s)
+
+    def status(self) -> List[Dict[str, object]]:
+        now = time.monotonic()
+        return [replica.status(now) for replica in self.replicas]
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Optional, TypeVar
+
+from .metrics import metrics
+
+
+# Clients may bound retrieval + generation with this header (seconds)
+DEADLINE_HEADER = "X-Request-Timeout"
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+@dataclass
+class Deadline:
+    expires_at: float
+
+    @classmethod
+    def from_header(cls, value: Optional[str], default_s: float, max_s: float) -> "Deadline":
+        """Build a deadline from the client's header, clamped to ``max_s``; invalid values use the default."""
+        timeout_s = default_s
+        if value:
+            try:
+                timeout_s = float(value)
+            except ValueError:
+                timeout_s = default_s
+        timeout_s = min(max(timeout_s, 0.0), max_s)
+        return cls(expires_at=time.monotonic() + timeout_s)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+
+def _record_cancel(endpoint: str, reason: str) -> None:
+    metrics.inc("requests_cancelled_total", endpoint=endpoint, reason=reason)
+
+
+async def run_guarded(request, work: Awaitable[T], deadline: Deadline, endpoint: str, poll_interval_s: float = 0.25) -> T:
+    """Await ``work`` while watching for client disconnects and the deadline.
+
+    Either condition cancels the task, which closes the upstream HTTP request to
+    Ollama/LiteLLM so the model stops generating tokens nobody will read.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=min(poll_interval_s, deadline.remaining()))
+            if done:
+                return task.result()
+            if deadline.expired:
+                _record_cancel(endpoint, "deadline")
+                raise DeadlineExceeded()
+            if await request.is_disconnected():
+                _record_cancel(endpoint, "client_disconnect")
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def guarded_stream(source: AsyncIterator[T], deadline: Deadline, endpoint: str) -> AsyncIterator[T]:
+    """Relay ``source`` until the deadline, closing it promptly if the client goes away.
+
+    Starlette cancels the response when the client disconnects; closing the
+    source explicitly makes sure the upstream stream is torn down right away
+    instead of whenever the generator is garbage collected.
+    """
+    async with aclosing(source) as items:
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(anext(items), timeout=deadline.remaining())
+                except StopAsyncIteration:
+                    return
+                except TimeoutError:
+                    _record_cancel(endpoint, "deadline")
+                    raise DeadlineExceeded()
+                yield item
+        except (asyncio.CancelledError, GeneratorExit):
+            _record_cancel(endpoint, "client_disconnect")
+            raise
@@ -0,0 +1,84 @@
+import json
+import mmap
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+# On-disk layout written by src/build_index.py (must match _write_chunk_store there):
+#   <store>/chunks.bin    concatenated UTF-8 JSON records {"text": ..., "metadata": ...}
+#   <store>/offsets.npy   int64 byte offsets, one per record plus the end offset
+#   <store>/ids.json      chunk id of each record, in record order
+#   <store>/store.json    summary, written last (marks the store as complete)
+# and, per embedding model, <index_dir>/chunk_refs.json: {"store": <path relative to index_dir>, "ids": [...]}
+# giving the chunk id of every vector in index.faiss.
+CHUNK_REFS_FILE = "chunk_refs.json"
+
+
+class ReadOnlyDocstoreError(TypeError):
+    """Raised when something tries to modify the shared, read-only chunk store."""
+
+
+class ChunkStore:
+    """Read-only, memory-mapped view of a shared chunk store.
+
+    Texts stay in the page cache rather than in Python objects, so several API
+    processes serving different embedding models of the same corpus share one
+    copy; only the id → row map lives on the heap.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "store.json"), "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+            self._rows: Dict[str, int] = {chunk_id: row for row, chunk_id in enumerate(json.load(f))}
+        self._offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self._file = open(os.path.join(path, "chunks.bin"), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._rows
+
+    def ids(self) -> List[str]:
+        return list(self._rows)
+
+    def get(self, chunk_id: str) -> Optional[Document]:
+        row = self._rows.get(chunk_id)
+        if row is None:
+            return None
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        record = json.loads(self._data[start:end].decode("utf-8"))
+        return Document(page_content=record["text"], metadata=record.get("metadata") or {})
+
+
+class ChunkStoreDocstore:
+    """Docstore adapter so LangChain's FAISS wrapper can read from a ``ChunkStore``."""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def search(self, search: str) -> Union[str, Document]:
+        doc = self.store.get(search)
+        # Same contract as InMemoryDocstore: an error string for unknown ids
+        return doc if doc is not None else f"ID {search} not found."
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        raise ReadOnlyDocstoreError("The shared chunk store is read-only; rebuild the index to add chunks")
+
+    def delete(self, ids) -> None:
+        raise ReadOnlyDocstoreError("The shared chunk store is read-only; rebuild the index to remove chunks")
+
+
+def load_chunk_refs(index_dir: str) -> Tuple[ChunkStoreDocstore, Dict[int, str]]:
+    """Return ``(docstore, index_to_docstore_id)`` for an index that references a shared chunk store."""
+    with open(os.path.join(index_dir, CHUNK_REFS_FILE), "r", encoding="utf-8") as f:
+        refs = json.load(f)
+    store_path = os.path.normpath(os.path.join(index_dir, refs["store"]))
+    return ChunkStoreDocstore(ChunkStore(store_path)), dict(enumerate(refs["ids"]))
@@ -0,0 +1,172 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .tokens import count_tokens
+
+
+CONTEXT_SEPARATOR = "\n\n"
+# Shortest shared prefix/suffix we treat as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 32
+
+
+@dataclass
+class ScoredChunk:
+    """A retrieved chunk with its FAISS distance (lower is closer)."""
+
+    text: str
+    metadata: Dict[str, Any]
+    distance: float = 0.0
+
+    @property
+    def source(self) -> Optional[str]:
+        return self.metadata.get("source") or self.metadata.get("file_path")
+
+    @property
+    def label(self) -> str:
+        """Human-readable citation: the handbook section, else the file."""
+        return self.metadata.get("section") or self.source or "Document"
+
+
+@dataclass
+class PackedContext:
+    text: str
+    chunks: List[ScoredChunk]
+    context_tokens: int
+    naive_tokens: int
+    token_budget: int
+    chunks_retrieved: int
+    overlap_chars_removed: int = 0
+    dropped: List[ScoredChunk] = field(default_factory=list)
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.naive_tokens - self.context_tokens)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "chunks_retrieved": self.chunks_retrieved,
+            "chunks_packed": len(self.chunks),
+            "context_tokens": self.context_tokens,
+            "context_tokens_saved": self.tokens_saved,
+            "token_budget": self.token_budget,
+            "overlap_chars_removed": self.overlap_chars_removed,
+        }
+
+
+def _overlap_length(earlier: str, later: str, max_overlap: int) -> int:
+    """Length of the longest suffix of ``earlier`` that is also a prefix of ``later``."""
+    if len(earlier) < MIN_OVERLAP_CHARS or len(later) < MIN_OVERLAP_CHARS:
+        return 0
+    tail = earlier[-max_overlap:]
+    probe = later[:MIN_OVERLAP_CHARS]
+    pos = tail.find(probe)
+    while pos != -1:
+        # The first hit is the longest candidate overlap
+        if later.startswith(tail[pos:]):
+            return len(tail) - pos
+        pos = tail.find(probe, pos + 1)
+    return 0
+
+
+def _trim_overlap(candidate: str, packed_same_source: List[str], max_overlap: int) -> str:
+    """Remove text from ``candidate`` already present at a boundary of a packed neighbour."""
+    for other in packed_same_source:
+        head = _overlap_length(other, candidate, max_overlap)
+        if head:
+            candidate = candidate[head:].lstrip()
+        tail = _overlap_length(candidate, other, max_overlap)
+        if tail:
+            candidate = candidate[:-tail].rstrip()
+    return candidate
+
+
+def _truncate_to_budget(text: str, budget: int, model: Optional[str]) -> str:
+    tokens = count_tokens(text, model)
+    if tokens <= budget:
+        return text
+    keep_chars = max(0, int(len(text) * budget / tokens) - 1)
+    return text[:keep_chars].rstrip()
+
+
+def pack_context(
+    chunks: List[ScoredChunk],
+    token_budget: int,
+    model: Optional[str] = None,
+    max_overlap_chars: int = 400,
+) -> PackedContext:
+    """Pack retrieved chunks into a prompt context under ``token_budget`` tokens.
+
+    Chunks are taken closest-first. Exact duplicates are dropped, and text that
+    the splitter duplicated between neighbouring chunks of the same source is
+    trimmed from the later chunk. Packing stops at the first chunk that no longer
+    fits; the closest chunk is truncated rather than dropped so the context is
+    never empty.
+    """
+    naive_text = CONTEXT_SEPARATOR.join(c.text for c in chunks)
+    naive_tokens = count_tokens(naive_text, model)
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR, model)
+
+    ordered = sorted(chunks, key=lambda c: c.distance)
+    packed: List[ScoredChunk] = []
+    packed_by_source: Dict[Optional[str], List[str]] = {}
+    seen_texts = set()
+    used_tokens = 0
+    removed_chars = 0
+    dropped: List[ScoredChunk] = []
+
+    for index, chunk in enumerate(ordered):
+        if chunk.text in seen_texts:
+            removed_chars += len(chunk.text)
+            continue
+        seen_texts.add(chunk.text)
+
+        text = chunk.text
+        if chunk.source is not None:
+            text = _trim_overlap(text, packed_by_source.get(chunk.source, []), max_overlap_chars)
+            removed_chars += len(chunk.text) - len(text)
+        if not text:
+            continue
+
+        cost = count_tokens(text, model) + (separator_tokens if packed else 0)
+        if used_tokens + cost > token_budget:
+            if packed:
+                dropped.extend(ordered[index:])
+                break
+            text = _truncate_to_budget(text, token_budget, model)
+            cost = count_tokens(text, model)
+
+        packed.append(ScoredChunk(text=text, metadata=chunk.metadata, distance=chunk.distance))
+        packed_by_source.setdefault(chunk.source, []).append(text)
+        used_tokens += cost
+
+    context_text = CONTEXT_SEPARATOR.join(c.text for c in packed)
+    return PackedContext(
+        text=context_text,
+        chunks=packed,
+        context_tokens=count_tokens(context_text, model),
+        naive_tokens=naive_tokens,
+        token_budget=token_budget,
+        chunks_retrieved=len(chunks),
+        overlap_chars_removed=removed_chars,
+        dropped=dropped,
+    )
+
+
+def parse_budget_overrides(csv_value: Optional[str]) -> Dict[str, int]:
+    """Parse ``model=tokens`` pairs, e.g. ``ollama/phi3:mini=2000,azure-gpt5=6000``."""
+    overrides: Dict[str, int] = {}
+    for pair in (csv_value or "").split(","):
+        if "=" not in pair:
+            continue
+        model, value = pair.rsplit("=", 1)
+        try:
+            overrides[model.strip()] = int(value.strip())
+        except ValueError:
+            continue
+    return overrides
+
+
+def resolve_context_budget(model: str, overrides: Dict[str, int], local_default: int, cloud_default: int) -> int:
+    if model in overrides:
+        return overrides[model]
+    return local_default if model.startswith("ollama/") else cloud_default
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# "ollama" embeds over HTTP; "onnx" runs an exported model with ONNX Runtime in this process
+EMBEDDING_BACKENDS = ("ollama", "onnx")
+
+# Layout of an ONNX embedder directory (written by src/build_onnx_embedder.py):
+#   embedder.json      spec: {"model", "model_file", "pooling", "max_length", "pad_id", "pad_token"}
+#   tokenizer.json     Hugging Face fast tokenizer
+#   <model_file>       model.onnx (fp32 export) or model_int8.onnx (dynamically quantized)
+#   verification.json  agreement with Ollama's vectors; the embedder refuses to load without a pass
+ONNX_SPEC_FILE = "embedder.json"
+ONNX_TOKENIZER_FILE = "tokenizer.json"
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model_int8.onnx"
+ONNX_VERIFICATION_FILE = "verification.json"
+DEFAULT_ONNX_ROOT = ".rag_cache/onnx"
+
+
+def default_onnx_dir(slug: str, root: str = DEFAULT_ONNX_ROOT) -> str:
+    return os.path.join(root, slug)
+
+
+def read_verification(model_dir: str) -> Optional[Dict]:
+    path = os.path.join(model_dir, ONNX_VERIFICATION_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class OnnxEmbedder:
+    """In-process CPU embeddings with the LangChain ``Embeddings`` interface.
+
+    Tokenizes with the model's fast tokenizer, runs the ONNX graph and pools
+    token states the way the model card specifies (CLS, mean or last token),
+    then L2-normalizes like Ollama's ``/api/embed``. Inputs are sorted by
+    length before batching so short queries are not padded to the longest
+    chunk. ``InferenceSession.run`` is thread-safe, so one instance serves
+    concurrent callers.
+    """
+
+    def __init__(self, model_dir: str, threads: int = 0, batch_size: int = 16, require_verified: bool = True):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError("EMBEDDING_BACKEND=onnx needs 'onnxruntime' and 'tokenizers' installed") from e
+
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        with open(os.path.join(model_dir, ONNX_SPEC_FILE), "r", encoding="utf-8") as f:
+            self.spec = json.load(f)
+        self.model = self.spec["model"]
+        self.pooling = self.spec.get("pooling", "mean")
+        if self.pooling not in ("cls", "mean", "last"):
+            raise ValueError(f"Unknown pooling '{self.pooling}' in {model_dir}/{ONNX_SPEC_FILE}")
+        model_file = self.spec.get("model_file", ONNX_INT8_MODEL_FILE)
+
+        if require_verified:
+            verification = read_verification(model_dir)
+            if not verification or not verification.get("passed") or verification.get("model_file") != model_file:
+                raise RuntimeError(
+                    f"ONNX embedder in '{model_dir}' has no passing verification against Ollama for '{model_file}'; "
+                    f"run python -m src.build_onnx_embedder --model {self.model} --verify-only"
+                )
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, ONNX_TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=int(self.spec.get("max_length", 512)))
+        self.tokenizer.enable_padding(pad_id=int(self.spec.get("pad_id", 0)), pad_token=self.spec.get("pad_token", "<pad>"))
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        if "position_ids" in self._input_names:
+            feeds["position_ids"] = np.broadcast_to(np.arange(input_ids.shape[1], dtype=np.int64), input_ids.shape).copy()
+        feeds = {name: value for name, value in feeds.items() if name in self._input_names}
+        hidden = self.session.run(None, feeds)[0]
+
+        if hidden.ndim == 2:
+            # Graph already pools (e.g. a sentence_embedding output)
+            pooled = hidden
+        elif self.pooling == "cls":
+            pooled = hidden[:, 0]
+        elif self.pooling == "last":
+            # Right padding: the last real token sits at length - 1
+            pooled = hidden[np.arange(len(texts)), mask.sum(axis=1) - 1]
+        else:
+            weights = mask[:, :, None].astype(hidden.dtype)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+
+        pooled = pooled.astype(np.float32)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.maximum(norms, 1e-12)
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out: Optional[np.ndarray] = None
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            vectors = self._embed_batch([texts[i] for i in rows])
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[rows] = vectors
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+class AsyncLocalEmbedder:
+    """``AsyncOllamaEmbedder``-compatible wrapper running an in-process embedder on its own threads.
+
+    Query embedding then never waits behind chat requests in Ollama's queue;
+    ONNX Runtime releases the GIL, so the event loop keeps serving meanwhile.
+    """
+
+    def __init__(self, embedder: OnnxEmbedder, workers: int = 2):
+        self.embedder = embedder
+        self.model = embedder.model
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="onnx-embed")
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.embedder.embed_documents, texts)
+
+    async def embed_query(self, text: str) -> List[float]:
+        return (await self.embed([text]))[0]
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_embeddings(
+    backend: str,
+    model: str,
+    ollama_base_url: str,
+    onnx_dir: Optional[str] = None,
+    threads: int = 0,
+):
+    """Synchronous embeddings for ``backend`` (LangChain ``Embeddings`` interface)."""
+    if backend == "ollama":
+        from langchain_ollama import OllamaEmbeddings
+
+        return OllamaEmbeddings(model=model, base_url=ollama_base_url)
+    if backend == "onnx":
+        if not onnx_dir:
+            raise ValueError("The onnx embedding backend needs a model directory")
+        embedder = OnnxEmbedder(onnx_dir, threads=threads)
+        if embedder.model != model:
+            raise RuntimeError(f"ONNX embedder in '{onnx_dir}' is for '{embedder.model}', not '{model}'")
+        return embedder
+    raise ValueError(f"Unknown embedding backend '{backend}' (expected one of {', '.join(EMBEDDING_BACKENDS)})")
+
+
+def cosine_agreement(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """Row-wise cosine similarity between two embeddings of the same texts."""
+    if reference.shape != candidate.shape:
+        raise ValueError(f"Embedding shapes differ: {reference.shape} vs {candidate.shape}")
+    ref = reference / np.maximum(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12)
+    cand = candidate / np.maximum(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12)
+    cosines = (ref * cand).sum(axis=1)
+    return {
+        "min_cosine": float(cosines.min()),
+        "p05_cosine": float(np.percentile(cosines, 5)),
+        "mean_cosine": float(cosines.mean()),
+    }
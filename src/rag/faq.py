@@ -0,0 +1,116 @@
+import json
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .context_packing import ScoredChunk
+
+
+# Reference answers that only say the context is silent are not worth serving
+_NON_ANSWER_RE = re.compile(
+    r"(does not|doesn't|do not) (provide|mention|specify|include|contain|state)"
+    r"|not (provided|mentioned|specified|available) in the context"
+    r"|I don't know",
+    re.IGNORECASE,
+)
+
+
+def is_usable_answer(answer: Optional[str]) -> bool:
+    return bool(answer and answer.strip()) and not _NON_ANSWER_RE.search(answer)
+
+
+@dataclass
+class FaqEntry:
+    question: str
+    answer: str
+    # Section labels of the chunks that ground the answer (top hits at build time)
+    sources: List[str] = field(default_factory=list)
+    origin: str = ""
+
+
+@dataclass
+class FaqMatch:
+    entry: FaqEntry
+    similarity: float
+    distance: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "question": self.entry.question,
+            "source": self.entry.sources[0] if self.entry.sources else None,
+            "similarity": round(self.similarity, 4),
+            "distance": round(self.distance, 4),
+            "origin": self.entry.origin,
+        }
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class FaqIndex:
+    """Curated question/answer pairs served without calling a model.
+
+    A query matches when its embedding is within ``min_similarity`` (cosine) of
+    a curated question *and* the top retrieved chunk comes from one of the
+    sections that grounded that answer, so a paraphrase that retrieves
+    something else still goes through the full RAG path.
+    """
+
+    def __init__(
+        self,
+        entries: List[FaqEntry],
+        vectors: np.ndarray,
+        embedding_model: str,
+        min_similarity: float = 0.92,
+        max_distance: Optional[float] = None,
+    ):
+        self.entries = entries
+        self.vectors = _normalise(np.asarray(vectors, dtype="float32")) if entries else np.zeros((0, 0), dtype="float32")
+        self.embedding_model = embedding_model
+        self.min_similarity = min_similarity
+        self.max_distance = max_distance
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def match(self, vector: List[float], chunks: List[ScoredChunk]) -> Optional[FaqMatch]:
+        if not self.entries or not chunks:
+            return None
+        top = chunks[0]
+        if self.max_distance is not None and top.distance > self.max_distance:
+            return None
+        query = _normalise(np.asarray(vector, dtype="float32"))
+        if query.shape[-1] != self.vectors.shape[-1]:
+            return None
+        similarities = self.vectors @ query
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        entry = self.entries[best]
+        if similarity < self.min_similarity or top.label not in entry.sources:
+            return None
+        return FaqMatch(entry=entry, similarity=similarity, distance=top.distance)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "FaqIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        entries = [FaqEntry(**e) for e in payload.get("entries", [])]
+        return cls(entries, np.asarray(payload.get("vectors", []), dtype="float32"), payload.get("embedding_model", ""), **kwargs)
+
+
+def save_faq(path: str, entries: List[FaqEntry], vectors: List[List[float]], embedding_model: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    payload = {
+        "embedding_model": embedding_model,
+        "entries": [asdict(e) for e in entries],
+        "vectors": [list(map(float, v)) for v in vectors],
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
@@ -0,0 +1,170 @@
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# Per-index allow-lists written by src/build_index.py next to index.faiss (checksummed in the manifest).
+# For each field: "<field>__values" (distinct values) and a CSR layout "<field>__offsets"/"<field>__ids"
+# listing, for value j, the sorted vector ids ids[offsets[j]:offsets[j + 1]].
+FILTERS_FILE = "filters.npz"
+FILTER_FIELDS = ("source", "section", "version")
+
+
+class FiltersUnavailable(ValueError):
+    """Raised when a request filters an index that was built without allow-lists."""
+
+
+def _norm_source(value: str) -> str:
+    # "data/cs-handbook/13_assessment.md", "13_assessment.md" and "13_assessment" all name the same file
+    name = os.path.basename(str(value).strip()).lower()
+    return name[:-3] if name.endswith(".md") else name
+
+
+def _norm_section(value: str) -> str:
+    return " ".join(str(value).lower().split())
+
+
+def filter_values(metadata: Dict) -> Dict[str, List[str]]:
+    """Values a chunk is listed under, including the places its near-duplicates were folded from."""
+    places = [metadata] + [a for a in (metadata.get("aliases") or []) if isinstance(a, dict)]
+    values: Dict[str, List[str]] = {name: [] for name in FILTER_FIELDS}
+    for place in places:
+        if place.get("source"):
+            values["source"].append(_norm_source(place["source"]))
+        if place.get("section"):
+            values["section"].append(_norm_section(place["section"]))
+    if metadata.get("version") is not None:
+        values["version"].append(str(metadata["version"]).strip())
+    return {name: sorted(set(v)) for name, v in values.items()}
+
+
+def save_filter_lists(index_dir: str, metadatas: Iterable[Dict]) -> Dict[str, int]:
+    """Write ``filters.npz`` for vectors whose metadata is given in id order; returns distinct values per field."""
+    postings: Dict[str, Dict[str, List[int]]] = {name: {} for name in FILTER_FIELDS}
+    for vector_id, metadata in enumerate(metadatas):
+        for name, values in filter_values(metadata).items():
+            for value in values:
+                postings[name].setdefault(value, []).append(vector_id)
+    arrays = {}
+    for name, lists in postings.items():
+        values = sorted(lists)
+        arrays[f"{name}__values"] = np.asarray(values, dtype=str)
+        arrays[f"{name}__offsets"] = np.cumsum([0] + [len(lists[v]) for v in values]).astype(np.int64)
+        arrays[f"{name}__ids"] = np.asarray([i for v in values for i in lists[v]], dtype=np.int64)
+    np.savez(os.path.join(index_dir, FILTERS_FILE), **arrays)
+    return {name: len(lists) for name, lists in postings.items()}
+
+
+@dataclass(frozen=True)
+class RetrievalFilters:
+    """Scope for a query; fields combine with AND, several sources with OR."""
+
+    section_prefix: Optional[str] = None
+    sources: Tuple[str, ...] = ()
+    version: Optional[str] = None
+
+    @property
+    def empty(self) -> bool:
+        return not (self.section_prefix or self.sources or self.version)
+
+    def key(self) -> Tuple:
+        return (
+            _norm_section(self.section_prefix) if self.section_prefix else None,
+            tuple(sorted(_norm_source(s) for s in self.sources)),
+            self.version,
+        )
+
+
+@dataclass
+class Selection:
+    """Resolved filter: FAISS selector plus the bitmap it points into (kept alive together)."""
+
+    count: int
+    selector: object = None
+    bitmap: Optional[np.ndarray] = field(default=None, repr=False)
+
+
+class FilterIndex:
+    """In-memory allow-lists of one index version, resolved to FAISS ``IDSelectorBitmap``s.
+
+    Each filter is resolved by OR-ing the allow-lists of the matching values
+    (a prefix scan over the sorted section labels) and AND-ing across fields;
+    the packed bitmap handed to FAISS is cached per distinct filter, so
+    repeated scopes cost one dictionary lookup.
+    """
+
+    def __init__(self, path: str, ntotal: int, cache_size: int = 256):
+        self.ntotal = ntotal
+        self._values: Dict[str, np.ndarray] = {}
+        self._offsets: Dict[str, np.ndarray] = {}
+        self._ids: Dict[str, np.ndarray] = {}
+        with np.load(path) as data:
+            for name in FILTER_FIELDS:
+                self._values[name] = data[f"{name}__values"]
+                self._offsets[name] = data[f"{name}__offsets"]
+                self._ids[name] = data[f"{name}__ids"]
+        self._cache: "OrderedDict[Tuple, Selection]" = OrderedDict()
+        self._cache_size = cache_size
+
+    def values(self, name: str) -> List[str]:
+        return self._values[name].tolist()
+
+    def _postings(self, name: str, rows: np.ndarray) -> np.ndarray:
+        offsets, ids = self._offsets[name], self._ids[name]
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate([ids[offsets[r]:offsets[r + 1]] for r in rows]))
+
+    def _match(self, filters: RetrievalFilters) -> np.ndarray:
+        section, sources, version = filters.key()
+        selected: Optional[np.ndarray] = None
+        if section:
+            values = self._values["section"]
+            # Sorted labels: every label starting with the prefix sits in one contiguous run
+            lo = np.searchsorted(values, section, side="left")
+            hi = np.searchsorted(values, section + "\U0010ffff", side="left")
+            selected = self._postings("section", np.arange(lo, hi))
+        if sources:
+            rows = np.flatnonzero(np.isin(self._values["source"], list(sources)))
+            ids = self._postings("source", rows)
+            selected = ids if selected is None else np.intersect1d(selected, ids, assume_unique=True)
+        if version:
+            rows = np.flatnonzero(self._values["version"] == version)
+            ids = self._postings("version", rows)
+            selected = ids if selected is None else np.intersect1d(selected, ids, assume_unique=True)
+        return selected if selected is not None else np.arange(self.ntotal, dtype=np.int64)
+
+    def select(self, filters: RetrievalFilters) -> Selection:
+        import faiss
+
+        key = filters.key()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        ids = self._match(filters)
+        mask = np.zeros(self.ntotal, dtype=bool)
+        mask[ids] = True
+        # FAISS reads bit i as (bitmap[i >> 3] >> (i & 7)) & 1
+        bitmap = np.packbits(mask, bitorder="little")
+        selection = Selection(count=len(ids), selector=faiss.IDSelectorBitmap(self.ntotal, faiss.swig_ptr(bitmap)), bitmap=bitmap)
+        self._cache[key] = selection
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return selection
+
+
+def load_filter_index(index_dir: str, ntotal: int) -> Optional[FilterIndex]:
+    path = os.path.join(index_dir, FILTERS_FILE)
+    return FilterIndex(path, ntotal) if os.path.exists(path) else None
+
+
+def index_filters(vectorstore) -> FilterIndex:
+    """Allow-lists attached by ``load_faiss_index``; raises if the index predates them."""
+    filter_index = getattr(vectorstore, "filter_index", None)
+    if filter_index is None:
+        raise FiltersUnavailable("This index has no metadata filter lists; rebuild it with python -m src.build_index to filter")
+    return filter_index
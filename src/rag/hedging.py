@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from .backends import OllamaPool
+from .metrics import MetricsRegistry
+
+
+T = TypeVar("T")
+
+
+def parse_model_map(csv_value: Optional[str]) -> Dict[str, str]:
+    """Parse ``ollama/phi3:mini=gpt-4o-mini,...`` into a model -> fallback model map."""
+    mapping: Dict[str, str] = {}
+    for item in (csv_value or "").split(","):
+        if "=" not in item:
+            continue
+        model, fallback = item.split("=", 1)
+        if model.strip() and fallback.strip():
+            mapping[model.strip()] = fallback.strip()
+    return mapping
+
+
+@dataclass(frozen=True)
+class HedgeConfig:
+    enabled: bool = False
+    ttft_quantile: float = 90.0
+    min_delay_s: float = 0.25
+    default_delay_s: float = 2.0
+    max_rate: float = 0.1
+    burst: float = 5.0
+    min_samples: int = 20
+    fallback_models: Dict[str, str] = field(default_factory=dict)
+
+
+class HedgePolicy:
+    """Decides when and where a second attempt may be sent.
+
+    The hedge delay is the observed ``ttft_quantile`` of first-token latency
+    for the model. A token bucket refilled by ``max_rate`` per request caps
+    hedges at that fraction of traffic (with a small burst), so a slow period
+    cannot double the load on the backends.
+    """
+
+    def __init__(self, config: HedgeConfig, registry: MetricsRegistry, pool: Optional[OllamaPool] = None):
+        self.config = config
+        self.metrics = registry
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._tokens = config.burst
+
+    def delay_for(self, model_name: str) -> float:
+        samples = self.metrics.samples("attempt_ttft_seconds", model=model_name)
+        if len(samples) < self.config.min_samples:
+            return self.config.default_delay_s
+        observed = self.metrics.percentile("attempt_ttft_seconds", self.config.ttft_quantile, model=model_name) or 0.0
+        return max(self.config.min_delay_s, observed)
+
+    def target_for(self, model_name: str) -> Optional[str]:
+        """Model for the hedge: another replica of the same model or a configured fallback.
+
+        Cloud models are only hedged to an explicit fallback; retrying the same
+        cloud model would just pay for the request twice.
+        """
+        if model_name.startswith("ollama/") and self.pool is not None and len(self.pool) > 1:
+            return model_name
+        return self.config.fallback_models.get(model_name)
+
+    def note_request(self) -> None:
+        with self._lock:
+            self._tokens = min(self.config.burst, self._tokens + self.config.max_rate)
+
+    def try_acquire(self, model_name: str) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+        self.metrics.inc("hedges_skipped_total", model=model_name, reason="budget")
+        return False
+
+
+async def first_response(
+    primary: Awaitable[T],
+    start_hedge: Callable[[], Optional[Awaitable[T]]],
+    delay_s: float,
+    discard: Callable[[T], Awaitable[None]],
+) -> Tuple[T, str]:
+    """Return the first successful result of ``primary`` or a hedge started after ``delay_s``.
+
+    ``start_hedge`` may return ``None`` to skip hedging. The losing attempt is
+    cancelled, or passed to ``discard`` if it had already produced a result.
+    """
+    tasks: Dict[asyncio.Future, str] = {asyncio.ensure_future(primary): "primary"}
+    winner: Optional[asyncio.Future] = None
+    try:
+        done, _ = await asyncio.wait(set(tasks), timeout=delay_s)
+        if not done:
+            hedge = start_hedge()
+            if hedge is not None:
+                tasks[asyncio.ensure_future(hedge)] = "hedge"
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if winner is None and task.exception() is None:
+                    winner = task
+            if winner is not None:
+                return winner.result(), tasks[winner]
+        # Every attempt failed; surface the primary's error
+        primary_task = next(iter(tasks))
+        raise primary_task.exception()
+    finally:
+        for task in tasks:
+            if task is winner:
+                continue
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled() and task.exception() is None:
+                await discard(task.result())
@@ -0,0 +1,64 @@
+import os
+import pickle
+import time
+from typing import Dict
+
+from .filters import load_filter_index
+from .index_reload import read_manifest
+from .reduction import ProjectedEmbeddings, load_projection
+
+
+def load_faiss_index(index_dir: str, embedding_model: str, ollama_base_url: str, timings: Dict[str, float], embeddings=None):
+    """Load a LangChain FAISS index saved with ``save_local``, timing each phase.
+
+    Equivalent to ``FAISS.load_local(..., allow_dangerous_deserialization=True)``
+    but reads the vector index and the docstore separately so startup reports
+    show where the time goes. Indexes built against the shared chunk store get a
+    memory-mapped docstore instead of the pickle. LangChain is imported here
+    rather than at module import so the API can start serving liveness probes first.
+    ``embeddings`` (e.g. an in-process ONNX embedder) replaces the default Ollama client.
+    For reduced-dimension indexes the embeddings are wrapped so every vector
+    they return is projected with the manifest's projection. The section/source/
+    version allow-lists, when the index has them, are attached as ``filter_index``.
+    """
+    t0 = time.perf_counter()
+    from langchain_community.vectorstores import FAISS
+    import faiss
+    from .chunk_store import CHUNK_REFS_FILE, load_chunk_refs
+    timings["langchain_import_s"] = time.perf_counter() - t0
+
+    # Resolve the published-version symlink once so every file comes from the same version
+    index_dir = os.path.realpath(index_dir)
+    manifest = read_manifest(index_dir)
+
+    t1 = time.perf_counter()
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+    timings["index_load_s"] = time.perf_counter() - t1
+    if manifest is not None and (index.ntotal != manifest.get("vectors") or index.d != manifest.get("dimension")):
+        raise RuntimeError(
+            f"Index in '{index_dir}' has {index.ntotal}x{index.d} vectors but its manifest says "
+            f"{manifest.get('vectors')}x{manifest.get('dimension')}"
+        )
+
+    t2 = time.perf_counter()
+    if os.path.exists(os.path.join(index_dir, CHUNK_REFS_FILE)):
+        # Chunk texts live in the shared, memory-mapped chunk store
+        docstore, index_to_docstore_id = load_chunk_refs(index_dir)
+    else:
+        # Legacy layout: the docstore is a pickle we wrote ourselves in build_index.py
+        with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+    timings["docstore_load_s"] = time.perf_counter() - t2
+    projection = load_projection(index_dir, manifest)
+    if projection is not None and projection.dim != index.d:
+        raise RuntimeError(f"Index in '{index_dir}' is {index.d}-d but its projection outputs {projection.dim}-d")
+
+    if embeddings is None:
+        from langchain_ollama import OllamaEmbeddings
+
+        embeddings = OllamaEmbeddings(model=embedding_model, base_url=ollama_base_url)
+    if projection is not None:
+        embeddings = ProjectedEmbeddings(embeddings, projection)
+    vectorstore = FAISS(embeddings, index, docstore, index_to_docstore_id)
+    vectorstore.filter_index = load_filter_index(index_dir, index.ntotal)
+    return vectorstore
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .metrics import metrics
+
+
+INDEX_FILES = ("index.faiss", "index.pkl")
+# Indexes built against the shared chunk store reference it instead of pickling a docstore
+CHUNK_STORE_INDEX_FILES = ("index.faiss", "chunk_refs.json")
+
+
+def read_manifest(index_dir: str) -> Optional[Dict[str, Any]]:
+    """The manifest.json written by build_index.py when it published this version, if any."""
+    try:
+        with open(os.path.join(index_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def index_fingerprint(index_dir: str) -> Optional[str]:
+    """Cheap version id for an index directory (None if incomplete).
+
+    Published indexes are a symlink to a versioned directory whose manifest
+    names the version; unversioned ones fall back to size and mtime of their files.
+    """
+    manifest = read_manifest(os.path.realpath(index_dir))
+    if manifest is not None and manifest.get("version"):
+        return str(manifest["version"])
+    parts = []
+    names = CHUNK_STORE_INDEX_FILES if os.path.exists(os.path.join(index_dir, "chunk_refs.json")) else INDEX_FILES
+    for name in names:
+        try:
+            st = os.stat(os.path.join(index_dir, name))
+        except FileNotFoundError:
+            return None
+        parts.append(f"{st.st_size}:{st.st_mtime_ns}")
+    return "-".join(parts)
+
+
+@dataclass
+class LoadedIndex:
+    vectorstore: Any
+    version: str
+    loaded_at: float = field(default_factory=time.time)
+    inflight: int = 0
+
+
+class IndexSlot:
+    """Holds the live vector store and lets it be swapped without disturbing readers.
+
+    Requests ``acquire()`` the current index for the duration of their search;
+    ``swap()`` publishes a new one atomically, and the old one is kept until
+    its in-flight readers finish (see ``drain``).
+    """
+
+    def __init__(self, vectorstore, version: str):
+        self._lock = threading.Lock()
+        self._current = LoadedIndex(vectorstore, version)
+        self._retired: List[LoadedIndex] = []
+
+    @property
+    def current(self) -> LoadedIndex:
+        return self._current
+
+    @contextmanager
+    def acquire(self) -> Iterator[LoadedIndex]:
+        with self._lock:
+            loaded = self._current
+            loaded.inflight += 1
+        try:
+            yield loaded
+        finally:
+            with self._lock:
+                loaded.inflight -= 1
+
+    def swap(self, vectorstore, version: str) -> LoadedIndex:
+        with self._lock:
+            old = self._current
+            self._current = LoadedIndex(vectorstore, version)
+            self._retired.append(old)
+        metrics.inc("index_swaps_total")
+        return old
+
+    async def drain(self, old: LoadedIndex, timeout_s: float = 300.0, poll_s: float = 0.1) -> bool:
+        """Wait for readers of ``old`` to finish, then drop our reference so it can be freed."""
+        deadline = time.monotonic() + timeout_s
+        while old.inflight > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(poll_s)
+        drained = old.inflight == 0
+        with self._lock:
+            if old in self._retired:
+                self._retired.remove(old)
+        old.vectorstore = None
+        return drained
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "version": self._current.version,
+                "loaded_at": self._current.loaded_at,
+                "inflight": self._current.inflight,
+                "retired_inflight": [r.inflight for r in self._retired],
+            }
+
+
+class IndexReloader:
+    """Loads new index versions in the background and swaps them into an ``IndexSlot``.
+
+    The directory is polled every ``interval_s``; a new fingerprint must be
+    seen on two consecutive polls before loading, so a build that is still
+    writing files is not picked up half-way. Failed loads keep the old index.
+    """
+
+    def __init__(
+        self,
+        index_dir: str,
+        slot: IndexSlot,
+        load: Callable[[], Tuple[Any, Dict[str, float]]],
+        on_swap: Optional[Callable[[LoadedIndex], None]] = None,
+        interval_s: float = 10.0,
+    ):
+        self.index_dir = index_dir
+        self.slot = slot
+        self.load = load
+        self.on_swap = on_swap
+        self.interval_s = interval_s
+        self.last_error: Optional[str] = None
+        self._reload_lock = asyncio.Lock()
+        self._pending: Optional[str] = None
+        self._failed: Optional[str] = None
+
+    async def reload(self, force: bool = False) -> Dict[str, Any]:
+        async with self._reload_lock:
+            version = index_fingerprint(self.index_dir)
+            if version is None:
+                raise RuntimeError(f"No complete index in '{self.index_dir}'")
+            if version == self.slot.current.version and not force:
+                return {"reloaded": False, "version": version}
+            t0 = time.perf_counter()
+            try:
+                # Loading reads files and unpickles the docstore; keep it off the event loop
+                vectorstore, timings = await asyncio.to_thread(self.load)
+            except Exception as e:
+                self.last_error = str(e)
+                metrics.inc("index_reloads_total", result="error")
+                raise
+            old_dim = getattr(getattr(self.slot.current.vectorstore, "index", None), "d", None)
+            new_dim = getattr(getattr(vectorstore, "index", None), "d", None)
+            if old_dim is not None and new_dim is not None and old_dim != new_dim:
+                self.last_error = f"Dimension changed from {old_dim} to {new_dim}; keeping the current index"
+                metrics.inc("index_reloads_total", result="rejected")
+                raise RuntimeError(self.last_error)
+
+            old = self.slot.swap(vectorstore, version)
+            self.last_error = None
+            load_s = time.perf_counter() - t0
+            metrics.inc("index_reloads_total", result="ok")
+            metrics.observe("index_reload_seconds", load_s)
+            print(f"Swapped in index version {version} (loaded in {load_s:.2f}s)")
+            if self.on_swap is not None:
+                self.on_swap(self.slot.current)
+        drained = await self.slot.drain(old)
+        print(f"Released index version {old.version} ({'drained' if drained else 'drain timed out'})")
+        return {"reloaded": True, "version": version, "previous_version": old.version, "load_s": round(load_s, 3), **timings}
+
+    async def watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            version = index_fingerprint(self.index_dir)
+            if version is None or version in (self.slot.current.version, self._failed):
+                self._pending = None
+                continue
+            if version != self._pending:
+                # Wait one more interval for the files to settle
+                self._pending = version
+                continue
+            try:
+                await self.reload()
+            except Exception as e:
+                self._failed = version
+                print(f"WARNING: index reload failed: {e}")
+            self._pending = None
@@ -0,0 +1,74 @@
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import metrics
+from .num_ctx import choose_num_ctx
+from .tokens import count_tokens
+
+
+class LLMFactory:
+    """Builds and reuses chat clients per model (and per num_ctx bucket for Ollama).
+
+    Clients are cached because constructing them validates settings and opens
+    HTTP connection pools; with bucketed num_ctx and a handful of Ollama
+    replicas the cache stays small.
+    """
+
+    def __init__(
+        self,
+        ollama_base_url: str,
+        litellm_api_base: str,
+        num_ctx_buckets: List[int],
+        num_ctx_output_reserve: int,
+        request_timeout_s: float = 600,
+    ):
+        self.ollama_base_url = ollama_base_url
+        self.litellm_api_base = litellm_api_base
+        self.num_ctx_buckets = num_ctx_buckets
+        self.num_ctx_output_reserve = num_ctx_output_reserve
+        self.request_timeout_s = request_timeout_s
+        self._clients: Dict[Tuple[str, int, str], object] = {}
+
+    def for_prompt(self, model_name: str, prompt: str, base_url: Optional[str] = None):
+        """Return the client for ``model_name``, sizing Ollama's num_ctx to the prompt.
+
+        ``base_url`` selects the Ollama replica; it defaults to ``ollama_base_url``.
+        """
+        if not model_name.startswith("ollama/"):
+            return self._cached(model_name, 0, self.litellm_api_base)
+        prompt_tokens = count_tokens(prompt, model_name)
+        num_ctx = choose_num_ctx(prompt_tokens, self.num_ctx_output_reserve, self.num_ctx_buckets)
+        metrics.inc("num_ctx_bucket_total", model=model_name, num_ctx=num_ctx)
+        metrics.observe("prompt_tokens", prompt_tokens, model=model_name)
+        return self._cached(model_name, num_ctx, base_url or self.ollama_base_url)
+
+    def _cached(self, model_name: str, num_ctx: int, base_url: str):
+        key = (model_name, num_ctx, base_url)
+        client = self._clients.get(key)
+        if client is None:
+            client = self._create(model_name, num_ctx, base_url)
+            self._clients[key] = client
+        return client
+
+    def _create(self, model_name: str, num_ctx: int, base_url: str):
+        # Imported on first use to keep API startup fast
+        if model_name.startswith("ollama/"):
+            from langchain_ollama import ChatOllama
+
+            return ChatOllama(
+                model=model_name.split("/", 1)[-1],
+                base_url=base_url,
+                temperature=0,
+                timeout=self.request_timeout_s,
+                num_ctx=num_ctx,
+            )
+        # Cloud via LiteLLM (OpenAI-compatible)
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(
+            model=model_name,
+            openai_api_base=base_url,
+            openai_api_key="anything", # LiteLLM doesn't require a key for local models
+            request_timeout=self.request_timeout_s,
+            # Report token usage on streamed responses too; the cloud cost cap depends on it
+            stream_usage=True,
+        )
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _series_name(name: str, key: LabelKey) -> str:
+    if not key:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in key) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe in-process counters, gauges and windowed latency observations.
+
+    Observations keep the most recent ``window`` samples per series so
+    percentiles track current behaviour rather than the whole process lifetime.
+    """
+
+    def __init__(self, window: int = 2048):
+        self._window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._observations: Dict[Tuple[str, LabelKey], Deque[float]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = float(value)
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            series = self._observations.get(key)
+            if series is None:
+                series = deque(maxlen=self._window)
+                self._observations[key] = series
+            series.append(float(value))
+
+    def counter(self, name: str, **labels: Any) -> float:
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0.0)
+
+    def percentile(self, name: str, q: float, **labels: Any) -> Optional[float]:
+        with self._lock:
+            series = list(self._observations.get((name, _label_key(labels)), ()))
+        if not series:
+            return None
+        return float(np.percentile(series, q))
+
+    def samples(self, name: str, **labels: Any) -> List[float]:
+        with self._lock:
+            return list(self._observations.get((name, _label_key(labels)), ()))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {_series_name(n, k): v for (n, k), v in self._counters.items()}
+            gauges = {_series_name(n, k): v for (n, k), v in self._gauges.items()}
+            observations = {_series_name(n, k): list(v) for (n, k), v in self._observations.items()}
+        summaries = {}
+        for series, values in observations.items():
+            if not values:
+                continue
+            summaries[series] = {
+                "count": len(values),
+                "avg": float(np.mean(values)),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+                "max": float(np.max(values)),
+            }
+        return {"counters": counters, "gauges": gauges, "observations": summaries}
+
+
+metrics = MetricsRegistry()
+
+
+async def monitor_event_loop_lag(registry: MetricsRegistry, interval_s: float = 0.25) -> None:
+    """Record how late the event loop wakes from a fixed sleep.
+
+    A responsive loop wakes within a millisecond or two; sustained lag means
+    something is blocking it (synchronous I/O or CPU work on the loop thread).
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval_s)
+        lag = max(0.0, time.perf_counter() - started - interval_s)
+        registry.observe("event_loop_lag_seconds", lag)
+        registry.set_gauge("event_loop_lag_seconds_last", lag)
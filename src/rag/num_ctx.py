@@ -0,0 +1,27 @@
+from typing import List, Optional
+
+
+DEFAULT_NUM_CTX_BUCKETS: List[int] = [2048, 4096, 8192]
+
+
+def parse_num_ctx_buckets(csv_value: Optional[str]) -> List[int]:
+    """Parse a comma-separated bucket list; falls back to the defaults when empty or invalid."""
+    try:
+        buckets = sorted({int(x.strip()) for x in (csv_value or "").split(",") if x.strip()})
+    except ValueError:
+        buckets = []
+    return buckets or list(DEFAULT_NUM_CTX_BUCKETS)
+
+
+def choose_num_ctx(prompt_tokens: int, output_reserve: int, buckets: List[int]) -> int:
+    """Pick the smallest bucket that fits the prompt plus the expected output.
+
+    Ollama reloads a model whenever ``num_ctx`` changes, so sizes are snapped to a
+    few fixed buckets instead of the exact requirement. Oversized requests get the
+    largest bucket; the context packer keeps prompts well below it.
+    """
+    required = prompt_tokens + output_reserve
+    for bucket in buckets:
+        if required <= bucket:
+            return bucket
+    return buckets[-1]
@@ -0,0 +1,91 @@
+from typing import Dict, List, Optional
+
+from .context_packing import ScoredChunk
+
+
+# Parents live in the FAISS docstore under these ids but are not in the vector index.
+# Must match PARENT_ID_PREFIX / PARENT_CHILD_MARKER_ID in src/build_index.py.
+PARENT_ID_PREFIX = "parent:"
+PARENT_CHILD_MARKER_ID = "parent:__index__"
+
+
+def _docstore_get(vectorstore, doc_id: str):
+    found = vectorstore.docstore.search(doc_id)
+    # InMemoryDocstore returns an error string for missing ids
+    return found if hasattr(found, "page_content") else None
+
+
+def is_parent_child_index(vectorstore) -> bool:
+    return _docstore_get(vectorstore, PARENT_CHILD_MARKER_ID) is not None
+
+
+def expand_children(
+    vectorstore,
+    children: List[ScoredChunk],
+    limit: int,
+    mode: str = "parent",
+    window_chars: int = 600,
+) -> List[ScoredChunk]:
+    """Turn retrieved child chunks into at most ``limit`` parent passages.
+
+    Children are grouped by parent (best distance wins, order preserved). In
+    ``parent`` mode the whole parent section is returned; in ``window`` mode
+    only the span covering the matched children plus ``window_chars`` either
+    side, which keeps prompts small when parents are long.
+    """
+    groups: Dict[str, List[ScoredChunk]] = {}
+    order: List[str] = []
+    passthrough: List[ScoredChunk] = []
+    for child in children:
+        parent_id = child.metadata.get("parent_id")
+        if not parent_id:
+            passthrough.append(child)
+            continue
+        if parent_id not in groups:
+            groups[parent_id] = []
+            order.append(parent_id)
+        groups[parent_id].append(child)
+
+    expanded: List[ScoredChunk] = []
+    for parent_id in order:
+        if len(expanded) >= limit:
+            break
+        matched = groups[parent_id]
+        best = min(c.distance for c in matched)
+        parent = _docstore_get(vectorstore, PARENT_ID_PREFIX + parent_id)
+        if parent is None:
+            # Parent missing (partial index); fall back to the best child itself
+            expanded.append(min(matched, key=lambda c: c.distance))
+            continue
+        metadata = dict(parent.metadata)
+        metadata["matched_children"] = len(matched)
+        text = parent.page_content
+        if mode == "window":
+            text = _window(text, matched, window_chars)
+        expanded.append(ScoredChunk(text=text, metadata=metadata, distance=best))
+
+    for chunk in passthrough:
+        if len(expanded) >= limit:
+            break
+        expanded.append(chunk)
+    expanded.sort(key=lambda c: c.distance)
+    return expanded
+
+
+def _window(parent_text: str, matched: List[ScoredChunk], window_chars: int) -> str:
+    spans = []
+    for child in matched:
+        start: Optional[int] = child.metadata.get("start_index")
+        if start is None or start < 0:
+            return parent_text
+        spans.append((start, start + len(child.text)))
+    lo = max(0, min(s for s, _ in spans) - window_chars)
+    hi = min(len(parent_text), max(e for _, e in spans) + window_chars)
+    # Snap to whitespace so the window does not start or end mid-word
+    if lo > 0:
+        space = parent_text.find(" ", lo)
+        lo = space + 1 if 0 <= space < min(s for s, _ in spans) else lo
+    if hi < len(parent_text):
+        space = parent_text.rfind(" ", max(e for _, e in spans), hi)
+        hi = space if space > 0 else hi
+    return parent_text[lo:hi]
@@ -0,0 +1,443 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from .backends import OllamaPool
+from .cache import TTLCache
+from .context_packing import PackedContext, ScoredChunk, pack_context, resolve_context_budget
+from .faq import FaqIndex, FaqMatch
+from .filters import RetrievalFilters, index_filters
+from .index_reload import IndexSlot
+from .parent_child import expand_children, is_parent_child_index
+from .reduction import index_projection
+from .hedging import HedgePolicy, first_response
+from .llm import LLMFactory
+from .metrics import metrics
+from .retrieval import AsyncOllamaEmbedder, search_by_vector
+from .routing import HybridRouter, RouteDecision
+from .tokens import count_tokens
+
+
+# ---- Problem-solver prompt tailored for handbook-style queries ----
+RAG_PROMPT_TEMPLATE = """You are a helpful UCL Computer Science handbook assistant.
+Answer using ONLY the context. If the answer is not in the context, say "I don't know based on the handbook excerpts provided."
+
+Write concise, actionable guidance:
+- Start with the direct answer in one short sentence.
+- Then list 2–5 clear steps (what to do / who to contact / forms to submit / deadlines).
+- If relevant, include warnings/caveats (e.g., evidence required, timing rules).
+- End with a one-line source label: "Source: <section or heading>".
+
+STRICT RULES:
+- Do not invent emails, links, or policies not shown in context.
+- Prefer official terms from the context (e.g., Extenuating Circumstances, SORA).
+- Keep total length under ~8 lines.
+
+Context:
+{context}
+
+Question: {question}
+
+Helpful, grounded answer:"""
+
+
+@dataclass
+class PreparedQuery:
+    """Everything known about a request once retrieval and prompt assembly are done."""
+
+    question: str
+    model_name: str
+    packed: PackedContext
+    prompt: str
+    timings: Dict[str, float] = field(default_factory=dict)
+    hedge: Dict[str, Any] = field(default_factory=dict)
+    # Set when a curated FAQ answer can be served without calling the model
+    fast_path: Optional[FaqMatch] = None
+    answer_cached: bool = False
+
+
+@dataclass
+class Generation:
+    text: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    # Tokens the request's own route pays for when they differ from the reported usage:
+    # a winning hedge is costed on its own route, leaving only the cancelled primary's prompt
+    charged: Optional[Tuple[int, int]] = None
+
+    def charged_usage(self) -> Tuple[Optional[int], Optional[int]]:
+        return self.charged if self.charged is not None else (self.prompt_tokens, self.completion_tokens)
+
+    def usage(self) -> Dict[str, int]:
+        prompt_tokens = self.prompt_tokens or 0
+        completion_tokens = self.completion_tokens or 0
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+
+def _message_text(message) -> str:
+    content = getattr(message, "content", None)
+    if content is None:
+        return str(message)
+    return content if isinstance(content, str) else str(content)
+
+
+def _estimate_missing_usage(generation: Generation, model_name: str, prompt: str) -> None:
+    """Fill token counts the upstream did not report with estimates, so cost accounting never sees zero."""
+    if generation.prompt_tokens is None:
+        generation.prompt_tokens = count_tokens(prompt, model_name)
+    if generation.completion_tokens is None:
+        generation.completion_tokens = count_tokens(generation.text, model_name)
+
+
+def _usage_from_message(message) -> Dict[str, Optional[int]]:
+    usage = getattr(message, "usage_metadata", None) or {}
+    return {"prompt_tokens": usage.get("input_tokens"), "completion_tokens": usage.get("output_tokens")}
+
+
+def source_labels(chunks: List[ScoredChunk]) -> List[str]:
+    labels: List[str] = []
+    for chunk in chunks:
+        if chunk.label not in labels:
+            labels.append(chunk.label)
+    return labels
+
+
+# Failures that happen before a replica produced anything; safe to retry elsewhere
+_CONNECT_ERRORS = (httpx.TransportError, ConnectionError)
+
+
+def _cache_key(question: str) -> str:
+    return " ".join(question.split())
+
+
+def _cache_get(cache: Optional[TTLCache], name: str, key):
+    if cache is None:
+        return None
+    value = cache.get(key)
+    metrics.inc("cache_requests_total", cache=name, hit=value is not None)
+    return value
+
+
+async def _prepend(first, rest: AsyncIterator) -> AsyncIterator:
+    if first is not None:
+        yield first
+    async for item in rest:
+        yield item
+
+
+class RagPipeline:
+    """Shared retrieve → pack → format → generate path used by every endpoint.
+
+    Built once at startup; each stage is a separate coroutine or function so
+    endpoints can stream, time or short-circuit individual stages.
+    """
+
+    def __init__(
+        self,
+        index: IndexSlot,
+        embedder: AsyncOllamaEmbedder,
+        search_executor: ThreadPoolExecutor,
+        llm_factory: LLMFactory,
+        retrieval_k: int,
+        budget_overrides: Dict[str, int],
+        local_budget: int,
+        cloud_budget: int,
+        pool: Optional[OllamaPool] = None,
+        hedger: Optional[HedgePolicy] = None,
+        faq: Optional[FaqIndex] = None,
+        embedding_cache: Optional[TTLCache] = None,
+        retrieval_cache: Optional[TTLCache] = None,
+        answer_cache: Optional[TTLCache] = None,
+        child_fanout: int = 3,
+        parent_expansion: str = "parent",
+        expansion_window_chars: int = 600,
+        router: Optional[HybridRouter] = None,
+    ):
+        self.index = index
+        self.embedder = embedder
+        self.search_executor = search_executor
+        self.llm_factory = llm_factory
+        self.retrieval_k = retrieval_k
+        self.budget_overrides = budget_overrides
+        self.local_budget = local_budget
+        self.cloud_budget = cloud_budget
+        self.pool = pool
+        self.hedger = hedger
+        self.faq = faq
+        self.embedding_cache = embedding_cache
+        self.retrieval_cache = retrieval_cache
+        self.answer_cache = answer_cache
+        self.child_fanout = child_fanout
+        self.parent_expansion = parent_expansion
+        self.expansion_window_chars = expansion_window_chars
+        self.router = router
+
+    async def retrieve(
+        self, question: str, timings: Dict[str, float], filters: Optional[RetrievalFilters] = None
+    ) -> Tuple[List[float], List[ScoredChunk]]:
+        key = _cache_key(question)
+        filter_key = filters.key() if filters is not None and not filters.empty else None
+        # Retrieval results are versioned by index so a hot reload never serves stale chunks
+        retrieval_key = (key, self.retrieval_k, self.index.current.version, filter_key)
+        cached = _cache_get(self.retrieval_cache, "retrieval", retrieval_key)
+        if cached is not None:
+            timings["embed_s"] = timings["search_s"] = 0.0
+            return cached
+        t0 = time.perf_counter()
+        vector = _cache_get(self.embedding_cache, "embedding", key)
+        if vector is None:
+            vector = await self.embedder.embed_query(question)
+            if self.embedding_cache is not None:
+                self.embedding_cache.set(key, vector)
+        t1 = time.perf_counter()
+        with self.index.acquire() as loaded:
+            parent_child = is_parent_child_index(loaded.vectorstore)
+            # Small child chunks: over-fetch, then collapse to distinct parents
+            k = self.retrieval_k * self.child_fanout if parent_child else self.retrieval_k
+            # Cached/returned vectors stay full-dimension; reduced indexes get the projected query
+            projection = index_projection(loaded.vectorstore)
+            search_vector = projection.apply_one(vector) if projection is not None else vector
+            selection = None
+            if filter_key is not None:
+                # Filters resolve to a precomputed id bitmap that FAISS checks during the scan
+                selection = index_filters(loaded.vectorstore).select(filters)
+                metrics.inc("filtered_queries_total", matched=selection.count > 0)
+                metrics.observe("filter_selected_fraction", selection.count / max(1, loaded.vectorstore.index.ntotal))
+            if selection is not None and selection.count == 0:
+                chunks = []
+            else:
+                selector = selection.selector if selection is not None else None
+                chunks = await search_by_vector(loaded.vectorstore, search_vector, k, self.search_executor, selector)
+            if parent_child:
+                chunks = expand_children(
+                    loaded.vectorstore, chunks, self.retrieval_k, self.parent_expansion, self.expansion_window_chars
+                )
+        timings["embed_s"] = t1 - t0
+        timings["search_s"] = time.perf_counter() - t1
+        metrics.observe("embed_seconds", timings["embed_s"])
+        metrics.observe("search_seconds", timings["search_s"])
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.set((key, self.retrieval_k, loaded.version, filter_key), (vector, chunks))
+        return vector, chunks
+
+    def clear_caches(self) -> None:
+        for cache in (self.embedding_cache, self.retrieval_cache, self.answer_cache):
+            if cache is not None:
+                cache.clear()
+
+    def pack(self, chunks: List[ScoredChunk], model_name: str) -> PackedContext:
+        budget = resolve_context_budget(model_name, self.budget_overrides, self.local_budget, self.cloud_budget)
+        packed = pack_context(chunks, budget, model=model_name)
+        metrics.observe("context_tokens_saved", packed.tokens_saved, model=model_name)
+        return packed
+
+    @staticmethod
+    def format(question: str, packed: PackedContext) -> str:
+        return RAG_PROMPT_TEMPLATE.format(context=packed.text, question=question)
+
+    async def prepare(
+        self, question: str, model_name: str, filters: Optional[RetrievalFilters] = None
+    ) -> PreparedQuery:
+        timings: Dict[str, float] = {}
+        vector, chunks = await self.retrieve(question, timings, filters)
+        t0 = time.perf_counter()
+        packed = self.pack(chunks, model_name)
+        prompt = self.format(question, packed)
+        timings["pack_s"] = time.perf_counter() - t0
+        prepared = PreparedQuery(question=question, model_name=model_name, packed=packed, prompt=prompt, timings=timings)
+        if self.faq is not None:
+            prepared.fast_path = self.faq.match(vector, chunks)
+            metrics.inc("faq_lookups_total", hit=prepared.fast_path is not None)
+        return prepared
+
+    @staticmethod
+    def fast_answer(prepared: PreparedQuery) -> Generation:
+        """The curated answer for a fast-path match; no tokens are spent."""
+        prepared.timings["generate_s"] = 0.0
+        return Generation(text=prepared.fast_path.entry.answer, prompt_tokens=0, completion_tokens=0)
+
+    @asynccontextmanager
+    async def _backend(self, model_name: str, tried: Set[str]) -> AsyncIterator[Optional[str]]:
+        """Lease an Ollama replica for local models; cloud models go straight to LiteLLM."""
+        if self.pool is None or not model_name.startswith("ollama/"):
+            yield None
+            return
+        async with self.pool.lease(model_name, exclude=tried) as replica:
+            tried.add(replica.url)
+            yield replica.url
+
+    def _can_retry(self, model_name: str, tried: Set[str]) -> bool:
+        return model_name.startswith("ollama/") and self.pool is not None and len(tried) < min(2, len(self.pool))
+
+    async def _attempt(self, model_name: str, prompt: str, tried: Set[str]) -> AsyncIterator:
+        """Raw message chunks from one upstream call, holding its replica lease until closed."""
+        async with self._backend(model_name, tried) as base_url:
+            llm = self.llm_factory.for_prompt(model_name, prompt, base_url)
+            async with aclosing(llm.astream(prompt)) as upstream:
+                async for part in upstream:
+                    yield part
+
+    async def _tracked(self, attempt: AsyncIterator, decision: RouteDecision, prompt: str) -> AsyncIterator:
+        """``attempt`` counted as its own routed request, costed for what it streamed even if abandoned."""
+        async with self.router.track(decision) as route:
+            usage: Dict[str, Optional[int]] = {"prompt_tokens": None, "completion_tokens": None}
+            parts: List[str] = []
+            try:
+                async with aclosing(attempt):
+                    async for part in attempt:
+                        usage.update({k: v for k, v in _usage_from_message(part).items() if v is not None})
+                        parts.append(_message_text(part))
+                        yield part
+            finally:
+                spent = Generation(text="".join(parts), **usage)
+                _estimate_missing_usage(spent, decision.model, prompt)
+                route.record_usage(spent.prompt_tokens, spent.completion_tokens)
+
+    async def _open(
+        self, model_name: str, prompt: str, tried: Set[str], decision: Optional[RouteDecision] = None
+    ) -> Tuple[AsyncIterator, Optional[Any]]:
+        """Start an attempt and wait for its first chunk; connection failures are retried on another replica.
+
+        With ``decision`` (hedges) the attempt is tracked by the router as a request of its own.
+        """
+        t0 = time.perf_counter()
+        while True:
+            attempt = self._attempt(model_name, prompt, tried)
+            if decision is not None and self.router is not None:
+                attempt = self._tracked(attempt, decision, prompt)
+            try:
+                first = await anext(attempt)
+            except StopAsyncIteration:
+                return attempt, None
+            except _CONNECT_ERRORS:
+                await attempt.aclose()
+                if not self._can_retry(model_name, tried):
+                    raise
+                continue
+            except BaseException:
+                await attempt.aclose()
+                raise
+            metrics.observe("attempt_ttft_seconds", time.perf_counter() - t0, model=model_name)
+            return attempt, first
+
+    async def _open_hedged(self, prepared: PreparedQuery, tried: Set[str]) -> Tuple[AsyncIterator, Optional[Any]]:
+        """Open the primary attempt; if its first chunk is late, race a hedge and keep the winner."""
+        model_name = prepared.model_name
+        target = self.hedger.target_for(model_name) if self.hedger is not None else None
+        if target is None:
+            return await self._open(model_name, prepared.prompt, tried)
+
+        self.hedger.note_request()
+        delay_s = self.hedger.delay_for(model_name)
+
+        def start_hedge():
+            decision = None
+            if self.router is not None:
+                # Hedges count against the cloud in-flight limit and cost cap like any routed request
+                decision = self.router.hedge_decision(model_name, target)
+                if decision is None:
+                    metrics.inc("hedges_skipped_total", model=model_name, reason="cloud_cap")
+                    return None
+            if not self.hedger.try_acquire(model_name):
+                return None
+            metrics.inc("hedges_issued_total", model=model_name)
+            prepared.hedge = {"issued": True, "model": target, "delay_s": delay_s, "winner": "primary"}
+            return self._open(target, prepared.prompt, tried, decision)
+
+        async def discard(opened) -> None:
+            await opened[0].aclose()
+
+        opened, winner = await first_response(self._open(model_name, prepared.prompt, tried), start_hedge, delay_s, discard)
+        if winner == "hedge":
+            prepared.hedge["winner"] = "hedge"
+            metrics.inc("hedges_won_total", model=model_name)
+        return opened
+
+    def _cached_answer(self, prepared: PreparedQuery) -> Optional[Generation]:
+        cached = _cache_get(self.answer_cache, "answer", (prepared.model_name, prepared.prompt))
+        if cached is None:
+            return None
+        prepared.answer_cached = True
+        prepared.timings["generate_s"] = 0.0
+        # Nothing was spent upstream, so report no token usage
+        return Generation(text=cached)
+
+    def _store_answer(self, prepared: PreparedQuery, generation: Generation) -> None:
+        if self.answer_cache is not None and generation.text:
+            self.answer_cache.set((prepared.model_name, prepared.prompt), generation.text)
+
+    async def generate(self, prepared: PreparedQuery) -> Generation:
+        cached = self._cached_answer(prepared)
+        if cached is not None:
+            return cached
+        if self.hedger is not None:
+            # Hedging races on the first token, so generation has to stream
+            generation = Generation(text="")
+            async for _ in self.stream(prepared, generation):
+                pass
+            return generation
+        t0 = time.perf_counter()
+        tried: Set[str] = set()
+        while True:
+            try:
+                async with self._backend(prepared.model_name, tried) as base_url:
+                    llm = self.llm_factory.for_prompt(prepared.model_name, prepared.prompt, base_url)
+                    message = await llm.ainvoke(prepared.prompt)
+                break
+            except _CONNECT_ERRORS:
+                if not self._can_retry(prepared.model_name, tried):
+                    raise
+        prepared.timings["generate_s"] = time.perf_counter() - t0
+        metrics.observe("generate_seconds", prepared.timings["generate_s"], model=prepared.model_name)
+        generation = Generation(text=_message_text(message), **_usage_from_message(message))
+        _estimate_missing_usage(generation, prepared.model_name, prepared.prompt)
+        self._store_answer(prepared, generation)
+        return generation
+
+    async def stream(self, prepared: PreparedQuery, generation: Optional[Generation] = None) -> AsyncIterator[str]:
+        """Yield answer deltas; if ``generation`` is given it is filled in as the stream completes.
+
+        A replica that fails before sending the first chunk is retried once on
+        another, and a slow first chunk may be hedged (see ``HedgePolicy``).
+        """
+        cached = self._cached_answer(prepared)
+        if cached is not None:
+            if generation is not None:
+                generation.text = cached.text
+            yield cached.text
+            return
+        t0 = time.perf_counter()
+        parts: List[str] = []
+        upstream, first = await self._open_hedged(prepared, set())
+        # Close the upstream stream as soon as we stop consuming (e.g. client disconnect)
+        async with aclosing(upstream), aclosing(_prepend(first, upstream)) as chunks:
+            async for part in chunks:
+                if generation is not None:
+                    usage = _usage_from_message(part)
+                    generation.prompt_tokens = usage["prompt_tokens"] or generation.prompt_tokens
+                    generation.completion_tokens = usage["completion_tokens"] or generation.completion_tokens
+                delta = _message_text(part)
+                if not delta:
+                    continue
+                if not parts:
+                    prepared.timings["ttft_s"] = time.perf_counter() - t0
+                    metrics.observe("ttft_seconds", prepared.timings["ttft_s"], model=prepared.model_name)
+                parts.append(delta)
+                yield delta
+        prepared.timings["generate_s"] = time.perf_counter() - t0
+        metrics.observe("generate_seconds", prepared.timings["generate_s"], model=prepared.model_name)
+        completed = Generation(text="".join(parts))
+        if generation is not None:
+            generation.text = completed.text
+            _estimate_missing_usage(generation, prepared.model_name, prepared.prompt)
+            if prepared.hedge.get("winner") == "hedge":
+                generation.charged = (count_tokens(prepared.prompt, prepared.model_name), 0)
+        self._store_answer(prepared, completed)
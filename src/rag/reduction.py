@@ -0,0 +1,119 @@
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# Reduced indexes record {"method", "dim", "source_dim", ...} under "reduction" in manifest.json;
+# PCA indexes also ship the fitted mean and components in this file (checksummed like the rest)
+PROJECTION_FILE = "projection.npz"
+REDUCTION_METHODS = ("truncate", "pca")
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class Projection:
+    """Maps full embeddings into an index's reduced space, then renormalizes.
+
+    ``truncate`` keeps the first ``dim`` coordinates (Matryoshka-trained
+    models such as Qwen3-Embedding front-load information there); ``pca``
+    centres on the corpus mean and projects onto the top ``dim`` principal
+    components fitted at build time.
+    """
+
+    def __init__(
+        self,
+        method: str,
+        dim: int,
+        source_dim: int,
+        mean: Optional[np.ndarray] = None,
+        components: Optional[np.ndarray] = None,
+        explained_variance: Optional[float] = None,
+    ):
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"Unknown reduction '{method}' (expected one of {', '.join(REDUCTION_METHODS)})")
+        if not 0 < dim <= source_dim:
+            raise ValueError(f"Reduced dimension {dim} must be between 1 and {source_dim}")
+        if method == "pca" and (mean is None or components is None):
+            raise ValueError("A PCA projection needs its mean and components")
+        self.method = method
+        self.dim = dim
+        self.source_dim = source_dim
+        self.mean = mean
+        self.components = components
+        self.explained_variance = explained_variance
+
+    @classmethod
+    def fit(cls, method: str, vectors: np.ndarray, dim: int, sample: int = 50000) -> "Projection":
+        """Fit on ``vectors`` (PCA uses at most ``sample`` evenly spaced rows)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        source_dim = vectors.shape[1]
+        if method != "pca":
+            return cls(method, dim, source_dim)
+        if len(vectors) > sample:
+            vectors = vectors[np.linspace(0, len(vectors) - 1, sample).astype(np.int64)]
+        mean = vectors.mean(axis=0)
+        centred = (vectors - mean).astype(np.float64)
+        # Eigen-decomposition of the d x d covariance; cheaper than an SVD of the n x d matrix
+        eigvals, eigvecs = np.linalg.eigh(centred.T @ centred / max(1, len(centred) - 1))
+        top = np.argsort(eigvals)[::-1][:dim]
+        explained = float(eigvals[top].sum() / max(eigvals.sum(), 1e-12))
+        return cls(method, dim, source_dim, mean, eigvecs[:, top].T.astype(np.float32), explained)
+
+    def apply(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if vectors.shape[1] != self.source_dim:
+            raise ValueError(f"Projection expects {self.source_dim}-d embeddings, got {vectors.shape[1]}-d")
+        if self.method == "truncate":
+            reduced = vectors[:, :self.dim]
+        else:
+            reduced = (vectors - self.mean) @ self.components.T
+        return _normalise(reduced).astype(np.float32)
+
+    def apply_one(self, vector: List[float]) -> List[float]:
+        return self.apply(vector)[0].tolist()
+
+    def save(self, index_dir: str) -> Dict:
+        """Write the projection next to the index; returns its manifest entry."""
+        entry: Dict = {"method": self.method, "dim": self.dim, "source_dim": self.source_dim}
+        if self.method == "pca":
+            np.savez(os.path.join(index_dir, PROJECTION_FILE), mean=self.mean, components=self.components)
+            entry["file"] = PROJECTION_FILE
+            entry["explained_variance"] = round(self.explained_variance or 0.0, 4)
+        return entry
+
+
+def load_projection(index_dir: str, manifest: Optional[Dict]) -> Optional[Projection]:
+    """The projection recorded in ``manifest``, or None for a full-dimension index."""
+    entry = (manifest or {}).get("reduction")
+    if not entry:
+        return None
+    mean = components = None
+    if entry.get("file"):
+        with np.load(os.path.join(index_dir, entry["file"])) as data:
+            mean, components = data["mean"], data["components"]
+    return Projection(entry["method"], int(entry["dim"]), int(entry["source_dim"]), mean, components, entry.get("explained_variance"))
+
+
+class ProjectedEmbeddings:
+    """Embeddings client whose vectors come out in a reduced index's space."""
+
+    def __init__(self, inner, projection: Projection):
+        self.inner = inner
+        self.projection = projection
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.projection.apply(self.inner.embed_documents(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.projection.apply_one(self.inner.embed_query(text))
+
+
+def index_projection(vectorstore) -> Optional[Projection]:
+    """Projection queries need before searching ``vectorstore`` (None when it holds full vectors)."""
+    return getattr(vectorstore.embedding_function, "projection", None)
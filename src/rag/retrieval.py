@@ -0,0 +1,93 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import httpx
+
+from .backends import OllamaPool
+from .context_packing import ScoredChunk
+
+
+def default_search_threads() -> int:
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def create_search_executor(threads: Optional[int] = None) -> ThreadPoolExecutor:
+    """Dedicated pool for CPU-bound FAISS search, sized independently of the default executor."""
+    return ThreadPoolExecutor(max_workers=threads or default_search_threads(), thread_name_prefix="faiss-search")
+
+
+class AsyncOllamaEmbedder:
+    """Non-blocking client for Ollama's ``/api/embed`` endpoint.
+
+    Produces the same vectors as ``OllamaEmbeddings`` (which calls the same
+    endpoint) without occupying a thread per in-flight query. Requests are
+    spread over the replica pool; a connection failure is retried once on
+    another replica.
+    """
+
+    def __init__(self, pool: OllamaPool, model: str, client: httpx.AsyncClient, timeout_s: float = 30.0):
+        self.pool = pool
+        self.model = model
+        self.client = client
+        self.timeout_s = timeout_s
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        tried = set()
+        while True:
+            try:
+                async with self.pool.lease(self.model, exclude=tried) as replica:
+                    tried.add(replica.url)
+                    resp = await self.client.post(
+                        f"{replica.url}/api/embed",
+                        json={"model": self.model, "input": texts},
+                        timeout=self.timeout_s,
+                    )
+                    resp.raise_for_status()
+                break
+            except httpx.TransportError:
+                if len(tried) >= min(2, len(self.pool)):
+                    raise
+        embeddings = resp.json().get("embeddings") or []
+        if len(embeddings) != len(texts):
+            raise RuntimeError(f"Ollama returned {len(embeddings)} embeddings for {len(texts)} inputs")
+        return embeddings
+
+    async def embed_query(self, text: str) -> List[float]:
+        return (await self.embed([text]))[0]
+
+
+def _search_sync(vectorstore, vector: List[float], k: int, selector=None) -> List[ScoredChunk]:
+    if selector is None:
+        results = vectorstore.similarity_search_with_score_by_vector(vector, k=k)
+        return [
+            ScoredChunk(text=doc.page_content, metadata=doc.metadata, distance=float(score))
+            for doc, score in results
+        ]
+    import faiss
+    import numpy as np
+
+    # Excluded ids are skipped inside the scan, so k results come back however narrow the filter
+    distances, ids = vectorstore.index.search(
+        np.asarray([vector], dtype=np.float32), k, params=faiss.SearchParameters(sel=selector)
+    )
+    chunks = []
+    for distance, i in zip(distances[0], ids[0]):
+        if i < 0:
+            # Fewer than k vectors pass the filter
+            continue
+        doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(i)])
+        chunks.append(ScoredChunk(text=doc.page_content, metadata=doc.metadata, distance=float(distance)))
+    return chunks
+
+
+async def search_by_vector(
+    vectorstore, vector: List[float], k: int, executor: ThreadPoolExecutor, selector=None
+) -> List[ScoredChunk]:
+    """Run FAISS search on ``executor`` so the event loop keeps serving other requests.
+
+    ``selector`` (a FAISS ``IDSelector``) restricts the search to the ids it admits.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, _search_sync, vectorstore, vector, k, selector)
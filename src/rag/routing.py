@@ -0,0 +1,184 @@
+import math
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Optional
+
+from .metrics import MetricsRegistry
+
+
+AUTO_MODEL_ALIAS = "auto"
+
+
+class CloudBudgetExceeded(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class RoutingConfig:
+    local_model: str
+    cloud_model: str
+    slo_p95_s: float
+    local_parallel_slots: int
+    local_max_queue: int
+    cloud_max_inflight: int
+    cloud_daily_cost_cap_usd: float
+    cloud_price_per_1k_input: float
+    cloud_price_per_1k_output: float
+    min_samples: int = 5
+
+
+@dataclass
+class RouteDecision:
+    requested: str
+    model: str
+    tier: str
+    reason: str
+    predicted_local_s: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+class RouteHandle:
+    """Returned by ``HybridRouter.track``; lets the caller report token usage for cost accounting."""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record_usage(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+        self.prompt_tokens = prompt_tokens or 0
+        self.completion_tokens = completion_tokens or 0
+
+
+def _tier(model_name: str) -> str:
+    return "local" if model_name.startswith("ollama/") else "cloud"
+
+
+class HybridRouter:
+    """Latency-aware routing between local Ollama SLMs and a LiteLLM cloud model.
+
+    Explicit model names are honoured as-is (subject to the cloud cost cap). The
+    ``auto`` alias goes to the local model unless it is busy and its predicted
+    latency — recent p95 scaled by how many requests are queued ahead per
+    parallel slot — would breach the SLO, or its queue is full. Then it spills
+    to the cloud model while the cloud tier has in-flight and cost budget left.
+    """
+
+    def __init__(self, config: RoutingConfig, registry: MetricsRegistry):
+        self.config = config
+        self.metrics = registry
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, int] = {}
+        self._cost_day = ""
+        self._cost_today_usd = 0.0
+
+    # --- state ---
+    def inflight(self, model_name: str) -> int:
+        with self._lock:
+            return self._inflight.get(model_name, 0)
+
+    def tier_inflight(self, tier: str) -> int:
+        with self._lock:
+            return sum(n for m, n in self._inflight.items() if _tier(m) == tier)
+
+    def cloud_cost_today(self) -> float:
+        with self._lock:
+            self._roll_cost_day()
+            return self._cost_today_usd
+
+    def _roll_cost_day(self) -> None:
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        if today != self._cost_day:
+            self._cost_day = today
+            self._cost_today_usd = 0.0
+
+    def cloud_budget_left(self) -> bool:
+        cap = self.config.cloud_daily_cost_cap_usd
+        return cap <= 0 or self.cloud_cost_today() < cap
+
+    def hedge_decision(self, requested: str, target: str) -> Optional[RouteDecision]:
+        """Route for a hedge of ``requested`` on ``target``, or None when the cloud tier cannot take it.
+
+        A hedge is extra load: cloud hedges need in-flight and cost headroom like spill-over does.
+        """
+        decision = RouteDecision(requested=requested, model=target, tier=_tier(target), reason="hedge")
+        if decision.tier == "cloud" and not (
+            self.tier_inflight("cloud") < self.config.cloud_max_inflight and self.cloud_budget_left()
+        ):
+            return None
+        return decision
+
+    def predicted_local_latency(self, model_name: str) -> Optional[float]:
+        samples = self.metrics.samples("routed_request_seconds", model=model_name)
+        if len(samples) < self.config.min_samples:
+            return None
+        p95 = self.metrics.percentile("routed_request_seconds", 95, model=model_name) or 0.0
+        waves = math.ceil((self.inflight(model_name) + 1) / max(1, self.config.local_parallel_slots))
+        return p95 * waves
+
+    # --- decisions ---
+    def resolve(self, requested: str) -> RouteDecision:
+        if requested != AUTO_MODEL_ALIAS:
+            tier = _tier(requested)
+            if tier == "cloud" and not self.cloud_budget_left():
+                self.metrics.inc("routing_decisions_total", tier=tier, reason="cloud_cost_cap")
+                raise CloudBudgetExceeded(f"Daily cloud cost cap of ${self.config.cloud_daily_cost_cap_usd:.2f} reached")
+            decision = RouteDecision(requested=requested, model=requested, tier=tier, reason="explicit")
+        else:
+            decision = self._resolve_auto()
+        self.metrics.inc("routing_decisions_total", tier=decision.tier, reason=decision.reason)
+        return decision
+
+    def _resolve_auto(self) -> RouteDecision:
+        local = self.config.local_model
+        inflight = self.inflight(local)
+        predicted = self.predicted_local_latency(local)
+        queue_full = inflight >= self.config.local_max_queue
+        # An idle local model always takes the request, which also keeps its latency samples fresh
+        slo_breach = inflight > 0 and predicted is not None and predicted > self.config.slo_p95_s
+        if not (queue_full or slo_breach):
+            return RouteDecision(AUTO_MODEL_ALIAS, local, "local", "within_slo", predicted)
+
+        reason = "local_queue_full" if queue_full else "local_p95_breach"
+        if self.tier_inflight("cloud") >= self.config.cloud_max_inflight:
+            return RouteDecision(AUTO_MODEL_ALIAS, local, "local", f"{reason}_cloud_busy", predicted)
+        if not self.cloud_budget_left():
+            return RouteDecision(AUTO_MODEL_ALIAS, local, "local", f"{reason}_cloud_cost_cap", predicted)
+        return RouteDecision(AUTO_MODEL_ALIAS, self.config.cloud_model, "cloud", reason, predicted)
+
+    @asynccontextmanager
+    async def track(self, decision: RouteDecision) -> AsyncIterator[RouteHandle]:
+        """Count the request as in flight for its model; record latency and cloud cost when done."""
+        model = decision.model
+        with self._lock:
+            self._inflight[model] = self._inflight.get(model, 0) + 1
+            self.metrics.set_gauge("inflight_requests", self._inflight[model], model=model)
+        handle = RouteHandle()
+        started = time.perf_counter()
+        completed = False
+        try:
+            yield handle
+            completed = True
+        finally:
+            with self._lock:
+                self._inflight[model] -= 1
+                self.metrics.set_gauge("inflight_requests", self._inflight[model], model=model)
+            if completed:
+                self.metrics.observe("routed_request_seconds", time.perf_counter() - started, model=model)
+            if decision.tier == "cloud":
+                self._add_cloud_cost(handle)
+
+    def _add_cloud_cost(self, handle: RouteHandle) -> None:
+        cost = (
+            handle.prompt_tokens * self.config.cloud_price_per_1k_input
+            + handle.completion_tokens * self.config.cloud_price_per_1k_output
+        ) / 1000.0
+        with self._lock:
+            self._roll_cost_day()
+            self._cost_today_usd += cost
+            self.metrics.set_gauge("cloud_cost_today_usd", self._cost_today_usd)
+        self.metrics.inc("cloud_cost_usd_total", cost)
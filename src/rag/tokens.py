@@ -0,0 +1,68 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+
+# Estimated characters per token for the local model families we serve, used
+# because Ollama exposes no tokenizer. These are conservative rules of thumb
+# (set below typical English ratios so counts err high), not measurements;
+# check them against the real tokenizers with src/benchmarking/token_ratios.py.
+CHARS_PER_TOKEN_BY_FAMILY = {
+    "phi-3": 3.4,
+    "phi-4": 3.9,
+    "llama-3": 4.0,
+    "qwen": 3.7,
+    "falcon": 3.6,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.5
+
+
+def _is_local_model(model: str) -> bool:
+    return model.startswith("ollama/")
+
+
+def _family_ratio(model: str) -> float:
+    lowered = model.lower()
+    for family, ratio in CHARS_PER_TOKEN_BY_FAMILY.items():
+        if family in lowered or family.replace("-", "") in lowered:
+            return ratio
+    return DEFAULT_CHARS_PER_TOKEN
+
+
+@lru_cache(maxsize=4)
+def _load_encoding(encoding_name: str):
+    # Cached, so each fallback is reported once per process rather than per request
+    try:
+        import tiktoken  # type: ignore
+    except Exception:
+        print("WARNING: tiktoken is not installed; cloud token counts are estimated from characters.")
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        # Encodings are downloaded on first use unless TIKTOKEN_CACHE_DIR already holds them
+        print(f"WARNING: tiktoken encoding '{encoding_name}' unavailable ({e}); cloud token counts are estimated.")
+        return None
+
+
+def _tiktoken_encoding(model: str):
+    """Return a tiktoken encoding for cloud models, or None if tiktoken is unavailable."""
+    encoding_name = "o200k_base" if re.search(r"gpt-(4o|4\.1|4-1|5)", model.lower()) else "cl100k_base"
+    return _load_encoding(encoding_name)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count prompt tokens for ``model``.
+
+    Cloud models use tiktoken when installed. Local Ollama models (and cloud
+    models without tiktoken) use a per-family characters-per-token ratio, which
+    errs slightly high so budgets stay on the safe side.
+    """
+    if not text:
+        return 0
+    model = model or ""
+    if model and not _is_local_model(model):
+        encoding = _tiktoken_encoding(model)
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+    return int(len(text) / _family_ratio(model)) + 1
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .backends import OllamaPool
+from .metrics import metrics
+
+
+def load_warmup_questions(suggestions_path: Optional[str], testset_path: Optional[str], limit: int) -> List[str]:
+    """Prompt suggestions first (what OpenWebUI users click), then testset questions, de-duplicated."""
+    questions: List[str] = []
+    sources = [(suggestions_path, "content"), (testset_path, "user_input")]
+    for path, key in sources:
+        if not path:
+            continue
+        if not os.path.exists(path):
+            print(f"WARNING: warm-up source '{path}' not found; skipping.")
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        for item in items:
+            question = (item.get(key) or "").strip()
+            if question and question not in questions:
+                questions.append(question)
+    return questions[:limit] if limit > 0 else questions
+
+
+@dataclass
+class WarmupState:
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    # Retrieval was warmed but generating the answer failed (e.g. model not pulled)
+    answers_failed: int = 0
+    running: bool = False
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def coverage(self) -> float:
+        return 1.0 if self.total == 0 else self.done / self.total
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "running": self.running,
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "answers_failed": self.answers_failed,
+            "coverage": round(self.coverage, 3),
+            "elapsed_s": None if elapsed is None else round(elapsed, 2),
+            "errors": self.errors[-5:],
+        }
+
+
+async def preload_models(client: httpx.AsyncClient, pool: OllamaPool, chat_models: List[str], embedding_model: Optional[str], keep_alive: str) -> None:
+    """Load models into memory on every replica so the first real request skips the cold load.
+
+    ``embedding_model`` is None when queries are embedded in-process.
+    """
+    async def load(url: str, endpoint: str, payload: Dict[str, Any]) -> None:
+        try:
+            resp = await client.post(f"{url}{endpoint}", json={**payload, "keep_alive": keep_alive}, timeout=600)
+            resp.raise_for_status()
+        except Exception as e:
+            print(f"WARNING: could not preload '{payload['model']}' on {url}: {e}")
+
+    jobs = []
+    for url in pool.urls:
+        # An empty prompt/input makes Ollama load the model without generating
+        if embedding_model:
+            jobs.append(load(url, "/api/embed", {"model": embedding_model, "input": ""}))
+        for model in chat_models:
+            if model.startswith("ollama/"):
+                jobs.append(load(url, "/api/generate", {"model": model.split("/", 1)[-1], "prompt": ""}))
+    await asyncio.gather(*jobs)
+
+
+async def _answer(pipeline, prepared, model_name: str) -> None:
+    """Generate like an endpoint would: routed, so cloud answers count against the cost cap."""
+    router = pipeline.router
+    if router is None:
+        await pipeline.generate(prepared)
+        return
+    # Raises CloudBudgetExceeded once the cap is reached, which skips the model's remaining answers
+    decision = router.resolve(model_name)
+    async with router.track(decision) as route:
+        generation = await pipeline.generate(prepared)
+        route.record_usage(*generation.charged_usage())
+
+
+async def warm_up(pipeline, questions: List[str], models: List[str], state: WarmupState, answer: bool = True, concurrency: int = 2) -> WarmupState:
+    """Replay ``questions`` through the pipeline to fill the embedding, retrieval and answer caches.
+
+    Each question/model pair counts once towards coverage once retrieval is
+    warmed; with ``answer`` the model is called too, so repeated questions are
+    served from the cache. Answers go through the pipeline's router, so cloud
+    models are costed and capped. A model whose first answer fails (not
+    pulled, backend down, cost cap reached) is not asked again, and that does
+    not hold coverage back.
+    """
+    state.total = len(questions) * max(1, len(models))
+    state.done = state.failed = state.answers_failed = 0
+    state.errors = []
+    state.running = True
+    state.started_at = time.time()
+    state.finished_at = None
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    no_answers = set()
+
+    async def one(question: str, model_name: str) -> None:
+        async with semaphore:
+            try:
+                prepared = await pipeline.prepare(question, model_name)
+            except Exception as e:
+                state.failed += 1
+                state.errors.append(f"{model_name}: {e}")
+                return
+            if answer and not prepared.fast_path and model_name not in no_answers:
+                try:
+                    await _answer(pipeline, prepared, model_name)
+                except Exception as e:
+                    no_answers.add(model_name)
+                    state.answers_failed += 1
+                    state.errors.append(f"{model_name}: answers skipped for the rest of warm-up ({e})")
+            state.done += 1
+            metrics.set_gauge("warmup_coverage", state.coverage)
+
+    try:
+        await asyncio.gather(*(one(q, m) for q in questions for m in models))
+    finally:
+        state.running = False
+        state.finished_at = time.time()
+        metrics.set_gauge("warmup_coverage", state.coverage)
+    print(f"Warm-up finished: {state.done}/{state.total} ({state.failed} failed) in {state.as_dict()['elapsed_s']}s")
+    return state
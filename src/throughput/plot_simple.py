@@ -99,10 +99,16 @@ def plot_models_line(df: pd.DataFrame, y: str, ylabel: str, title: str, subtitle
         print(f"⚠ Skipping models plot for '{y}' (column missing or empty)")
         return
 
+    # Embeddings runs sweep batch size too: one line per (model, batch size)
+    by_batch = "batch_size" in df.columns and df["batch_size"].notna().any()
+    keys = ["provider", "model", "batch_size"] if by_batch else ["provider", "model"]
+
     fig, ax = plt.subplots(figsize=(8, 4.5))
-    for (provider, model), grp in df.groupby(["provider", "model" ]):
+    for key, grp in df.groupby(keys):
         g = grp.sort_values("concurrency")
-        label = f"{provider}: {shorten_model_label(model)}"
+        label = f"{key[0]}: {shorten_model_label(key[1])}"
+        if by_batch:
+            label += f" (batch {int(key[2])})"
         ax.plot(g["concurrency"], g[y], marker="o", linestyle="-", label=label)
 
     ax.set_xscale("log", base=2)
@@ -182,6 +188,13 @@ def main(csv: Path, sysinfo: Path | None = None, outdir: Path | None = None, fmt
         ("latency_p95_s", "p95 latency (s)", "models_latency_p95_vs_concurrency"),
         ("tail_ratio", "p95 / mean latency", "models_tail_ratio_vs_concurrency"),
     ]
+    # Embeddings mode (runner.py --mode embeddings)
+    if "vectors_s" in df.columns:
+        series += [
+            ("vectors_s", "Vectors/s", "models_vectors_s_vs_concurrency"),
+            ("tps", "Tokens/s", "models_tps_vs_concurrency"),
+            ("model_mem_gb", "Model memory (GB)", "models_memory_vs_concurrency"),
+        ]
 
     for col, ylabel, fname in series:
         plot_models_line(
@@ -27,6 +27,16 @@ FIXED_SLM_MODELS: List[str] = [
     "hf.co/Qwen/Qwen2.5-3B-Instruct-GGUF:Q4_K_M",
 ]
 
+# Embedding models benchmarked in embeddings mode (same defaults as src/build_index.py)
+FIXED_EMBEDDING_MODELS: List[str] = [
+    "bge-m3",
+    "hf.co/Qwen/Qwen3-Embedding-0.6B-GGUF:Q8_0",
+    "yxchia/multilingual-e5-large-instruct",
+]
+
+# Extra CSV columns written only in embeddings mode
+EMBEDDING_COLUMNS: Tuple[str, ...] = ("batch_size", "vectors_s", "model_mem_gb", "model_vram_gb", "prompt_len")
+
 
 def _env(key: str, default: Optional[str] = None) -> Optional[str]:
     return os.getenv(key, default)
@@ -306,7 +316,120 @@ async def run_model_once(
     return latencies, tokens, responses, wall
 
 
-def summarize(latencies: List[float], tokens: List[int], successes: int, total_requests: int, total_wall: float) -> Dict[str, Any]:
+def load_handbook_chunks(data_dir: str, chunk_size: int = 1800) -> List[str]:
+    """Handbook chunks to embed, split the way the index builder splits them.
+
+    Falls back to paragraph packing up to ``chunk_size`` characters when
+    src/build_index.py (and its LangChain dependencies) cannot be imported.
+    """
+    try:
+        repo_root = str(Path(__file__).resolve().parents[2])
+        if repo_root not in sys.path:
+            sys.path.insert(0, repo_root)
+        from src.build_index import _iter_documents, _split_documents_header_aware  # type: ignore
+
+        chunks = [d.page_content for d in _split_documents_header_aware(_iter_documents(data_dir))]
+        if chunks:
+            return chunks
+    except Exception:
+        pass
+
+    chunks: List[str] = []
+    for path in sorted(Path(data_dir).rglob("*.md")):
+        current = ""
+        for para in path.read_text(encoding="utf-8").split("\n\n"):
+            if current and len(current) + len(para) > chunk_size:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{para}" if current else para
+        if current.strip():
+            chunks.append(current)
+    return chunks
+
+
+async def embed_batch(
+    client: httpx.AsyncClient,
+    base_url: str,
+    model: str,
+    texts: List[str],
+) -> Tuple[Optional[float], Optional[int]]:
+    url = f"{base_url.rstrip('/')}/api/embed"
+    t0 = time.perf_counter()
+    try:
+        r = await client.post(url, json={"model": model, "input": texts}, timeout=300)
+        latency = time.perf_counter() - t0
+        r.raise_for_status()
+        data = r.json()
+        if len(data.get("embeddings") or []) != len(texts):
+            return None, None
+        # Ollama reports prompt_eval_count for embeddings; estimate ~4 chars/token if absent
+        tokens = data.get("prompt_eval_count") or sum(len(t) for t in texts) // 4
+        return latency, int(tokens)
+    except Exception:
+        return None, None
+
+
+async def run_embeddings_once(
+    base_url: str,
+    model: str,
+    chunks: List[str],
+    batch_size: int,
+    requests_n: int,
+    concurrency: int,
+) -> Tuple[List[float], List[int], float]:
+    latencies: List[float] = []
+    tokens: List[int] = []
+    sem = asyncio.Semaphore(concurrency)
+
+    def batch_for(idx: int) -> List[str]:
+        # Walk through the corpus so concurrent requests carry different chunks
+        start = idx * batch_size
+        return [chunks[(start + j) % len(chunks)] for j in range(batch_size)]
+
+    async def worker(idx: int) -> None:
+        async with sem:
+            l, t = await embed_batch(client, base_url, model, batch_for(idx))
+            if l is not None:
+                latencies.append(l)
+                tokens.append(int(t or 0))
+
+    async with httpx.AsyncClient(timeout=None) as client:
+        # Warm-up single request (loads the model)
+        await embed_batch(client, base_url, model, batch_for(0))
+        tic = time.perf_counter()
+        tasks = [asyncio.create_task(worker(i)) for i in range(requests_n)]
+        await asyncio.gather(*tasks)
+        toc = time.perf_counter()
+
+    wall = toc - tic
+    return latencies, tokens, wall
+
+
+def ollama_model_memory(base_url: str, model: str) -> Tuple[Optional[float], Optional[float]]:
+    """Resident size and VRAM share (GB) of a loaded model, from Ollama's /api/ps."""
+    try:
+        r = httpx.get(f"{base_url.rstrip('/')}/api/ps", timeout=5)
+        r.raise_for_status()
+        for m in r.json().get("models", []):
+            if model in (m.get("name"), m.get("model")) or m.get("name") == f"{model}:latest":
+                size, vram = m.get("size"), m.get("size_vram")
+                return (
+                    round(size / (1024 ** 3), 3) if size is not None else None,
+                    round(vram / (1024 ** 3), 3) if vram is not None else None,
+                )
+    except Exception:
+        pass
+    return None, None
+
+
+def summarize(
+    latencies: List[float],
+    tokens: List[int],
+    successes: int,
+    total_requests: int,
+    total_wall: float,
+    ttfts: Optional[List[float]] = None,
+) -> Dict[str, Any]:
     row: Dict[str, Any] = {
         "n_requests": total_requests,
         "n_success": successes,
@@ -317,12 +440,20 @@ def summarize(latencies: List[float], tokens: List[int], successes: int, total_r
         "latency_p95_s": float(np.percentile(latencies, 95)) if latencies else 0.0,
         "errors": int(total_requests - successes),
     }
+    if ttfts:
+        row["ttft_p50_s"] = float(np.percentile(ttfts, 50))
+        row["ttft_p95_s"] = float(np.percentile(ttfts, 95))
     return row
 
 
 def create_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="SLM vs Cloud Throughput Orchestrator")
-    p.add_argument("--mode", choices=["llm", "rag"], default=_env("MODE", "rag"), help="Benchmark mode: direct LLM API or RAG /query")
+    p.add_argument(
+        "--mode",
+        choices=["llm", "rag", "embeddings"],
+        default=_env("MODE", "rag"),
+        help="Benchmark mode: direct LLM API, RAG /query, or Ollama /api/embed",
+    )
     p.add_argument("--ollama-base", default=_env("OLLAMA_BASE_URL", "http://localhost:11434"))
     p.add_argument("--litellm", default=_env("LITELLM_API_BASE", "http://localhost:4000"))
     p.add_argument("--cloud-model", default=_env("CLOUD_MODEL", "azure-gpt5,gemini-2.5-pro,claude-opus-4-1-20250805"))
@@ -339,6 +470,15 @@ def create_parser() -> argparse.ArgumentParser:
     # RAG API options
     p.add_argument("--rag-base", default=_env("RAG_API_BASE", "http://localhost:8001"), help="Base URL for RAG API (src/main.py)")
     p.add_argument("--rag-testset", default=_env("RAG_TESTSET", "data/testset/ucl-cs_single_hop_testset_gpt-4.1_20250906_111904.json"), help="JSON file with a list of objects containing 'user_input' fields")
+    p.add_argument("--rag-stream", action="store_true", help="Use streaming /query (NDJSON) and record time-to-first-token")
+    # Embeddings mode options
+    p.add_argument(
+        "--embed-models",
+        default=_env("EMBEDDING_MODELS", ",".join(FIXED_EMBEDDING_MODELS)),
+        help="Comma-separated Ollama embedding models (embeddings mode)",
+    )
+    p.add_argument("--embed-batch-sizes", default="1,8,32,64", help="Comma-separated chunks per /api/embed request")
+    p.add_argument("--embed-data-dir", default=_env("EMBED_DATA_DIR", "data/cs-handbook"), help="Markdown corpus providing the chunks to embed")
     p.add_argument("--concurrency", default="1,2,4,8,16", help="Comma-separated concurrencies")
     p.add_argument("--repetitions", type=int, default=1)
     p.add_argument("--requests", type=int, default=5, help="Requests per repetition per concurrency")
@@ -440,6 +580,8 @@ async def run() -> None:
             "latency_avg_s": float(summary.get("latency_avg_s", 0.0)),
             "latency_p50_s": float(summary.get("latency_p50_s", 0.0)),
             "latency_p95_s": float(summary.get("latency_p95_s", 0.0)),
+            "ttft_p50_s": summary.get("ttft_p50_s"),
+            "ttft_p95_s": summary.get("ttft_p95_s"),
             "temperature": float(args.temperature),
             "max_tokens": int(args.max_tokens),
             "prompt_len": len(prompt),
@@ -453,6 +595,7 @@ async def run() -> None:
             "lib_versions": sysinfo.get("lib_versions"),
             "commit_sha": sysinfo.get("commit_sha"),
         }
+        row.update({key: summary[key] for key in EMBEDDING_COLUMNS if key in summary})
         return row
 
     # Benchmark helper to run repetitions and summarize (direct LLM endpoints)
@@ -507,18 +650,35 @@ async def run() -> None:
         rag_base: str,
         model_name: str,
         question: str,
-    ) -> Tuple[Optional[float], Optional[int]]:
+    ) -> Tuple[Optional[float], Optional[int], Optional[float]]:
         url = f"{rag_base.rstrip('/')}/query"
-        payload = {"question": question, "model_name": model_name}
+        payload = {"question": question, "model_name": model_name, "stream": args.rag_stream}
         t0 = time.perf_counter()
         try:
-            r = await client.post(url, json=payload, timeout=120)
-            latency = time.perf_counter() - t0
-            r.raise_for_status()
-            # No token usage available from RAG API response
-            return latency, 0
+            if not args.rag_stream:
+                r = await client.post(url, json=payload, timeout=120)
+                latency = time.perf_counter() - t0
+                r.raise_for_status()
+                # No token usage available from the non-streaming RAG API response
+                return latency, 0, None
+
+            ttft: Optional[float] = None
+            tokens = 0
+            async with client.stream("POST", url, json=payload, timeout=120) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    if event.get("event") == "delta" and ttft is None:
+                        ttft = time.perf_counter() - t0
+                    elif event.get("event") == "final":
+                        tokens = int((event.get("usage") or {}).get("total_tokens") or 0)
+                    elif event.get("event") == "error":
+                        return None, None, None
+            return time.perf_counter() - t0, tokens, ttft
         except Exception:
-            return None, None
+            return None, None, None
 
     async def run_model_once_rag(
         rag_base: str,
@@ -526,18 +686,21 @@ async def run() -> None:
         questions: List[str],
         requests_n: int,
         concurrency: int,
-    ) -> Tuple[List[float], List[int], float]:
+    ) -> Tuple[List[float], List[int], List[float], float]:
         latencies: List[float] = []
         tokens: List[int] = []
+        ttfts: List[float] = []
         sem = asyncio.Semaphore(concurrency)
 
         async def worker(idx: int) -> None:
             async with sem:
                 q = questions[idx % len(questions)]
-                l, t = await rag_query(client, rag_base, model_full, q)
+                l, t, ttft = await rag_query(client, rag_base, model_full, q)
                 if l is not None:
                     latencies.append(l)
                     tokens.append(int(t or 0))
+                    if ttft is not None:
+                        ttfts.append(ttft)
 
         async with httpx.AsyncClient(http2=True, timeout=None) as client:  # type: ignore
             # Warm-up single request
@@ -548,18 +711,19 @@ async def run() -> None:
             toc = time.perf_counter()
 
         wall = toc - tic
-        return latencies, tokens, wall
+        return latencies, tokens, ttfts, wall
 
     async def benchmark_rag(provider: str, rag_base: str, model_full: str, concurrency: int, questions: List[str]) -> Dict[str, Any]:
         vprint(f"Starting (RAG): provider={provider} model={model_full} c={concurrency}")
         all_latencies: List[float] = []
         all_tokens: List[int] = []
+        all_ttfts: List[float] = []
         total_success = 0
         total_wall = 0.0
         total_attempts = args.requests * args.repetitions
         for rep in range(1, args.repetitions + 1):
             vprint(f"  Rep {rep}/{args.repetitions} ...")
-            lat, tok, wall = await run_model_once_rag(
+            lat, tok, ttft, wall = await run_model_once_rag(
                 rag_base,
                 model_full,
                 questions,
@@ -570,13 +734,42 @@ async def run() -> None:
             total_success += len(lat)
             all_latencies.extend(lat)
             all_tokens.extend(tok)
-        summary = summarize(all_latencies, all_tokens, total_success, total_attempts, total_wall)
+            all_ttfts.extend(ttft)
+        summary = summarize(all_latencies, all_tokens, total_success, total_attempts, total_wall, all_ttfts)
         vprint(
             f"  Done: success={summary['n_success']}/{summary['n_requests']} | rps={summary['rps']:.2f} | ",
             f"avg={summary['latency_avg_s']:.3f}s | p95={summary['latency_p95_s']:.3f}s",
         )
         return summary
 
+    # -------- Embeddings mode helper --------
+    async def benchmark_embeddings(model: str, batch_size: int, concurrency: int, chunks: List[str]) -> Dict[str, Any]:
+        vprint(f"Starting (embeddings): model={model} batch={batch_size} c={concurrency}")
+        all_latencies: List[float] = []
+        all_tokens: List[int] = []
+        total_success = 0
+        total_wall = 0.0
+        total_attempts = args.requests * args.repetitions
+        for rep in range(1, args.repetitions + 1):
+            vprint(f"  Rep {rep}/{args.repetitions} ...")
+            lat, tok, wall = await run_embeddings_once(args.ollama_base, model, chunks, batch_size, args.requests, concurrency)
+            total_wall += wall
+            total_success += len(lat)
+            all_latencies.extend(lat)
+            all_tokens.extend(tok)
+        # Latencies are per batch; rps counts batches and vectors_s the chunks inside them
+        summary = summarize(all_latencies, all_tokens, total_success, total_attempts, total_wall)
+        summary["batch_size"] = batch_size
+        summary["vectors_s"] = (total_success * batch_size / total_wall) if total_wall > 0 else 0.0
+        summary["model_mem_gb"], summary["model_vram_gb"] = ollama_model_memory(args.ollama_base, model)
+        summary["prompt_len"] = int(sum(len(c) for c in chunks) / len(chunks))
+        vprint(
+            f"  Done: success={summary['n_success']}/{summary['n_requests']} | vectors/s={summary['vectors_s']:.1f} | ",
+            f"tps={summary['tps']:.1f} | p50={summary['latency_p50_s']:.3f}s | p95={summary['latency_p95_s']:.3f}s | ",
+            f"mem={summary['model_mem_gb']}GB",
+        )
+        return summary
+
     # Determine cloud model list (supports both --cloud-models and legacy --cloud-model)
     cloud_models: List[str] = parse_model_list(getattr(args, "cloud_models", "")) or parse_model_list(getattr(args, "cloud_model", ""))
 
@@ -617,6 +810,21 @@ async def run() -> None:
                     summary = await benchmark_rag("cloud", args.rag_base, full_name, c, questions)
                     rows.append(record_row("cloud", args.rag_base, full_name, c, args.repetitions, questions[0], summary))
 
+    # Embeddings mode: sweep batch size x concurrency on Ollama /api/embed with handbook chunks
+    if args.mode == "embeddings":
+        chunks = load_handbook_chunks(args.embed_data_dir)
+        if not chunks:
+            raise SystemExit(f"No markdown chunks found under '{args.embed_data_dir}'")
+        batch_sizes = parse_concurrency_list(args.embed_batch_sizes)
+        vprint(f"Embedding {len(chunks)} handbook chunks | batch sizes: {batch_sizes}")
+        for model in parse_model_list(args.embed_models):
+            for batch_size in batch_sizes:
+                for c in conc_list:
+                    summary = await benchmark_embeddings(model, batch_size, c, chunks)
+                    rows.append(record_row("ollama", args.ollama_base, model, c, args.repetitions, "", summary))
+            vprint(f"Unloading Ollama model: {model} ...")
+            stop_ollama_model_safe(model, resolve_stop_mode(args), args.ollama_container)
+
     # Save CSV
     df = pd.DataFrame(rows)
     csv_path = run_dir / "benchmark-results.csv"
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Modules import as src.rag.*, as they do under uvicorn src.main:app from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessageChunk
+
+from src.rag.metrics import MetricsRegistry
+from src.rag.routing import HybridRouter, RoutingConfig
+
+
+LOCAL_MODEL = "ollama/phi3:mini"
+CLOUD_MODEL = "gpt-4o-mini"
+
+
+class FakeLLM:
+    """Streams ``chunks`` (strings become ``AIMessageChunk``s) after ``first_token_delay_s``."""
+
+    def __init__(self, chunks, first_token_delay_s=0.0):
+        self.chunks = [chunks] if isinstance(chunks, str) else chunks
+        self.first_token_delay_s = first_token_delay_s
+
+    async def astream(self, prompt):
+        await asyncio.sleep(self.first_token_delay_s)
+        for chunk in self.chunks:
+            yield chunk if isinstance(chunk, AIMessageChunk) else AIMessageChunk(content=chunk)
+
+    async def ainvoke(self, prompt):
+        message = AIMessageChunk(content="")
+        async for chunk in self.astream(prompt):
+            message += chunk
+        return message
+
+
+class FakeFactory:
+    """``LLMFactory`` stand-in serving one LLM for every model, or one per model from a dict."""
+
+    def __init__(self, llms):
+        self.llms = llms
+
+    def for_prompt(self, model_name, prompt, base_url=None):
+        return self.llms[model_name] if isinstance(self.llms, dict) else self.llms
+
+
+def _make_router(cost_cap_usd=1.0) -> HybridRouter:
+    config = RoutingConfig(
+        local_model=LOCAL_MODEL,
+        cloud_model=CLOUD_MODEL,
+        slo_p95_s=8.0,
+        local_parallel_slots=1,
+        local_max_queue=4,
+        cloud_max_inflight=4,
+        cloud_daily_cost_cap_usd=cost_cap_usd,
+        cloud_price_per_1k_input=0.15,
+        cloud_price_per_1k_output=0.6,
+    )
+    return HybridRouter(config, MetricsRegistry())
+
+
+@pytest.fixture
+def fake_llm():
+    return FakeLLM
+
+
+@pytest.fixture
+def fake_factory():
+    return FakeFactory
+
+
+@pytest.fixture
+def make_router():
+    return _make_router
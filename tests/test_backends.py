@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.rag.backends import OllamaPool
+from src.rag.metrics import MetricsRegistry
+
+
+class ResponseError(Exception):
+    """Shaped like ``ollama.ResponseError``: carries the HTTP status as ``status_code``."""
+
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def _pool(urls=("http://a:11434",), **kwargs) -> OllamaPool:
+    return OllamaPool(list(urls), client=None, registry=MetricsRegistry(), **kwargs)
+
+
+def _fail_in_lease(pool, exc):
+    async def run():
+        async with pool.lease("ollama/phi3:mini"):
+            raise exc
+
+    with pytest.raises(type(exc)):
+        asyncio.run(run())
+
+
+def _status_error(status):
+    request = httpx.Request("POST", "http://a:11434/api/chat")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+
+@pytest.mark.parametrize("exc", [httpx.ConnectError("refused"), ConnectionError("refused"), _status_error(503), ResponseError(500)])
+def test_replica_failures_count_towards_ejection(exc):
+    pool = _pool()
+    _fail_in_lease(pool, exc)
+    assert pool.replicas[0].consecutive_failures == 1
+    assert pool.replicas[0].outstanding == 0
+
+
+@pytest.mark.parametrize("exc", [_status_error(404), ResponseError(404), ValueError("bad prompt")])
+def test_caller_errors_do_not_count_against_the_replica(exc):
+    pool = _pool(eject_failures=1)
+    _fail_in_lease(pool, exc)
+    replica = pool.replicas[0]
+    assert replica.consecutive_failures == 0
+    assert replica.ejected_until == 0.0
+    assert replica.outstanding == 0
+
+
+URLS = ("http://a:11434", "http://b:11434", "http://c:11434")
+
+
+def test_pick_prefers_replica_with_the_model_resident():
+    pool = _pool(URLS)
+    a, b, c = pool.replicas
+    b.resident_models = {"phi3:mini"}
+    a.outstanding = 0
+    b.outstanding = 1
+
+    assert pool.pick("ollama/phi3:mini") is b
+    assert b.outstanding == 2
+
+
+def test_pick_overflows_busy_resident_replica_to_least_loaded():
+    pool = _pool(URLS, affinity_max_extra=2)
+    a, b, c = pool.replicas
+    b.resident_models = {"phi3:mini"}
+    b.outstanding = 3
+
+    picked = pool.pick("ollama/phi3:mini")
+    assert picked is not b and picked.outstanding == 1
+
+
+def test_pick_spreads_ties_and_honours_exclude():
+    pool = _pool(URLS)
+    picked = [pool.pick().url for _ in range(3)]
+    assert sorted(picked) == sorted(URLS)
+    assert pool.pick(exclude={"http://a:11434", "http://b:11434"}).url == "http://c:11434"
+
+
+def test_repeated_failures_eject_a_replica_until_the_timeout():
+    pool = _pool(URLS, eject_failures=2, eject_s=30.0)
+    a = pool.replicas[0]
+    pool.record_failure(a, "request_error")
+    assert not a.ejected(time.monotonic())
+    pool.record_failure(a, "request_error")
+    assert a.ejected(time.monotonic())
+    assert all(pool.pick().url != a.url for _ in range(6))
+
+    a.ejected_until = time.monotonic() - 1
+    assert a.url in {pool.pick().url for _ in range(6)}
+
+
+def test_success_resets_the_failure_count():
+    pool = _pool(URLS, eject_failures=2)
+    a = pool.replicas[0]
+    pool.record_failure(a, "request_error")
+    pool.record_success(a)
+    pool.record_failure(a, "request_error")
+    assert not a.ejected(time.monotonic())
+
+
+def test_slow_replica_is_ejected_and_all_down_falls_back_to_every_replica():
+    pool = _pool(URLS, slow_factor=3.0)
+    a, b, c = pool.replicas
+    a.probe_latency_s, b.probe_latency_s, c.probe_latency_s = 0.1, 0.1, 1.0
+    pool._eject_slow()
+    assert c.ejected(time.monotonic()) and not a.ejected(time.monotonic())
+
+    for replica in pool.replicas:
+        replica.healthy = False
+    assert pool.pick().url in URLS
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import pytest
+
+from src.rag.cancellation import (
+    ClientDisconnected,
+    Deadline,
+    DeadlineExceeded,
+    guarded_stream,
+    run_guarded,
+)
+
+
+class FakeRequest:
+    def __init__(self, disconnect_after_polls=None):
+        self.polls = 0
+        self.disconnect_after_polls = disconnect_after_polls
+
+    async def is_disconnected(self):
+        self.polls += 1
+        return self.disconnect_after_polls is not None and self.polls >= self.disconnect_after_polls
+
+
+class Upstream:
+    """Async generator stand-in that records whether it was closed."""
+
+    def __init__(self, items, delay_s=0.0):
+        self.items = items
+        self.delay_s = delay_s
+        self.closed = False
+
+    async def stream(self):
+        try:
+            for item in self.items:
+                await asyncio.sleep(self.delay_s)
+                yield item
+        finally:
+            self.closed = True
+
+
+@pytest.mark.parametrize("header, expected_s", [(None, 30.0), ("5", 5.0), ("abc", 30.0), ("-3", 0.0), ("900", 120.0)])
+def test_deadline_from_header_uses_default_and_clamps(header, expected_s):
+    deadline = Deadline.from_header(header, default_s=30.0, max_s=120.0)
+    assert deadline.remaining() == pytest.approx(expected_s, abs=0.5)
+    assert deadline.expired == (expected_s == 0.0)
+
+
+def test_guarded_stream_relays_every_item_within_the_deadline():
+    upstream = Upstream(["a", "b", "c"])
+
+    async def run():
+        return [item async for item in guarded_stream(upstream.stream(), Deadline(time.monotonic() + 5), "test")]
+
+    assert asyncio.run(run()) == ["a", "b", "c"]
+    assert upstream.closed
+
+
+def test_guarded_stream_closes_upstream_at_the_deadline():
+    upstream = Upstream(["a", "b", "c"], delay_s=0.2)
+    received = []
+
+    async def run():
+        async for item in guarded_stream(upstream.stream(), Deadline(time.monotonic() + 0.3), "test"):
+            received.append(item)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert received == ["a"]
+    assert upstream.closed
+
+
+def test_guarded_stream_closes_upstream_when_the_consumer_goes_away():
+    upstream = Upstream(["a", "b", "c"])
+
+    async def run():
+        stream = guarded_stream(upstream.stream(), Deadline(time.monotonic() + 5), "test")
+        assert await anext(stream) == "a"
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert upstream.closed
+
+
+def test_run_guarded_cancels_work_on_deadline_and_disconnect():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run(request, deadline):
+        await run_guarded(request, slow(), deadline, "test", poll_interval_s=0.01)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run(FakeRequest(), Deadline(time.monotonic() + 0.05)))
+    with pytest.raises(ClientDisconnected):
+        asyncio.run(run(FakeRequest(disconnect_after_polls=2), Deadline(time.monotonic() + 5)))
+    assert cancelled == [True, True]
+
+
+def test_run_guarded_returns_the_result():
+    async def quick():
+        return 42
+
+    assert asyncio.run(run_guarded(FakeRequest(), quick(), Deadline(time.monotonic() + 5), "test")) == 42
@@ -0,0 +1,41 @@
+import pytest
+from langchain_core.documents import Document
+
+from src.build_index import _write_chunk_store
+from src.rag.chunk_store import ChunkStore, ChunkStoreDocstore, ReadOnlyDocstoreError
+
+
+def _docstore(tmp_path) -> ChunkStoreDocstore:
+    records = [("a", Document(page_content="alpha", metadata={"source": "a.md"})), ("b", Document(page_content="beta"))]
+    path, _ = _write_chunk_store(records, str(tmp_path))
+    return ChunkStoreDocstore(ChunkStore(path))
+
+
+def test_docstore_reads_records_by_id(tmp_path):
+    docstore = _docstore(tmp_path)
+    doc = docstore.search("a")
+    assert doc.page_content == "alpha" and doc.metadata == {"source": "a.md"}
+    assert docstore.search("missing") == "ID missing not found."
+
+
+def test_docstore_rejects_writes(tmp_path):
+    docstore = _docstore(tmp_path)
+    with pytest.raises(ReadOnlyDocstoreError, match="read-only"):
+        docstore.add({"c": Document(page_content="gamma")})
+    with pytest.raises(ReadOnlyDocstoreError, match="read-only"):
+        docstore.delete(["a"])
+    assert docstore.search("a").page_content == "alpha"
+
+
+def test_existing_store_is_reused_without_reading_records(tmp_path):
+    records = [("a", Document(page_content="alpha")), ("b", Document(page_content="beta"))]
+    path, created = _write_chunk_store(records, str(tmp_path))
+    assert created
+
+    def unread():
+        raise AssertionError("records were read although the store exists")
+        yield
+
+    reused, created = _write_chunk_store(unread(), str(tmp_path), ids=["b", "a", "a"])
+    assert (reused, created) == (path, False)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [path.rsplit("/", 1)[-1]]
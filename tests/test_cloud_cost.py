@@ -0,0 +1,50 @@
+import asyncio
+
+from langchain_core.messages import AIMessageChunk
+
+from src.rag.llm import LLMFactory
+from src.rag.pipeline import Generation, PreparedQuery, RagPipeline
+from src.rag.routing import RouteDecision
+
+
+CLOUD_MODEL = "gpt-4o-mini"
+
+
+def _stream_through_router(router, factory):
+    pipeline = RagPipeline(None, None, None, factory, 4, {}, 2500, 6000)
+    prepared = PreparedQuery(question="q", model_name=CLOUD_MODEL, packed=None, prompt="Context about deadlines. " * 40)
+    decision = RouteDecision(CLOUD_MODEL, CLOUD_MODEL, "cloud", "explicit")
+
+    async def run() -> Generation:
+        generation = Generation(text="")
+        async with router.track(decision) as route:
+            async for _ in pipeline.stream(prepared, generation):
+                pass
+            route.record_usage(generation.prompt_tokens, generation.completion_tokens)
+        return generation
+
+    return asyncio.run(run())
+
+
+def test_streamed_cloud_call_with_usage_is_charged(make_router, fake_llm, fake_factory):
+    chunks = [
+        AIMessageChunk(content="Coursework is "),
+        AIMessageChunk(content="due on Friday."),
+        AIMessageChunk(content="", usage_metadata={"input_tokens": 1000, "output_tokens": 200, "total_tokens": 1200}),
+    ]
+    router = make_router()
+    generation = _stream_through_router(router, fake_factory(fake_llm(chunks)))
+    assert (generation.prompt_tokens, generation.completion_tokens) == (1000, 200)
+    assert router.cloud_cost_today() == (1000 * 0.15 + 200 * 0.6) / 1000
+
+
+def test_streamed_cloud_call_without_usage_is_estimated(make_router, fake_llm, fake_factory):
+    router = make_router()
+    generation = _stream_through_router(router, fake_factory(fake_llm("Coursework is due on Friday.")))
+    assert generation.prompt_tokens > 0 and generation.completion_tokens > 0
+    assert router.cloud_cost_today() > 0
+
+
+def test_cloud_client_requests_stream_usage():
+    factory = LLMFactory("http://localhost:11434", "http://localhost:4000", [2048], 512)
+    assert factory.for_prompt(CLOUD_MODEL, "hello").stream_usage is True
@@ -0,0 +1,63 @@
+from src.rag.context_packing import (
+    ScoredChunk,
+    pack_context,
+    parse_budget_overrides,
+    resolve_context_budget,
+)
+from src.rag.tokens import count_tokens
+
+
+LOCAL_MODEL = "ollama/phi3:mini"
+
+
+def _words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_chunks_are_packed_closest_first_and_exact_duplicates_dropped():
+    far = ScoredChunk(_words("far", 20), {"source": "a.md"}, distance=0.9)
+    near = ScoredChunk(_words("near", 20), {"source": "b.md"}, distance=0.1)
+    packed = pack_context([far, near, ScoredChunk(near.text, {"source": "c.md"}, distance=0.2)], 10_000, LOCAL_MODEL)
+
+    assert [c.text for c in packed.chunks] == [near.text, far.text]
+    assert packed.overlap_chars_removed == len(near.text)
+    assert packed.text == near.text + "\n\n" + far.text
+
+
+def test_splitter_overlap_between_neighbours_of_one_source_is_trimmed():
+    shared = _words("shared", 12)
+    first = ScoredChunk(_words("intro", 15) + " " + shared, {"source": "a.md"}, distance=0.1)
+    second = ScoredChunk(shared + " " + _words("rest", 15), {"source": "a.md"}, distance=0.2)
+    packed = pack_context([first, second], 10_000, LOCAL_MODEL)
+
+    assert packed.chunks[1].text == _words("rest", 15)
+    assert packed.overlap_chars_removed == len(shared) + 1
+    assert packed.tokens_saved > 0
+
+
+def test_packing_stops_at_the_budget_and_reports_dropped_chunks():
+    chunks = [ScoredChunk(_words(f"c{i}x", 40), {"source": f"{i}.md"}, distance=i) for i in range(4)]
+    budget = count_tokens(chunks[0].text, LOCAL_MODEL) * 2 + 5
+    packed = pack_context(chunks, budget, LOCAL_MODEL)
+
+    assert len(packed.chunks) == 2
+    assert [c.distance for c in packed.dropped] == [2, 3]
+    assert packed.context_tokens <= budget
+    assert packed.stats()["chunks_retrieved"] == 4
+
+
+def test_closest_chunk_is_truncated_rather_than_dropped():
+    chunk = ScoredChunk(_words("long", 400), {"source": "a.md"})
+    packed = pack_context([chunk], 50, LOCAL_MODEL)
+
+    assert len(packed.chunks) == 1
+    assert chunk.text.startswith(packed.text) and packed.text
+    assert packed.context_tokens <= 50
+
+
+def test_budget_resolution_prefers_per_model_overrides():
+    overrides = parse_budget_overrides("ollama/phi3:mini=1800, azure-gpt5=8000,broken,bad=x")
+    assert overrides == {"ollama/phi3:mini": 1800, "azure-gpt5": 8000}
+    assert resolve_context_budget("ollama/phi3:mini", overrides, 2500, 6000) == 1800
+    assert resolve_context_budget("ollama/qwen3:4b", overrides, 2500, 6000) == 2500
+    assert resolve_context_budget("gpt-4o-mini", overrides, 2500, 6000) == 6000
@@ -0,0 +1,52 @@
+import numpy as np
+
+from src.rag.context_packing import ScoredChunk
+from src.rag.faq import FaqEntry, FaqIndex, is_usable_answer, save_faq
+
+
+ENTRIES = [
+    FaqEntry("When is reading week?", "Week 6 of each term.", sources=["Key dates"]),
+    FaqEntry("How do I contact my tutor?", "Email them via Moodle.", sources=["Tutorials"]),
+]
+VECTORS = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], dtype="float32")
+
+
+def _index(**kwargs) -> FaqIndex:
+    return FaqIndex(ENTRIES, VECTORS, "bge-m3", **kwargs)
+
+
+def _chunks(section, distance=0.2):
+    return [ScoredChunk("text", {"section": section}, distance=distance)]
+
+
+def test_close_paraphrase_grounded_in_the_same_section_matches():
+    match = _index().match([0.99, 0.05, 0.0], _chunks("Key dates"))
+    assert match is not None and match.entry is ENTRIES[0]
+    assert match.similarity > 0.99
+    assert match.as_dict()["source"] == "Key dates"
+
+
+def test_match_requires_retrieval_to_agree_with_the_curated_sources():
+    assert _index().match([1.0, 0.0, 0.0], _chunks("Tutorials")) is None
+
+
+def test_match_rejects_low_similarity_far_chunks_and_other_dimensions():
+    assert _index().match([0.7, 0.7, 0.1], _chunks("Key dates")) is None
+    assert _index(max_distance=0.5).match([1.0, 0.0, 0.0], _chunks("Key dates", distance=0.8)) is None
+    assert _index().match([1.0, 0.0], _chunks("Key dates")) is None
+    assert _index().match([1.0, 0.0, 0.0], []) is None
+
+
+def test_saved_index_round_trips(tmp_path):
+    path = str(tmp_path / "faq" / "faq.json")
+    save_faq(path, ENTRIES, VECTORS.tolist(), "bge-m3")
+    loaded = FaqIndex.load(path, min_similarity=0.9)
+
+    assert len(loaded) == 2 and loaded.embedding_model == "bge-m3"
+    assert loaded.match([0.0, 1.0, 0.0], _chunks("Tutorials")).entry.answer == "Email them via Moodle."
+
+
+def test_non_answers_are_not_usable():
+    assert is_usable_answer("Week 6 of each term.")
+    assert not is_usable_answer("The context does not mention reading week.")
+    assert not is_usable_answer("   ")
@@ -0,0 +1,63 @@
+import faiss
+import numpy as np
+import pytest
+
+from src.rag.filters import FiltersUnavailable, RetrievalFilters, index_filters, load_filter_index, save_filter_lists
+
+
+METADATAS = [
+    {"source": "data/cs-handbook/04_key-dates.md", "section": "Key Dates > Term dates", "version": "2024"},
+    {"source": "data/cs-handbook/04_key-dates.md", "section": "Key Dates > Reading week", "version": "2025"},
+    {"source": "data/cs-handbook/09_tutorials.md", "section": "Tutorials", "version": "2025"},
+    {
+        "source": "data/cs-handbook/13_assessment.md",
+        "section": "Assessment",
+        "version": "2025",
+        # A near-duplicate folded from the key-dates file is listed under it too
+        "aliases": [{"source": "data/cs-handbook/04_key-dates.md", "section": "Key Dates > Exams"}],
+    },
+]
+
+
+@pytest.fixture
+def filter_index(tmp_path):
+    counts = save_filter_lists(str(tmp_path), METADATAS)
+    assert counts == {"source": 3, "section": 5, "version": 2}
+    return load_filter_index(str(tmp_path), len(METADATAS))
+
+
+def _search(selection, k=4):
+    index = faiss.IndexFlatL2(2)
+    index.add(np.arange(len(METADATAS) * 2, dtype=np.float32).reshape(-1, 2))
+    _, ids = index.search(np.zeros((1, 2), dtype=np.float32), k, params=faiss.SearchParameters(sel=selection.selector))
+    return sorted(int(i) for i in ids[0] if i >= 0)
+
+
+def test_section_prefix_matches_every_subsection_case_insensitively(filter_index):
+    selection = filter_index.select(RetrievalFilters(section_prefix="key  dates"))
+    assert selection.count == 3
+    assert _search(selection) == [0, 1, 3]
+
+
+def test_sources_combine_with_or_and_fields_with_and(filter_index):
+    sources = RetrievalFilters(sources=("04_key-dates.md", "09_tutorials"))
+    assert _search(filter_index.select(sources)) == [0, 1, 2, 3]
+    scoped = RetrievalFilters(sources=("04_key-dates",), version="2025")
+    assert _search(filter_index.select(scoped)) == [1, 3]
+
+
+def test_unmatched_filter_selects_nothing_and_selections_are_cached(filter_index):
+    selection = filter_index.select(RetrievalFilters(version="1999"))
+    assert selection.count == 0 and _search(selection) == []
+    assert filter_index.select(RetrievalFilters(version="1999")) is selection
+    assert filter_index.values("version") == ["2024", "2025"]
+
+
+def test_index_without_filter_lists_raises(tmp_path):
+    assert load_filter_index(str(tmp_path), 4) is None
+
+    class Store:
+        filter_index = None
+
+    with pytest.raises(FiltersUnavailable):
+        index_filters(Store())
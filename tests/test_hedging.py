@@ -0,0 +1,51 @@
+import asyncio
+
+from src.rag.hedging import HedgeConfig, HedgePolicy
+from src.rag.metrics import MetricsRegistry
+from src.rag.pipeline import Generation, PreparedQuery, RagPipeline
+
+
+LOCAL_MODEL = "ollama/phi3:mini"
+CLOUD_MODEL = "gpt-4o-mini"
+
+
+def _hedged_stream(router, fake_llm, fake_factory):
+    registry = MetricsRegistry()
+    hedger = HedgePolicy(HedgeConfig(enabled=True, default_delay_s=0.05, fallback_models={LOCAL_MODEL: CLOUD_MODEL}), registry)
+    llms = {LOCAL_MODEL: fake_llm("slow local answer", first_token_delay_s=1.0), CLOUD_MODEL: fake_llm("fast cloud answer")}
+    pipeline = RagPipeline(None, None, None, fake_factory(llms), 4, {}, 2500, 6000, hedger=hedger, router=router)
+    prepared = PreparedQuery(question="q", model_name=LOCAL_MODEL, packed=None, prompt="Context about deadlines. " * 40)
+
+    async def run() -> Generation:
+        generation = Generation(text="")
+        async for _ in pipeline.stream(prepared, generation):
+            pass
+        return generation
+
+    return asyncio.run(run()), prepared
+
+
+def test_cloud_models_are_not_hedged_without_a_fallback():
+    policy = HedgePolicy(HedgeConfig(enabled=True), MetricsRegistry())
+    assert policy.target_for(CLOUD_MODEL) is None
+    policy = HedgePolicy(HedgeConfig(enabled=True, fallback_models={CLOUD_MODEL: "gpt-4o"}), MetricsRegistry())
+    assert policy.target_for(CLOUD_MODEL) == "gpt-4o"
+
+
+def test_cloud_hedge_is_costed_and_released(make_router, fake_llm, fake_factory):
+    router = make_router()
+    generation, prepared = _hedged_stream(router, fake_llm, fake_factory)
+    assert prepared.hedge["winner"] == "hedge"
+    assert generation.text == "fast cloud answer"
+    assert router.cloud_cost_today() > 0
+    assert router.tier_inflight("cloud") == 0
+
+
+def test_cloud_hedge_respects_cost_cap(make_router, fake_llm, fake_factory):
+    router = make_router(cost_cap_usd=0.001)
+    # Exhaust today's budget with an earlier cloud request
+    router._roll_cost_day()
+    router._cost_today_usd = 0.01
+    generation, prepared = _hedged_stream(router, fake_llm, fake_factory)
+    assert not prepared.hedge
+    assert generation.text == "slow local answer"
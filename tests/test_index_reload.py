@@ -0,0 +1,44 @@
+import asyncio
+
+from src.rag.index_reload import IndexSlot
+
+
+def test_swap_publishes_new_index_while_existing_readers_keep_the_old_one():
+    slot = IndexSlot("old-store", "v1")
+    with slot.acquire() as reading:
+        old = slot.swap("new-store", "v2")
+        assert reading is old and reading.vectorstore == "old-store"
+        with slot.acquire() as fresh:
+            assert (fresh.version, fresh.vectorstore) == ("v2", "new-store")
+        assert slot.status()["retired_inflight"] == [1]
+    assert old.inflight == 0
+
+
+def test_drain_waits_for_in_flight_readers_then_releases_the_old_index():
+    slot = IndexSlot("old-store", "v1")
+
+    async def run():
+        with slot.acquire():
+            old = slot.swap("new-store", "v2")
+            drain = asyncio.create_task(slot.drain(old, timeout_s=5, poll_s=0.01))
+            await asyncio.sleep(0.05)
+            assert not drain.done() and old.vectorstore == "old-store"
+        return old, await drain
+
+    old, drained = asyncio.run(run())
+    assert drained is True
+    assert old.vectorstore is None
+    assert slot.status()["retired_inflight"] == []
+    assert slot.current.version == "v2"
+
+
+def test_drain_gives_up_after_the_timeout():
+    slot = IndexSlot("old-store", "v1")
+
+    async def run():
+        with slot.acquire():
+            old = slot.swap("new-store", "v2")
+            return await slot.drain(old, timeout_s=0.05, poll_s=0.01)
+
+    assert asyncio.run(run()) is False
+    assert slot.status()["retired_inflight"] == []
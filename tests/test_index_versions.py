@@ -0,0 +1,69 @@
+import json
+import os
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from src.build_index import _publish_index, _register_chunk_store_ref, _versions_dir, _write_chunk_store
+
+
+def _stage_version(target_index_dir, store_root, version, texts):
+    """Stage a tiny chunk-store index the way ``_save_with_chunk_store`` lays it out."""
+    staging_dir = os.path.join(_versions_dir(target_index_dir), version + ".tmp")
+    os.makedirs(staging_dir)
+    ids = [f"{version}-{i}" for i in range(len(texts))]
+    store, _ = _write_chunk_store(
+        ((chunk_id, Document(page_content=text, metadata={"source": "a.md"})) for chunk_id, text in zip(ids, texts)),
+        store_root,
+    )
+    index = faiss.IndexFlatL2(4)
+    index.add(np.random.default_rng(0).random((len(texts), 4), dtype=np.float32))
+    faiss.write_index(index, os.path.join(staging_dir, "index.faiss"))
+    with open(os.path.join(staging_dir, "chunk_refs.json"), "w", encoding="utf-8") as f:
+        json.dump({"store": os.path.relpath(store, staging_dir), "ids": ids}, f)
+    _register_chunk_store_ref(staging_dir)
+    return staging_dir, store
+
+
+def _publish(target_index_dir, staging_dir, version, created_at, vectors):
+    manifest = {"version": version, "created_at": created_at, "vectors": vectors, "dimension": 4}
+    return _publish_index(staging_dir, target_index_dir, manifest, keep=1)
+
+
+def test_prune_collects_chunk_stores_of_removed_versions(tmp_path):
+    target = str(tmp_path / "faiss_index")
+    store_root = str(tmp_path / "chunk_store")
+    os.makedirs(_versions_dir(target))
+
+    staging, first_store = _stage_version(target, store_root, "v1", ["one", "two"])
+    first = _publish(target, staging, "v1", 1.0, 2)
+    staging, second_store = _stage_version(target, store_root, "v2", ["three", "four", "five"])
+    second = _publish(target, staging, "v2", 2.0, 3)
+
+    assert first_store != second_store
+    assert not os.path.exists(first)
+    assert not os.path.exists(first_store)
+    assert os.path.realpath(target) == os.path.realpath(second)
+    assert os.path.exists(os.path.join(second_store, "store.json"))
+
+
+def test_prune_keeps_chunk_store_shared_with_another_index(tmp_path):
+    target = str(tmp_path / "faiss_index")
+    other = str(tmp_path / "other_model" / "faiss_index")
+    store_root = str(tmp_path / "chunk_store")
+    os.makedirs(_versions_dir(target))
+    os.makedirs(_versions_dir(other))
+
+    # Another model's index built from the same chunks reuses the store
+    staging, shared_store = _stage_version(target, store_root, "v1", ["one", "two"])
+    _publish(target, staging, "v1", 1.0, 2)
+    staging, other_store = _stage_version(other, store_root, "v1", ["one", "two"])
+    _publish(other, staging, "v1", 1.0, 2)
+    assert other_store == shared_store
+
+    staging, _ = _stage_version(target, store_root, "v2", ["three"])
+    _publish(target, staging, "v2", 2.0, 1)
+
+    assert os.path.exists(os.path.join(shared_store, "store.json"))
+    assert len(os.listdir(os.path.join(shared_store, "refs"))) == 1
@@ -0,0 +1,37 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from src.build_index import _NearDuplicateFilter
+
+
+PRIME = (1 << 61) - 1
+
+
+def test_permutation_matches_exact_integer_arithmetic():
+    dedup = _NearDuplicateFilter(0.9)
+    x = np.concatenate([
+        np.random.default_rng(0).integers(0, 1 << 32, size=100, dtype=np.uint64),
+        np.array([0, (1 << 32) - 1], dtype=np.uint64),
+    ])
+    a = np.concatenate([dedup._a, np.array([PRIME - 1, 1], dtype=np.uint64)])
+    b = np.concatenate([dedup._b, np.array([PRIME - 1, 0], dtype=np.uint64)])
+
+    permuted = _NearDuplicateFilter._permute(x[:, None], a, b)
+
+    expected = [[(int(ai) * int(xi) + int(bi)) % PRIME for ai, bi in zip(a, b)] for xi in x]
+    assert permuted.tolist() == expected
+
+
+def test_near_duplicates_are_folded_and_distinct_chunks_kept():
+    text = " ".join(f"word{i}" for i in range(200))
+    chunks = [
+        Document(page_content=text, metadata={"source": "a.md", "section": "Intro"}),
+        Document(page_content=text + " extra", metadata={"source": "b.md", "section": "Intro"}),
+        Document(page_content=" ".join(f"other{i}" for i in range(200)), metadata={"source": "c.md"}),
+    ]
+    dedup = _NearDuplicateFilter(0.9)
+
+    kept = [chunk for chunk, _ in dedup.filter((chunk, None) for chunk in chunks)]
+
+    assert [c.metadata["source"] for c in kept] == ["a.md", "c.md"]
+    assert dedup.aliases == {0: [{"source": "b.md", "section": "Intro"}]}
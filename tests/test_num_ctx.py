@@ -0,0 +1,29 @@
+import pytest
+
+from src.rag.llm import LLMFactory
+from src.rag.num_ctx import DEFAULT_NUM_CTX_BUCKETS, choose_num_ctx, parse_num_ctx_buckets
+
+
+BUCKETS = [2048, 4096, 8192]
+
+
+@pytest.mark.parametrize(
+    "prompt_tokens, expected",
+    [(0, 2048), (1280, 2048), (1281, 4096), (3328, 4096), (3329, 8192), (50_000, 8192)],
+)
+def test_smallest_bucket_fitting_prompt_and_output_reserve(prompt_tokens, expected):
+    assert choose_num_ctx(prompt_tokens, 768, BUCKETS) == expected
+
+
+def test_bucket_list_is_parsed_sorted_and_falls_back_to_defaults():
+    assert parse_num_ctx_buckets("8192, 2048,4096,2048") == [2048, 4096, 8192]
+    assert parse_num_ctx_buckets("") == DEFAULT_NUM_CTX_BUCKETS
+    assert parse_num_ctx_buckets("4k,8k") == DEFAULT_NUM_CTX_BUCKETS
+
+
+def test_ollama_clients_are_sized_per_prompt_and_reused_per_bucket():
+    factory = LLMFactory("http://localhost:11434", "http://localhost:4000", BUCKETS, 768)
+    short = factory.for_prompt("ollama/phi3:mini", "Short question.")
+    assert short.num_ctx == 2048
+    assert factory.for_prompt("ollama/phi3:mini", "Another short one.") is short
+    assert factory.for_prompt("ollama/phi3:mini", "word " * 5000).num_ctx == 8192
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from src.rag.reduction import Projection, ProjectedEmbeddings, load_projection
+
+
+def _corpus(n=400, d=16, rank=3, seed=0):
+    rng = np.random.default_rng(seed)
+    # Most variance in a few directions, plus noise, around a non-zero mean
+    return (rng.normal(size=(n, rank)) @ rng.normal(size=(rank, d)) * 5 + rng.normal(size=(n, d)) * 0.1 + 3).astype(np.float32)
+
+
+def test_truncate_keeps_leading_coordinates_and_renormalises():
+    projection = Projection.fit("truncate", _corpus(), 4)
+    vector = np.arange(1, 17, dtype=np.float32)
+    reduced = projection.apply(vector)
+
+    assert reduced.shape == (1, 4)
+    np.testing.assert_allclose(reduced[0], vector[:4] / np.linalg.norm(vector[:4]), rtol=1e-6)
+    assert projection.save("/nonexistent") == {"method": "truncate", "dim": 4, "source_dim": 16}
+
+
+def test_pca_captures_low_rank_structure_and_round_trips_through_disk(tmp_path):
+    corpus = _corpus()
+    projection = Projection.fit("pca", corpus, 3)
+    assert projection.explained_variance > 0.99
+
+    entry = projection.save(str(tmp_path))
+    loaded = load_projection(str(tmp_path), {"reduction": entry})
+    np.testing.assert_allclose(loaded.apply(corpus), projection.apply(corpus), rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(np.linalg.norm(loaded.apply(corpus), axis=1), 1.0, rtol=1e-5)
+
+
+def test_pca_preserves_neighbours_in_the_reduced_space():
+    corpus = _corpus()
+    projection = Projection.fit("pca", corpus, 3)
+    full = corpus - corpus.mean(axis=0)
+    full /= np.linalg.norm(full, axis=1, keepdims=True)
+    reduced = projection.apply(corpus)
+
+    query = 7
+    assert np.argsort(-(full @ full[query]))[1] == np.argsort(-(reduced @ reduced[query]))[1]
+
+
+def test_projected_embeddings_reduce_queries_and_documents():
+    class Inner:
+        def embed_documents(self, texts):
+            return [[float(i + 1)] * 16 for i in range(len(texts))]
+
+        def embed_query(self, text):
+            return [1.0] * 16
+
+    embeddings = ProjectedEmbeddings(Inner(), Projection("truncate", 4, 16))
+    assert len(embeddings.embed_query("q")) == 4
+    assert np.array(embeddings.embed_documents(["a", "b"])).shape == (2, 4)
+
+
+def test_invalid_projections_are_rejected():
+    with pytest.raises(ValueError):
+        Projection("svd", 4, 16)
+    with pytest.raises(ValueError):
+        Projection("truncate", 32, 16)
+    with pytest.raises(ValueError):
+        Projection("pca", 4, 16)
+    with pytest.raises(ValueError):
+        Projection("truncate", 4, 16).apply(np.zeros((1, 8)))
+    assert load_projection("/nonexistent", {}) is None
@@ -0,0 +1,46 @@
+import pytest
+
+from src.benchmarking.token_ratios import handbook_chunks, load_reference_tokenizer, token_counts
+from src.rag.tokens import _load_encoding, count_tokens
+
+
+def test_local_estimate_overcounts_real_tokenizer():
+    pytest.importorskip("tokenizers")
+    try:
+        tokenizer = load_reference_tokenizer("qwen")
+    except Exception as e:
+        pytest.skip(f"qwen tokenizer unavailable offline: {e}")
+    chunks = handbook_chunks()
+
+    estimated = sum(count_tokens(chunk, "ollama/qwen2.5:7b") for chunk in chunks)
+    actual = int(token_counts(tokenizer, chunks).sum())
+
+    # Budgets rely on the estimate never under-counting what the model really sees
+    assert estimated >= actual
+
+
+def test_cloud_models_are_counted_exactly_with_tiktoken():
+    tiktoken = pytest.importorskip("tiktoken")
+    try:
+        encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        pytest.skip(f"tiktoken encoding unavailable offline: {e}")
+    text = "Coursework deadlines are listed on the module's Moodle page."
+
+    assert count_tokens(text, "gpt-4o-mini") == len(encoding.encode(text))
+
+
+def test_missing_encoding_falls_back_with_one_warning(monkeypatch, capsys):
+    tiktoken = pytest.importorskip("tiktoken")
+
+    def unavailable(name):
+        raise OSError("offline")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", unavailable)
+    _load_encoding.cache_clear()
+    try:
+        assert count_tokens("a" * 35, "gpt-4o-mini") == 11
+        assert count_tokens("b" * 35, "gpt-4o") == 11
+    finally:
+        _load_encoding.cache_clear()
+    assert capsys.readouterr().out.count("WARNING") == 1
@@ -0,0 +1,40 @@
+import asyncio
+
+from langchain_core.messages import AIMessageChunk
+
+from src.rag.pipeline import PreparedQuery, RagPipeline
+from src.rag.warmup import WarmupState, warm_up
+
+
+CLOUD_MODEL = "gpt-4o-mini"
+USAGE = {"input_tokens": 1000, "output_tokens": 200, "total_tokens": 1200}
+
+
+class RetrievalStubPipeline(RagPipeline):
+    """Real generation path; retrieval replaced by a fixed prompt."""
+
+    async def prepare(self, question, model_name, filters=None):
+        return PreparedQuery(question=question, model_name=model_name, packed=None, prompt=f"Context. {question}")
+
+
+def _warm(router, llm, fake_factory, questions):
+    pipeline = RetrievalStubPipeline(None, None, None, fake_factory(llm), 4, {}, 2500, 6000, router=router)
+    return asyncio.run(warm_up(pipeline, questions, [CLOUD_MODEL], WarmupState(), answer=True, concurrency=1))
+
+
+def test_cloud_warmup_answers_are_charged(make_router, fake_llm, fake_factory):
+    router = make_router()
+    llm = fake_llm([AIMessageChunk(content="An answer.", usage_metadata=USAGE)])
+    state = _warm(router, llm, fake_factory, ["When is reading week?", "Who is my tutor?"])
+    assert state.done == 2 and state.answers_failed == 0
+    assert router.cloud_cost_today() == 2 * (1000 * 0.15 + 200 * 0.6) / 1000
+    assert router.tier_inflight("cloud") == 0
+
+
+def test_cloud_warmup_answers_stop_at_the_cost_cap(make_router, fake_llm, fake_factory):
+    router = make_router(cost_cap_usd=0.001)
+    llm = fake_llm([AIMessageChunk(content="An answer.", usage_metadata=USAGE)])
+    state = _warm(router, llm, fake_factory, ["When is reading week?", "Who is my tutor?", "Where is the library?"])
+    # The first answer exceeds the cap; the rest of the model's answers are skipped but retrieval still counts
+    assert state.done == 3 and state.answers_failed == 1
+    assert router.cloud_cost_today() == (1000 * 0.15 + 200 * 0.6) / 1000